@@ -0,0 +1,79 @@
+"""psycopg connection pool sizing and metrics.
+
+With ``DATABASES["default"]["OPTIONS"]["pool"]`` set, each worker process
+keeps one psycopg pool per database alias instead of one persistent
+connection per thread, so the connection count follows the pool size, not
+the number of threads asgiref has started. settings_production sizes the
+pool from the per-process thread count (``ASGI_THREADS``, also the asgiref
+executor size) unless ``DB_POOL_*`` overrides it.
+
+Pool statistics are per process, so every process publishes its own to the
+cache at most every ``PUBLISH_INTERVAL_SECONDS`` (on ``request_finished``);
+``manage.py doctor`` sums what was published recently.
+"""
+import os
+import socket
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STATS_KEY_PREFIX = "db:pool:stats:"
+PROCESS_INDEX_KEY = "db:pool:processes"
+PUBLISH_INTERVAL_SECONDS = 30
+# Published stats older than this belong to a process that has exited.
+STATS_TTL_SECONDS = PUBLISH_INTERVAL_SECONDS * 4
+
+_publish_lock = threading.Lock()
+_last_published = {"at": 0.0}
+
+
+def pool_stats(alias=DEFAULT_DB_ALIAS):
+    """This process's pool counters for ``alias``, or None without a pool."""
+    pool = getattr(connections[alias], "pool", None)
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        "size": stats.get("pool_size", 0),
+        "max_size": stats.get("pool_max", 0),
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": stats.get("requests_num", 0),
+        # Requests that ended in an error: timeouts waiting for a connection.
+        "timeouts": stats.get("requests_errors", 0),
+        "wait_ms": stats.get("requests_wait_ms", 0),
+    }
+
+
+def _process_key():
+    return f"{STATS_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+
+def publish_pool_stats(**kwargs):
+    """``request_finished`` receiver: share this process's pool stats."""
+    now = time.monotonic()
+    with _publish_lock:
+        if now - _last_published["at"] < PUBLISH_INTERVAL_SECONDS:
+            return
+        _last_published["at"] = now
+    stats = pool_stats()
+    if stats is None:
+        return
+    key = _process_key()
+    cache.set(key, stats, STATS_TTL_SECONDS)
+    index = cache.get(PROCESS_INDEX_KEY) or {}
+    if key not in index:
+        # Racy read-modify-write, but a lost entry is re-added on the next publish.
+        index[key] = time.time()
+        cache.set(PROCESS_INDEX_KEY, index, timeout=None)
+
+
+def published_pool_stats():
+    """``{process: stats}`` for the processes that published recently."""
+    index = cache.get(PROCESS_INDEX_KEY) or {}
+    found = cache.get_many(list(index))
+    if len(found) != len(index):
+        cache.set(PROCESS_INDEX_KEY, {key: index[key] for key in found}, timeout=None)
+    return {key.removeprefix(STATS_KEY_PREFIX): stats for key, stats in found.items()}
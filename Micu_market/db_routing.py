@@ -0,0 +1,205 @@
+"""Read-replica routing with read-your-writes stickiness.
+
+``ReplicaRoutingMiddleware`` lets reads of safe-method requests (GET/HEAD,
+which covers the listing pages, ``/api/v1/listings`` and the sitemaps) go to
+a replica from ``DATABASE_REPLICAS``; every write, every read inside a
+transaction and every read after the request wrote something stays on
+``default``. A user whose request wrote data gets a short-lived cookie
+(``DATABASE_REPLICA_PIN_SECONDS``) that keeps their following requests on
+the primary, so they see their own change even if the replicas lag.
+Background jobs opt in with ``replica_reads`` (jobs/registry.py); views
+that must see other users' latest writes, such as the chat history a client
+fetches to fill the gap after a reconnect, opt out with ``primary_reads``.
+
+Replica lag is measured at most every ``DATABASE_REPLICA_CHECK_SECONDS`` per
+process; replicas that lag more than ``DATABASE_REPLICA_MAX_LAG_SECONDS`` or
+cannot be reached are left out of rotation until a later check passes.
+Without replicas configured everything reads from ``default``.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE_NAME = "db_primary_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# While replica reads are allowed: {"replica": alias chosen on first read or
+# None, "wrote": bool}. One replica per request or job keeps its reads
+# consistent with each other.
+_replica_state = contextvars.ContextVar("db_replica_state", default=None)
+
+_health_lock = threading.Lock()
+_replica_lag = {}  # alias -> (checked_at monotonic, lag seconds or None if unreachable)
+
+
+def record_replica_lag(alias, lag):
+    with _health_lock:
+        _replica_lag[alias] = (time.monotonic(), lag)
+
+
+def replica_lag_seconds(alias):
+    """Seconds the replica's replayed data trails its primary (0 on
+    databases without streaming replication)."""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def _check_replica(alias):
+    try:
+        lag = replica_lag_seconds(alias)
+    except Exception:  # noqa: BLE001 - an unreachable replica is taken out of rotation.
+        logger.warning("replica_check_failed", extra={"alias": alias}, exc_info=True)
+        lag = None
+    if lag is None or lag > settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+        logger.warning("replica_out_of_rotation", extra={"alias": alias, "lag_seconds": lag})
+    record_replica_lag(alias, lag)
+    return lag
+
+
+def replica_status():
+    """``{alias: lag seconds or None}`` for every configured replica, measured now."""
+    return {alias: _check_replica(alias) for alias in settings.DATABASE_REPLICAS}
+
+
+def healthy_replicas():
+    now = time.monotonic()
+    healthy = []
+    for alias in settings.DATABASE_REPLICAS:
+        with _health_lock:
+            checked_at, lag = _replica_lag.get(alias, (None, None))
+        if checked_at is None or now - checked_at >= settings.DATABASE_REPLICA_CHECK_SECONDS:
+            lag = _check_replica(alias)
+        if lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+            healthy.append(alias)
+    return healthy
+
+
+@contextmanager
+def use_replica():
+    state = {"replica": None, "wrote": False}
+    token = _replica_state.set(state)
+    try:
+        yield state
+    finally:
+        _replica_state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    token = _replica_state.set(None)
+    try:
+        yield
+    finally:
+        _replica_state.reset(token)
+
+
+def replica_reads(function):
+    """Run ``function`` with its reads allowed on a replica."""
+
+    @wraps(function)
+    def wrapped(*args, **kwargs):
+        with use_replica():
+            return function(*args, **kwargs)
+
+    return wrapped
+
+
+def primary_reads(view):
+    """Serve the request's reads from the primary from ``view`` on. Writes
+    are still tracked, so the pin cookie is set as usual."""
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        state = _replica_state.get()
+        if state is not None:
+            state["replica"] = DEFAULT_DB_ALIAS
+        return view(*args, **kwargs)
+
+    return wrapped
+
+
+def replica_snapshot_time(alias):
+    """A moment up to which every committed transaction is visible on ``alias``:
+    now for the primary, the last replayed commit for a streaming replica."""
+    connection = connections[alias]
+    if alias == DEFAULT_DB_ALIAS or connection.vendor != "postgresql":
+        return timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_last_xact_replay_timestamp()")
+        replayed = cursor.fetchone()[0]
+    return replayed or timezone.now()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _replica_state.get()
+        if state is None or state["wrote"] or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state["replica"] is None:
+            healthy = healthy_replicas()
+            if not healthy:
+                return DEFAULT_DB_ALIAS
+            state["replica"] = random.choice(healthy)  # nosec B311 - load spreading, not security
+        return state["replica"]
+
+    def db_for_write(self, model, **hints):
+        state = _replica_state.get()
+        if state is not None:
+            # Later reads in the same request or job must see this write.
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Route safe-method requests' reads to replicas, except for users
+    pinned to the primary after a write. Installed before the session
+    middleware, so a session saved during a GET also counts as a write."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reads_replica = request.method in SAFE_METHODS and PIN_COOKIE_NAME not in request.COOKIES
+        with use_replica() if reads_replica else use_primary() as state:
+            response = self.get_response(request)
+        wrote = request.method not in SAFE_METHODS or (state is not None and state["wrote"])
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE_NAME,
+                "1",
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,170 @@
+"""Shared-cache HTML for anonymous visitors, purged through surrogate keys.
+
+Views opt in with ``@cache_anonymous_page()`` and name what a response shows
+with ``set_surrogate_keys`` (``listing:12``, ``category:3``, ...). Only
+visitors without a session or messages cookie are served from the cache:
+their page cannot differ from anyone else's, and a hit is two cache reads
+(entry + key versions) with no database query and no template rendering.
+
+Every surrogate key has a version number in the cache. An entry records the
+versions it was rendered under and ``purge_surrogate_keys`` bumps them, so a
+purge never needs to know which pages show the key; stale entries are simply
+never served again and expire after ``PAGE_CACHE_SECONDS``.
+
+Rendered CSRF tokens are swapped for a placeholder before storing and for
+the visitor's own token when serving.
+"""
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import translation
+
+CACHE_STATUS_HEADER = "X-Page-Cache"
+CSRF_PLACEHOLDER = b"__page_cache_csrf_token__"
+_CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _version_key(surrogate_key):
+    return f"pagecache:surrogate:{surrogate_key}"
+
+
+def _current_versions(surrogate_keys):
+    version_keys = {_version_key(key): key for key in surrogate_keys}
+    found = cache.get_many(list(version_keys))
+    return {key: found.get(version_key) for version_key, key in version_keys.items()}
+
+
+def _versions_for_store(surrogate_keys):
+    versions = _current_versions(surrogate_keys)
+    missing = [key for key, version in versions.items() if version is None]
+    if missing:
+        # Time based, so a key lost to eviction never comes back at a version
+        # some stored entry was rendered under.
+        initial = time.time_ns() // 1000
+        for key in missing:
+            cache.add(_version_key(key), initial, timeout=None)
+        versions.update(_current_versions(missing))
+    return versions
+
+
+def _is_fresh(entry):
+    return _current_versions(entry["surrogates"]) == entry["surrogates"]
+
+
+def _bump(surrogate_keys):
+    for key in surrogate_keys:
+        try:
+            cache.incr(_version_key(key))
+        except ValueError:
+            pass  # No version yet: nothing was stored under this key.
+
+
+def purge_surrogate_keys(*surrogate_keys):
+    """Stop serving every cached page or fragment that shows these keys."""
+    _bump(surrogate_keys)
+    # Bump again after commit: a request may have rendered the pre-commit
+    # data under the first bump in between.
+    transaction.on_commit(lambda: _bump(surrogate_keys))
+
+
+def set_surrogate_keys(response, surrogate_keys, **meta):
+    """Mark ``response`` cacheable under ``surrogate_keys``; ``meta`` is handed
+    to the decorator's ``on_hit`` callback when the entry is served."""
+    response.page_cache_surrogates = list(dict.fromkeys(surrogate_keys))
+    response.page_cache_meta = meta
+    return response
+
+
+def _page_key(request):
+    raw = f"{request.scheme}://{request.get_host()}{request.get_full_path()}|{translation.get_language()}"
+    return f"pagecache:page:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+def _is_anonymous_request(request):
+    if request.method not in ("GET", "HEAD") or settings.PAGE_CACHE_SECONDS <= 0:
+        return False
+    # Checked on cookies, not request.user, so a hit never loads a session.
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and "messages" not in request.COOKIES
+
+
+def _store(key, response):
+    surrogates = getattr(response, "page_cache_surrogates", None)
+    if (
+        not surrogates
+        or response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or "private" in response.get("Cache-Control", "")
+    ):
+        return
+    cache.set(
+        key,
+        {
+            "content": _CSRF_INPUT_RE.sub(rb"\1" + CSRF_PLACEHOLDER + rb"\2", response.content),
+            "content_type": response["Content-Type"],
+            "surrogates": _versions_for_store(surrogates),
+            "meta": response.page_cache_meta,
+        },
+        settings.PAGE_CACHE_SECONDS,
+    )
+    response[CACHE_STATUS_HEADER] = "MISS"
+
+
+def _serve(request, entry):
+    content = entry["content"]
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, content_type=entry["content_type"])
+    response[CACHE_STATUS_HEADER] = "HIT"
+    return response
+
+
+def cache_anonymous_page(on_hit=None):
+    """Serve anonymous GETs of the decorated view from the page cache.
+
+    ``on_hit(request, meta)`` runs for cache hits, for side effects the view
+    would otherwise perform (such as counting a listing view).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not _is_anonymous_request(request):
+                return view(request, *args, **kwargs)
+            key = _page_key(request)
+            entry = cache.get(key)
+            if entry is not None and _is_fresh(entry):
+                if on_hit is not None:
+                    on_hit(request, entry["meta"])
+                return _serve(request, entry)
+            response = view(request, *args, **kwargs)
+            _store(key, response)
+            return response
+        return wrapped
+    return decorator
+
+
+def cached_fragment(name, render):
+    """HTML fragment shared by every visitor, under the same surrogate keys.
+
+    ``render()`` returns ``(html, surrogate_keys)``; the result is the same
+    pair, from the cache when it is still fresh.
+    """
+    key = f"pagecache:fragment:{name}:{translation.get_language()}"
+    entry = cache.get(key) if settings.PAGE_CACHE_SECONDS > 0 else None
+    if entry is not None and _is_fresh(entry):
+        return entry["html"], list(entry["surrogates"])
+    html, surrogates = render()
+    if settings.PAGE_CACHE_SECONDS > 0:
+        cache.set(
+            key,
+            {"html": html, "surrogates": _versions_for_store(surrogates)},
+            settings.PAGE_CACHE_SECONDS,
+        )
+    return html, surrogates
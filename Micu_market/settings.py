@@ -32,6 +32,16 @@ ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", os.getenv("DJANGO_ALLOWED_HOSTS", "12
 def _split_env(name, default=""):
     return [value.strip() for value in os.getenv(name, default).split(",") if value.strip()]
 
+
+def add_replica_databases(databases, hosts):
+    """Add a ``replica<n>`` alias per host, copied from ``default``."""
+    aliases = []
+    for number, host in enumerate(hosts, start=1):
+        alias = f"replica{number}"
+        databases[alias] = {**databases["default"], "HOST": host, "TEST": {"MIRROR": "default"}}
+        aliases.append(alias)
+    return aliases
+
 # ======================
 # APPS
 # ======================
@@ -81,6 +91,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "Micu_market.observability.RequestIdMiddleware",
+    "Micu_market.db_routing.ReplicaRoutingMiddleware",
     "Micu_market.security.ClientIPMiddleware",
     "Micu_market.security.SecurityHeadersMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -130,6 +141,14 @@ DATABASES = {
     }
 }
 
+# Read replicas (Micu_market/db_routing.py): one alias per host in
+# DB_REPLICA_HOSTS, same credentials as the primary. Empty = no replicas.
+DATABASE_REPLICAS = add_replica_databases(DATABASES, _split_env("DB_REPLICA_HOSTS"))
+DATABASE_ROUTERS = ["Micu_market.db_routing.ReplicaRouter"]
+DATABASE_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DATABASE_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "10"))
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "15"))
+
 
 # ======================
 # AUTH / SECURITY
@@ -202,13 +221,22 @@ else:
             "CONFIG": {"hosts": [CHANNELS_REDIS_URL]},
         }
     }
+# Unread-badge pushes are coalesced per user over this window (seconds);
+# 0 pushes synchronously on every change.
+NOTIFICATION_PUSH_DEBOUNCE_SECONDS = float(os.getenv("NOTIFICATION_PUSH_DEBOUNCE_SECONDS", "0.5"))
 API_READ_RATE = os.getenv("API_READ_RATE", "120/m")
 API_WRITE_RATE = os.getenv("API_WRITE_RATE", "30/m")
+LISTING_IMPORT_RATE = os.getenv("LISTING_IMPORT_RATE", "10/h")
+LISTING_IMPORT_MAX_ROWS = int(os.getenv("LISTING_IMPORT_MAX_ROWS", "5000"))
 AJAX_WRITE_RATE = os.getenv("AJAX_WRITE_RATE", "120/m")
 REPORT_WRITE_RATE = os.getenv("REPORT_WRITE_RATE", "10/h")
 SENSITIVE_READ_RATE = os.getenv("SENSITIVE_READ_RATE", "60/m")
 CHAT_START_RATE = os.getenv("CHAT_START_RATE", "30/h")
 CHAT_WS_MESSAGE_RATE_PER_MINUTE = int(os.getenv("CHAT_WS_MESSAGE_RATE_PER_MINUTE", "60"))
+# Typing indicators published per WebSocket connection (chat/consumers.py):
+# at most one per interval, then "stopped typing" after this much silence.
+CHAT_TYPING_INTERVAL_MS = int(os.getenv("CHAT_TYPING_INTERVAL_MS", "2000"))
+CHAT_TYPING_STOP_MS = int(os.getenv("CHAT_TYPING_STOP_MS", "3000"))
 AUTH_LOGIN_IP_RATE = os.getenv("AUTH_LOGIN_IP_RATE", "20/5m")
 AUTH_LOGIN_USER_RATE = os.getenv("AUTH_LOGIN_USER_RATE", "10/15m")
 AUTH_REGISTER_RATE = os.getenv("AUTH_REGISTER_RATE", "5/h")
@@ -216,6 +244,12 @@ BILLING_ORDER_RATE = os.getenv("BILLING_ORDER_RATE", "10/h")
 BILLING_WEBHOOK_SECRET = os.getenv("BILLING_WEBHOOK_SECRET", "")
 BILLING_WEBHOOK_TIMESTAMP_TOLERANCE_SECONDS = int(os.getenv("BILLING_WEBHOOK_TIMESTAMP_TOLERANCE_SECONDS", "300"))
 HOMEPAGE_CACHE_SECONDS = int(os.getenv("HOMEPAGE_CACHE_SECONDS", "300"))
+FAVORITE_STATE_CACHE_SECONDS = int(os.getenv("FAVORITE_STATE_CACHE_SECONDS", "3600"))
+LISTING_FACETS_CACHE_SECONDS = int(os.getenv("LISTING_FACETS_CACHE_SECONDS", "60"))
+LISTING_RESULT_CACHE_SECONDS = int(os.getenv("LISTING_RESULT_CACHE_SECONDS", "120"))
+LISTING_RESULT_CACHE_MAX_PAGE = int(os.getenv("LISTING_RESULT_CACHE_MAX_PAGE", "5"))
+# Anonymous homepage/detail HTML (Micu_market/page_cache.py); 0 disables it.
+PAGE_CACHE_SECONDS = int(os.getenv("PAGE_CACHE_SECONDS", "300"))
 LISTING_AUTO_HIDE_REPORT_THRESHOLD = int(os.getenv("LISTING_AUTO_HIDE_REPORT_THRESHOLD", "3"))
 LISTING_VIEW_COOLDOWN_SECONDS = int(os.getenv("LISTING_VIEW_COOLDOWN_SECONDS", "3600"))
 LISTING_RISK_REVIEW_THRESHOLD = int(os.getenv("LISTING_RISK_REVIEW_THRESHOLD", "70"))
@@ -224,6 +258,12 @@ LISTING_RISK_TERMS = _split_env(
     "whatsapp,telegram,avans,western union,crypto,bitcoin,revolut only,livrare doar cu plata in avans",
 )
 CHAT_MESSAGE_MAX_LENGTH = int(os.getenv("CHAT_MESSAGE_MAX_LENGTH", "5000"))
+# How chat attachment downloads are sent once the participant check passed:
+# "" streams them through Django (development), "nginx" hands them to an
+# `internal` nginx location with X-Accel-Redirect, "sendfile" returns the
+# file path in X-Sendfile (Apache mod_xsendfile, lighttpd).
+CHAT_ATTACHMENT_OFFLOAD = os.getenv("CHAT_ATTACHMENT_OFFLOAD", "")
+CHAT_ATTACHMENT_ACCEL_PREFIX = os.getenv("CHAT_ATTACHMENT_ACCEL_PREFIX", "/internal/media/")
 
 # Security settings for production (HTTPS redirect, HSTS, secure cookies)
 if not DEBUG:
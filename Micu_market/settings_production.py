@@ -85,6 +85,29 @@ DATABASES = {
     }
 }
 
+# psycopg connection pool (Micu_market/db_pool.py): one pool per worker
+# process, sized to the threads that can hold a connection at once. asgiref
+# runs sync views and database_sync_to_async on ASGI_THREADS threads
+# (gunicorn.conf.py sets it), so workers x DB_POOL_MAX_SIZE bounds the
+# connections the web service opens.
+if os.getenv('DB_POOL', 'True') == 'True':
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', '16'))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE') or ASGI_THREADS)
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': min(int(os.getenv('DB_POOL_MIN_SIZE', '2')), DB_POOL_MAX_SIZE),
+            'max_size': DB_POOL_MAX_SIZE,
+            # Seconds a request waits for a free connection before failing.
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        },
+    }
+    # The pool replaces persistent per-thread connections (Django rejects both).
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+DATABASE_REPLICAS = add_replica_databases(
+    DATABASES, [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+)
+
 REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1')
 CACHES = {
     'default': {
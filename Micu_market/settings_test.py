@@ -29,3 +29,7 @@ CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
 PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.MD5PasswordHasher",
 ]
+
+# The LocMem cache outlives each test's rolled-back data (and slugs repeat
+# across tests), so cached pages are opt-in: see PageCacheTestCase.
+PAGE_CACHE_SECONDS = 0
@@ -0,0 +1,108 @@
+"""Facet counts (category, city, condition, price range) for a listing filter set.
+
+All four facets come from one grouped query over the filtered queryset
+(``GROUP BY category_id, city, condition, price bucket``) rolled up in
+Python, instead of clients issuing a ``COUNT(*)`` per option. Counts are for
+the current filter set as a whole, and are cached per normalized filter key
+for ``LISTING_FACETS_CACHE_SECONDS`` or until a listing write bumps the
+result-cache generation (api/result_cache.py).
+"""
+import hashlib
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from categories.tree import get_category_tree
+from listings.models import Listing
+
+from .filters import filter_listing_queryset, normalize_filter_params
+from .result_cache import result_generation
+
+# (key, lower bound inclusive, upper bound exclusive) in RON.
+PRICE_BUCKETS = [
+    ("0-100", None, 100),
+    ("100-500", 100, 500),
+    ("500-1000", 500, 1000),
+    ("1000-5000", 1000, 5000),
+    ("5000+", 5000, None),
+]
+CITY_FACET_LIMIT = 20
+
+
+def _cache_key(normalized):
+    digest = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    # Under the result-cache generation, so listing writes retire facets too.
+    return f"listings:facets:{result_generation()}:{digest}"
+
+
+def _price_bucket_expression():
+    whens = []
+    for index, (_key, low, high) in enumerate(PRICE_BUCKETS):
+        condition = {}
+        if low is not None:
+            condition["price__gte"] = low
+        if high is not None:
+            condition["price__lt"] = high
+        whens.append(When(**condition, then=Value(index)))
+    return Case(*whens, output_field=IntegerField())
+
+
+def compute_facets(params):
+    listings, _search_applied, _sort_by = filter_listing_queryset(params)
+    rows = (
+        listings.order_by()
+        .select_related(None)
+        .prefetch_related(None)
+        .annotate(price_bucket=_price_bucket_expression())
+        .values("category_id", "city", "condition", "price_bucket")
+        .annotate(listings=Count("id"))
+    )
+
+    total = 0
+    categories = Counter()
+    cities = Counter()
+    conditions = Counter()
+    prices = Counter()
+    for row in rows:
+        count = row["listings"]
+        total += count
+        if row["category_id"] is not None:
+            categories[row["category_id"]] += count
+        cities[row["city"]] += count
+        conditions[row["condition"]] += count
+        prices[row["price_bucket"]] += count
+
+    tree = get_category_tree()
+    category_facets = []
+    for category_id, count in categories.most_common():
+        category = tree.by_id.get(category_id)
+        if category is not None:
+            category_facets.append({"id": category_id, "name": category.name, "slug": category.slug, "count": count})
+
+    return {
+        "total": total,
+        "categories": category_facets,
+        "cities": [{"value": city, "count": count} for city, count in cities.most_common(CITY_FACET_LIMIT)],
+        "conditions": [
+            {"value": value, "label": str(label), "count": conditions.get(value, 0)}
+            for value, label in Listing.CONDITION_CHOICES
+        ],
+        "price_ranges": [
+            {"key": key, "min": low, "max": high, "count": prices.get(index, 0)}
+            for index, (key, low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
+
+
+def listing_facets(params):
+    """Cached :func:`compute_facets` keyed by the normalized filter params."""
+    normalized = normalize_filter_params(params)
+    key = _cache_key(normalized)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(normalized)
+        cache.set(key, facets, settings.LISTING_FACETS_CACHE_SECONDS)
+    return facets
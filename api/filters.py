@@ -1,11 +1,15 @@
 """Shared listing filtering for the legacy JSON views and the v1 API."""
 from decimal import Decimal, InvalidOperation
 
-from categories.models import Category
+from categories.tree import get_category_tree
 from listings.models import Listing
 from listings.search import apply_listing_search, order_search_results
 
 VALID_SORTS = {"relevance", "-created_at", "created_at", "price", "-price", "title", "-title"}
+VALID_CONDITIONS = {value for value, _label in Listing.CONDITION_CHOICES}
+
+# Params that change the result set; sort/page/cursor do not.
+FILTER_PARAMS = ("q", "category", "city", "seller", "min_price", "max_price", "condition")
 
 
 def _apply_decimal_filter(queryset, field_name, raw_value, lookup):
@@ -21,18 +25,21 @@ def _apply_decimal_filter(queryset, field_name, raw_value, lookup):
 
 
 def _resolve_category(raw_value):
-    if not raw_value:
-        return None
-    try:
-        return Category.objects.get(slug=raw_value, is_active=True)
-    except Category.DoesNotExist:
-        pass
-    if str(raw_value).isdigit():
-        try:
-            return Category.objects.get(id=int(raw_value), is_active=True)
-        except Category.DoesNotExist:
-            pass
-    return None
+    return get_category_tree().resolve(raw_value)
+
+
+def normalize_filter_params(params):
+    """Cache-key form of the filter params: blanks dropped, ``search`` read as
+    ``q``, and the case-insensitive text filters lowercased."""
+    normalized = {}
+    for name in FILTER_PARAMS:
+        value = params.get(name)
+        if name == "q" and not value:
+            value = params.get("search")
+        value = str(value or "").strip()
+        if value:
+            normalized[name] = value.lower() if name in {"q", "city"} else value
+    return normalized
 
 
 def filter_listing_queryset(params):
@@ -52,13 +59,17 @@ def filter_listing_queryset(params):
 
     category = _resolve_category(params.get("category"))
     if category:
-        category_ids = [category.id] + [child.id for child in category.get_all_children]
+        category_ids = get_category_tree().subtree_ids(category.id)
         listings = listings.filter(category_id__in=category_ids)
 
     city = params.get("city")
     if city:
         listings = listings.filter(city__icontains=city)
 
+    condition = params.get("condition")
+    if condition in VALID_CONDITIONS:
+        listings = listings.filter(condition=condition)
+
     query = params.get("q") or params.get("search")
     listings, search_applied = apply_listing_search(listings, query)
 
@@ -0,0 +1,163 @@
+"""Keyset (cursor) pagination for listing querysets.
+
+Offset pagination needs a ``COUNT(*)`` over the whole filtered queryset and
+an ``OFFSET`` scan that grows with the page number. Cursor mode instead
+orders by the sort key plus ``id`` as a tie-breaker and resumes strictly
+after the last row of the previous page, so every page costs the same.
+The cursor is an opaque signed token holding the sort and the last row's
+key values; clients only pass back the ``next_cursor`` they were given.
+"""
+import json
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = "api.pagination.cursor"
+
+# Full keyset ordering per public sort (see api.filters.VALID_SORTS); every
+# ordering ends with ``id`` so the key is unique.
+CURSOR_ORDERINGS = {
+    "relevance": ("-search_score", "-is_featured", "-created_at", "-id"),
+    "-created_at": ("-created_at", "-id"),
+    "created_at": ("created_at", "id"),
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+    "title": ("title", "id"),
+    "-title": ("-title", "-id"),
+}
+
+# How each key value is restored from the JSON cursor payload.
+_DECODERS = {
+    "search_score": float,
+    "is_featured": bool,
+    "created_at": parse_datetime,
+    "price": Decimal,
+    "title": str,
+    "id": int,
+}
+
+COUNT_MODES = {"exact", "estimate"}
+
+
+class InvalidCursor(ValueError):
+    """Raised for tampered, malformed or mismatched cursor tokens."""
+
+
+@dataclass
+class CursorPage:
+    results: list
+    next_cursor: str | None
+    count: int | None = None
+    count_is_estimate: bool = False
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+
+def cursor_ordering(sort_by, search_applied):
+    # Without a search there is no score; relevance falls back to newest first,
+    # matching what filter_listing_queryset does for offset pages.
+    if sort_by == "relevance" and not search_applied:
+        sort_by = "-created_at"
+    return CURSOR_ORDERINGS.get(sort_by, CURSOR_ORDERINGS["-created_at"])
+
+
+def _field_name(order_field):
+    return order_field.lstrip("-")
+
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(ordering, obj):
+    values = [_encode_value(getattr(obj, _field_name(field))) for field in ordering]
+    return signing.dumps({"o": list(ordering), "v": values}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, ordering):
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature as exc:
+        raise InvalidCursor("Invalid cursor.") from exc
+    if not isinstance(payload, dict) or payload.get("o") != list(ordering):
+        raise InvalidCursor("Cursor does not match the requested sort.")
+    raw_values = payload.get("v")
+    if not isinstance(raw_values, list) or len(raw_values) != len(ordering):
+        raise InvalidCursor("Invalid cursor.")
+    values = []
+    for field, raw in zip(ordering, raw_values, strict=True):
+        try:
+            value = _DECODERS[_field_name(field)](raw)
+        except (ArithmeticError, TypeError, ValueError) as exc:
+            raise InvalidCursor("Invalid cursor.") from exc
+        if value is None:
+            raise InvalidCursor("Invalid cursor.")
+        values.append(value)
+    return values
+
+
+def _after_filter(ordering, values):
+    """Row-value comparison ``(k1, k2, ...) > (v1, v2, ...)`` with per-key direction."""
+    condition = Q()
+    equal_prefix = Q()
+    for field, value in zip(ordering, values, strict=True):
+        name = _field_name(field)
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal_prefix & Q(**{f"{name}__{lookup}": value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def estimate_count(queryset):
+    """Planner row estimate on PostgreSQL (no table scan); exact count elsewhere."""
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def paginate_by_cursor(queryset, sort_by, search_applied, cursor, per_page, count_mode=None):
+    """Return one :class:`CursorPage` of ``queryset`` after ``cursor``.
+
+    ``cursor`` is ``None``/empty for the first page. ``count_mode`` is
+    ``"exact"``, ``"estimate"`` or ``None`` (no count at all).
+    """
+    ordering = cursor_ordering(sort_by, search_applied)
+    count = None
+    if count_mode == "exact":
+        count = queryset.count()
+    elif count_mode == "estimate":
+        count = estimate_count(queryset)
+
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after_filter(ordering, decode_cursor(cursor, ordering)))
+
+    rows = list(queryset[: per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(ordering, rows[-1])
+
+    return CursorPage(
+        results=rows,
+        next_cursor=next_cursor,
+        count=count,
+        count_is_estimate=count_mode == "estimate",
+    )
@@ -0,0 +1,143 @@
+"""Cached listing result pages, stored as listing IDs plus the total count.
+
+The list page (``listings:list``) and ``GET /api/v1/listings`` share the
+cache: identical filter/sort/page tuples (after normalization) reuse one
+entry, and a hit costs a single query to load the listings of the page
+(plus the usual image prefetch) instead of the filter, ``COUNT(*)`` and
+page queries.
+
+Entries are keyed under a generation number that ``Listing`` saves bump
+(listings/signals.py) when a listing is created or deleted or when a
+field the filters read changes, so nothing needs to be deleted on write.
+Edits that only change search text are picked up when the entry expires
+(``LISTING_RESULT_CACHE_SECONDS``). Row contents are always loaded fresh:
+only which listings are on a page, and in which order, is cached.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+from listings.models import Listing
+
+from .filters import filter_listing_queryset, normalize_filter_params
+
+RESULT_GENERATION_KEY = "listings:results:generation"
+HITS_KEY = "listings:results:hits"
+MISSES_KEY = "listings:results:misses"
+
+
+def normalize_result_params(params):
+    normalized = normalize_filter_params(params)
+    sort = str(params.get("sort") or "").strip()
+    if sort:
+        normalized["sort"] = sort
+    return normalized
+
+
+def _initial_generation():
+    # Time based, like the category tree version: a generation lost to a
+    # cache flush never restarts at a number that still has entries.
+    return time.time_ns() // 1000
+
+
+def result_generation():
+    generation = cache.get(RESULT_GENERATION_KEY)
+    if generation is None:
+        cache.add(RESULT_GENERATION_KEY, _initial_generation(), timeout=None)
+        generation = cache.get(RESULT_GENERATION_KEY)
+    return generation
+
+
+def bump_result_generation():
+    """Retire every cached result page."""
+    try:
+        cache.incr(RESULT_GENERATION_KEY)
+    except ValueError:
+        cache.add(RESULT_GENERATION_KEY, _initial_generation(), timeout=None)
+
+
+def _cache_key(normalized, number, per_page):
+    raw = json.dumps([normalized, number, per_page], sort_keys=True)
+    digest = hashlib.sha256(raw.encode()).hexdigest()
+    return f"listings:results:{result_generation()}:{digest}"
+
+
+def _record(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def result_cache_stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / lookups if lookups else 0.0}
+
+
+def _page_number(raw_value):
+    try:
+        number = int(raw_value)
+    except (TypeError, ValueError):
+        return 1
+    return max(number, 1)
+
+
+def hydrate_listings(ids):
+    """Active listings for ``ids`` in that order, with one query (plus images)."""
+    by_id = (
+        Listing.objects.filter(status="active")
+        .select_related("category", "owner")
+        .prefetch_related("images")
+        .in_bulk(ids)
+    )
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def _compute_page(normalized, number, per_page):
+    listings, _search_applied, _sort_by = filter_listing_queryset(normalized)
+    return Paginator(listings, per_page).get_page(number)
+
+
+def cached_listing_page(params, page, per_page):
+    """Offset-paginated ``Page`` of active listings for the given filters.
+
+    Invalid page numbers fall back to the first page and numbers past the
+    end to the last one, like ``Paginator.get_page``. Pages beyond
+    ``LISTING_RESULT_CACHE_MAX_PAGE`` are always computed.
+    """
+    normalized = normalize_result_params(params)
+    number = _page_number(page)
+    timeout = settings.LISTING_RESULT_CACHE_SECONDS
+    if timeout <= 0 or number > settings.LISTING_RESULT_CACHE_MAX_PAGE:
+        return _compute_page(normalized, number, per_page)
+
+    key = _cache_key(normalized, number, per_page)
+    entry = cache.get(key)
+    if entry is not None:
+        listings = hydrate_listings(entry["ids"])
+        # A listing that left the result set without a generation bump (a
+        # raw or bulk write) makes the entry stale: recompute it.
+        if len(listings) == len(entry["ids"]):
+            _record(HITS_KEY)
+            # A range stands in for the result set: the paginator only needs
+            # its length, and the page's rows are already loaded by ID.
+            page_obj = Paginator(range(entry["count"]), per_page).page(entry["number"])
+            page_obj.object_list = listings
+            return page_obj
+
+    _record(MISSES_KEY)
+    page_obj = _compute_page(normalized, number, per_page)
+    cache.set(
+        key,
+        {"ids": [listing.pk for listing in page_obj], "count": page_obj.paginator.count, "number": page_obj.number},
+        timeout,
+    )
+    return page_obj
@@ -1,6 +1,8 @@
 import json
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
@@ -258,6 +260,10 @@ class ApiV1Tests(TestCase):
     """Tests for the versioned django-ninja API under /api/v1/."""
 
     def setUp(self):
+        # The anonymous read throttle counts requests in the cache; cursor
+        # walks alone make dozens of them.
+        cache.clear()
+        self.addCleanup(cache.clear)
         self.client = Client()
         self.owner = User.objects.create_user(
             username='v1-owner',
@@ -312,6 +318,58 @@ class ApiV1Tests(TestCase):
         self.assertIn(self.listing.slug, slugs)
         self.assertNotIn('ascuns-v1', slugs)
 
+    def _walk_cursor_pages(self, **params):
+        seen = []
+        query = {**params, 'cursor': '', 'per_page': 2}
+        while True:
+            response = self.client.get('/api/v1/listings', query)
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            seen.extend(item['slug'] for item in payload['results'])
+            if not payload['next_cursor']:
+                return seen
+            query['cursor'] = payload['next_cursor']
+
+    def test_cursor_pagination_walks_every_sort_without_gaps(self):
+        for index in range(4):
+            Listing.objects.create(
+                title=f'Laptop V1 {index}',
+                description='Laptop cursor',
+                price=1500,  # same price: the id tie-breaker keeps pages stable
+                owner=self.owner,
+                category=self.category,
+                city='Cluj',
+                status='active',
+            )
+        expected = set(Listing.objects.filter(status='active').values_list('slug', flat=True))
+
+        for sort in ['relevance', '-created_at', 'created_at', 'price', '-price', 'title', '-title']:
+            with self.subTest(sort=sort):
+                slugs = self._walk_cursor_pages(sort=sort)
+                self.assertEqual(len(slugs), len(expected))
+                self.assertEqual(set(slugs), expected)
+
+        slugs = self._walk_cursor_pages(q='laptop', sort='relevance')
+        self.assertEqual(set(slugs), expected)
+
+    def test_cursor_mode_counts_only_on_request(self):
+        response = self.client.get('/api/v1/listings', {'cursor': ''})
+        self.assertIsNone(response.json()['count'])
+
+        response = self.client.get('/api/v1/listings', {'cursor': '', 'count_mode': 'exact'})
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_cursor_rejects_tampered_token_and_sort_mismatch(self):
+        Listing.objects.create(
+            title='Laptop V1 doi', description='x', price=10, owner=self.owner, category=self.category,
+        )
+        first = self.client.get('/api/v1/listings', {'cursor': '', 'per_page': 1, 'sort': 'price'}).json()
+
+        response = self.client.get('/api/v1/listings', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/listings', {'cursor': first['next_cursor'], 'sort': 'title'})
+        self.assertEqual(response.status_code, 400)
+
     def test_detail_404_for_inactive_listing(self):
         self.listing.status = 'inactive'
         self.listing.save(update_fields=['status'])
@@ -348,6 +406,27 @@ class ApiV1Tests(TestCase):
         self.assertEqual(payload['owner']['username'], 'v1-buyer')
         self.assertTrue(Listing.objects.filter(slug=payload['slug'], owner=self.buyer).exists())
 
+    def test_bulk_import_with_api_key(self):
+        from api.models import ApiKey
+
+        _key, raw_key = ApiKey.generate(self.buyer)
+        upload = SimpleUploadedFile(
+            'catalog.ndjson',
+            b'{"title": "Laptop V1", "description": "Import", "category": "v1-category", "price": 900, "city": "Cluj"}\n'
+            b'{"title": "Fara pret", "description": "Import", "category": "v1-category", "city": "Cluj"}\n',
+        )
+        response = self.client.post('/api/v1/listings/import', {'file': upload}, **self._bearer(raw_key))
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual((payload['rows'], payload['created']), (2, 1))
+        self.assertEqual(payload['errors'][0]['row'], 2)
+        self.assertTrue(Listing.objects.filter(slug='laptop-v1-1', owner=self.buyer).exists())
+
+        bad = SimpleUploadedFile('catalog.xlsx', b'')
+        response = self.client.post('/api/v1/listings/import', {'file': bad}, **self._bearer(raw_key))
+        self.assertEqual(response.status_code, 400)
+
     def test_invalid_and_revoked_keys_are_rejected(self):
         from api.models import ApiKey
 
@@ -428,3 +507,95 @@ class ApiV1Tests(TestCase):
             content_type='application/json',
         )
         self.assertEqual(response.status_code, 400)
+
+    def _facet_fixture(self):
+        cache.clear()
+        child = Category.objects.create(name='V1 Sub', slug='v1-sub', parent=self.category, is_active=True)
+        Listing.objects.create(
+            title='Telefon V1', description='telefon', price=80, owner=self.owner,
+            category=child, city='Cluj', condition='new', status='active',
+        )
+        Listing.objects.create(
+            title='Tableta V1', description='tableta', price=700, owner=self.owner,
+            category=child, city='Cluj', condition='good', status='active',
+        )
+        return child
+
+    def test_facets_count_every_dimension(self):
+        child = self._facet_fixture()
+        response = self.client.get('/api/v1/listings/facets')
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload['total'], 3)
+        self.assertEqual({c['slug']: c['count'] for c in payload['categories']}, {child.slug: 2, 'v1-category': 1})
+        self.assertEqual({c['value']: c['count'] for c in payload['cities']}, {'Cluj': 2, 'Bucuresti': 1})
+        conditions = {c['value']: c['count'] for c in payload['conditions']}
+        self.assertEqual((conditions['new'], conditions['good'], conditions['poor']), (1, 2, 0))
+        prices = {p['key']: p['count'] for p in payload['price_ranges']}
+        self.assertEqual((prices['0-100'], prices['500-1000'], prices['1000-5000']), (1, 1, 1))
+
+        response = self.client.get('/api/v1/listings/facets', {'category': 'v1-category', 'condition': 'good'})
+        self.assertEqual(response.json()['total'], 2)
+
+    def test_facets_use_one_grouped_query_and_are_cached(self):
+        from api.facets import listing_facets
+        from categories.tree import get_category_tree
+
+        self._facet_fixture()
+        get_category_tree()
+        with self.assertNumQueries(1):
+            first = listing_facets({'city': 'cluj'})
+        with self.assertNumQueries(0):
+            second = listing_facets({'city': ' CLUJ '})
+        self.assertEqual(first, second)
+        self.assertEqual(first['total'], 2)
+
+    def test_list_filters_by_condition(self):
+        self._facet_fixture()
+        response = self.client.get('/api/v1/listings', {'condition': 'new'})
+        self.assertEqual([item['slug'] for item in response.json()['results']], ['telefon-v1'])
+
+    def test_result_page_cache_is_shared_and_hydrates_by_id(self):
+        from api.result_cache import cached_listing_page, result_cache_stats
+
+        cache.clear()
+        first = self.client.get('/api/v1/listings', {'q': 'Laptop', 'per_page': 12}).json()
+        self.assertEqual(result_cache_stats()['misses'], 1)
+
+        # Same filters as the list page sends them (search= is q=, case ignored).
+        with self.assertNumQueries(2):  # listings by id + images prefetch
+            page_obj = cached_listing_page({'search': 'LAPTOP'}, None, 12)
+        self.assertEqual([listing.slug for listing in page_obj], [r['slug'] for r in first['results']])
+        self.assertEqual(page_obj.paginator.count, first['count'])
+
+        response = self.client.get(reverse('listings:list'), {'search': 'laptop'})
+        self.assertEqual(list(response.context['page_obj']), list(page_obj))
+        stats = result_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.assertAlmostEqual(stats['hit_ratio'], 2 / 3)
+
+    def test_result_page_cache_follows_listing_writes(self):
+        cache.clear()
+        self.assertEqual(self.client.get('/api/v1/listings').json()['count'], 1)
+
+        other = Listing.objects.create(
+            title='Monitor V1', description='monitor', price=400, owner=self.owner,
+            category=self.category, city='Iasi', status='active',
+        )
+        self.assertEqual(self.client.get('/api/v1/listings').json()['count'], 2)
+
+        other.price = 9000
+        other.save()
+        payload = self.client.get('/api/v1/listings', {'max_price': '5000'}).json()
+        self.assertEqual([item['slug'] for item in payload['results']], [self.listing.slug])
+
+        other.status = 'sold'
+        other.save()
+        self.assertEqual(self.client.get('/api/v1/listings').json()['count'], 1)
+
+        # A save that touches nothing the results depend on keeps the entry.
+        self.listing.description = 'Descriere nouă'
+        self.listing.save()
+        before = cache.get('listings:results:hits') or 0
+        self.client.get('/api/v1/listings')
+        self.assertEqual(cache.get('listings:results:hits'), before + 1)
@@ -7,21 +7,26 @@ only through session-authenticated endpoints, so a leaked key cannot mint
 new keys.
 """
 from django.conf import settings
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404
-from ninja import NinjaAPI, Schema
+from ninja import File, NinjaAPI, Schema
 from ninja.errors import HttpError
+from ninja.files import UploadedFile
 from ninja.security import HttpBearer, django_auth
 from ninja.throttling import AnonRateThrottle, AuthRateThrottle
 
 from categories.models import Category
 from favorites.models import Favorite
+from favorites.services import mark_favorited
+from listings.bulk_import import ImportFormatError, detect_format, import_listings
 from listings.forms import ListingForm
 from listings.models import Listing
 from listings.moderation import apply_listing_risk_review
 
+from .facets import listing_facets
 from .filters import filter_listing_queryset
 from .models import ApiKey
+from .pagination import COUNT_MODES, InvalidCursor, paginate_by_cursor
+from .result_cache import cached_listing_page
 from .views import _listing_detail, _listing_summary
 
 MAX_ACTIVE_KEYS_PER_USER = 5
@@ -91,6 +96,7 @@ class ListingSummaryOut(Schema):
     views_count: int
     is_featured: bool
     is_promoted: bool
+    is_favorited: bool = False
     created_at: str
     url: str
 
@@ -106,20 +112,54 @@ class ListingDetailOut(ListingSummaryOut):
     description: str
     location: str | None = None
     images: list[ListingImageOut]
-    is_favorited: bool
     updated_at: str
 
 
 class ListingListOut(Schema):
-    count: int
-    page: int
+    # Offset mode fills page/num_pages/has_previous; cursor mode fills
+    # next_cursor and only counts when asked (count_mode).
+    count: int | None = None
+    count_is_estimate: bool = False
+    page: int | None = None
     per_page: int
-    num_pages: int
+    num_pages: int | None = None
     has_next: bool
-    has_previous: bool
+    has_previous: bool | None = None
+    next_cursor: str | None = None
     results: list[ListingSummaryOut]
 
 
+class CategoryFacetOut(Schema):
+    id: int
+    name: str
+    slug: str
+    count: int
+
+
+class ValueFacetOut(Schema):
+    value: str
+    count: int
+
+
+class ConditionFacetOut(ValueFacetOut):
+    label: str
+
+
+class PriceRangeFacetOut(Schema):
+    key: str
+    min: int | None = None
+    max: int | None = None
+    count: int
+
+
+class ListingFacetsOut(Schema):
+    total: int
+    categories: list[CategoryFacetOut]
+    cities: list[ValueFacetOut]
+    conditions: list[ConditionFacetOut]
+    price_ranges: list[PriceRangeFacetOut]
+
+
 class ListingCreateIn(Schema):
     title: str
     description: str
@@ -133,6 +173,21 @@ class ListingCreateIn(Schema):
     negotiable: bool = True
 
 
+class ListingImportErrorOut(Schema):
+    row: int
+    errors: dict[str, list[str]]
+
+
+class ListingImportOut(Schema):
+    rows: int
+    created: int
+    flagged: int
+    images_queued: int
+    seconds: float
+    rows_per_second: float
+    errors: list[ListingImportErrorOut]
+
+
 class FavoriteToggleIn(Schema):
     listing_id: int
 
@@ -174,7 +229,7 @@ class ErrorOut(Schema):
 
 # ---------- Listings ----------
 
-@api.get("/listings", response=ListingListOut, tags=["listings"])
+@api.get("/listings", response={200: ListingListOut, 400: ErrorOut}, tags=["listings"])
 def list_listings(
     request,
     q: str | None = None,
@@ -183,11 +238,19 @@ def list_listings(
     seller: str | None = None,
     min_price: str | None = None,
     max_price: str | None = None,
+    condition: str | None = None,
     sort: str | None = None,
     page: int = 1,
     per_page: int = 20,
+    cursor: str | None = None,
+    count_mode: str | None = None,
 ):
-    """Search and filter active listings (paginated)."""
+    """Search and filter active listings (paginated).
+
+    Pass ``cursor`` (empty for the first page, then each response's
+    ``next_cursor``) for keyset pagination: constant cost at any depth and no
+    total count unless ``count_mode`` is ``exact`` or ``estimate``.
+    """
     params = {
         "q": q,
         "category": category,
@@ -195,25 +258,96 @@ def list_listings(
         "seller": seller,
         "min_price": min_price,
         "max_price": max_price,
+        "condition": condition,
         "sort": sort,
     }
-    listings, _search_applied, _sort_by = filter_listing_queryset(params)
+    listings, search_applied, sort_by = filter_listing_queryset(params)
 
     per_page = min(max(per_page, 1), 50)
-    paginator = Paginator(listings, per_page)
-    page_obj = paginator.get_page(page)
+    if cursor is not None:
+        if count_mode is not None and count_mode not in COUNT_MODES:
+            return 400, {"detail": "count_mode must be 'exact' or 'estimate'."}
+        try:
+            cursor_page = paginate_by_cursor(listings, sort_by, search_applied, cursor, per_page, count_mode)
+        except InvalidCursor as exc:
+            return 400, {"detail": str(exc)}
+        return 200, {
+            "count": cursor_page.count,
+            "count_is_estimate": cursor_page.count_is_estimate,
+            "per_page": per_page,
+            "has_next": cursor_page.has_next,
+            "next_cursor": cursor_page.next_cursor,
+            "results": [_listing_summary(request, listing) for listing in mark_favorited(request.user, cursor_page)],
+        }
+
+    # Result IDs per page are cached and shared with the list page.
+    page_obj = cached_listing_page(params, page, per_page)
 
-    return {
-        "count": paginator.count,
+    return 200, {
+        "count": page_obj.paginator.count,
         "page": page_obj.number,
         "per_page": per_page,
-        "num_pages": paginator.num_pages,
+        "num_pages": page_obj.paginator.num_pages,
         "has_next": page_obj.has_next(),
         "has_previous": page_obj.has_previous(),
-        "results": [_listing_summary(request, listing) for listing in page_obj],
+        "results": [_listing_summary(request, listing) for listing in mark_favorited(request.user, page_obj)],
     }
 
 
+# Declared before /listings/{slug} so "facets" is not taken for a slug.
+@api.get("/listings/facets", response=ListingFacetsOut, tags=["listings"])
+def listing_facets_endpoint(
+    request,
+    q: str | None = None,
+    category: str | None = None,
+    city: str | None = None,
+    seller: str | None = None,
+    min_price: str | None = None,
+    max_price: str | None = None,
+    condition: str | None = None,
+):
+    """Result counts per category, city, condition and price range for the
+    same filters as ``/listings`` (cached briefly per filter set)."""
+    return listing_facets(
+        {
+            "q": q,
+            "category": category,
+            "city": city,
+            "seller": seller,
+            "min_price": min_price,
+            "max_price": max_price,
+            "condition": condition,
+        }
+    )
+
+
+# Declared before /listings/{slug} so the POST is not answered with a 405
+# by the slug route.
+@api.post(
+    "/listings/import",
+    response={200: ListingImportOut, 400: ErrorOut},
+    auth=AUTH_ANY,
+    throttle=[AuthRateThrottle(settings.LISTING_IMPORT_RATE)],
+    tags=["listings"],
+)
+def import_listings_endpoint(request, file: File[UploadedFile], format: str | None = None):
+    """Bulk-create listings for the authenticated user from a CSV or NDJSON
+    upload (``file``; ``format`` defaults to the file extension).
+
+    Invalid rows are skipped and reported with their line number; image
+    URLs are fetched afterwards by a background job. At most
+    ``LISTING_IMPORT_MAX_ROWS`` rows per request.
+    """
+    try:
+        fmt = detect_format(file.name, format)
+    except ImportFormatError as exc:
+        return 400, {"detail": str(exc)}
+    report = import_listings(
+        file.file, request.auth, fmt, max_rows=settings.LISTING_IMPORT_MAX_ROWS, request=request
+    )
+    return 200, report.as_dict()
+
+
 @api.get("/listings/{slug}", response={200: ListingDetailOut, 404: ErrorOut}, tags=["listings"])
 def get_listing(request, slug: str):
     """Retrieve one active listing by slug."""
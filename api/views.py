@@ -9,6 +9,7 @@ from django.views.decorators.http import require_GET, require_POST
 from django_ratelimit.decorators import ratelimit
 
 from favorites.models import Favorite
+from favorites.services import is_favorited, mark_favorited
 from listings.forms import ListingForm
 from listings.models import Listing
 from listings.moderation import apply_listing_risk_review
@@ -65,6 +66,8 @@ def _listing_summary(request, listing):
         'views_count': listing.views_count,
         'is_featured': listing.is_featured,
         'is_promoted': listing.is_promoted,
+        # Set for a whole page at once by favorites.services.mark_favorited
+        'is_favorited': getattr(listing, 'is_favorited', False),
         'created_at': listing.created_at.isoformat(),
         'url': _absolute_url(request, reverse('listings:detail', kwargs={'slug': listing.slug})),
     }
@@ -85,10 +88,7 @@ def _listing_detail(request, listing):
                 }
                 for image in listing.images.all()
             ],
-            'is_favorited': (
-                request.user.is_authenticated
-                and Favorite.objects.filter(user=request.user, listing=listing).exists()
-            ),
+            'is_favorited': is_favorited(request.user, listing),
             'updated_at': listing.updated_at.isoformat(),
         }
     )
@@ -117,7 +117,7 @@ def listing_list_api(request):
             'num_pages': paginator.num_pages,
             'has_next': page_obj.has_next(),
             'has_previous': page_obj.has_previous(),
-            'results': [_listing_summary(request, listing) for listing in page_obj],
+            'results': [_listing_summary(request, listing) for listing in mark_favorited(request.user, page_obj)],
         }
     )
 
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
 
@@ -27,18 +28,31 @@ class Category(models.Model):
         # NoReverseMatch (500) wherever get_absolute_url was used.
         return f"{reverse('listings:list')}?category={self.slug}"
 
+    def _creates_cycle(self):
+        """Whether the parent is this category or one of its descendants."""
+        if not (self.pk and self.parent_id):
+            return False
+        ancestor_id, seen = self.parent_id, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            if ancestor_id == self.pk:
+                return True
+            seen.add(ancestor_id)
+            ancestor_id = type(self).objects.filter(pk=ancestor_id).values_list("parent_id", flat=True).first()
+        return False
+
+    def clean(self):
+        super().clean()
+        if self._creates_cycle():
+            raise ValidationError({"parent": "O categorie nu poate fi mutată sub propriile subcategorii."})
+
+    def save(self, *args, **kwargs):
+        if self._creates_cycle():
+            raise ValueError("A category cannot be moved under its own subtree.")
+        super().save(*args, **kwargs)
+
     @property
     def get_all_children(self):
-        """Return all subcategories recursively (with infinite-loop protection)"""
-        return self._collect_children(visited=set())
+        """Return all active subcategories, depth first (from the cached tree)."""
+        from .tree import get_category_tree
 
-    def _collect_children(self, visited):
-        """Recursive collection with a visited set to prevent infinite cycles"""
-        children = []
-        if self.pk in visited:
-            return children  # prevents infinite recursion
-        visited.add(self.pk)
-        for child in self.subcategories.filter(is_active=True):
-            children.append(child)
-            children.extend(child._collect_children(visited))
-        return children
+        return get_category_tree().active_descendants(self.pk)
@@ -0,0 +1,19 @@
+"""Keep the per-process category trees (categories/tree.py) and cached pages fresh."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Micu_market.page_cache import purge_surrogate_keys
+
+from .models import Category
+from .tree import invalidate_category_tree
+
+
+@receiver(post_save, sender=Category, dispatch_uid="categories_invalidate_tree_on_save")
+@receiver(post_delete, sender=Category, dispatch_uid="categories_invalidate_tree_on_delete")
+def invalidate_tree_on_change(sender, instance, **kwargs):
+    invalidate_category_tree()
+    purge_surrogate_keys("categories", f"category:{instance.pk}")
+    # Bump again after commit: another process may have rebuilt its tree from
+    # the pre-commit data in between.
+    transaction.on_commit(invalidate_category_tree)
@@ -1,7 +1,9 @@
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 from django.urls import reverse
 
 from .models import Category
+from .tree import get_category_tree
 
 
 class CategoryUrlTests(TestCase):
@@ -16,3 +18,39 @@ class CategoryUrlTests(TestCase):
         Category.objects.create(name="Auto", slug="auto", is_active=True, parent=None)
         response = self.client.get(reverse("pages:home"))
         self.assertEqual(response.status_code, 200)
+
+
+class CategoryHierarchyTests(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="Electronice", slug="electronice")
+        self.phones = Category.objects.create(name="Telefoane", slug="telefoane", parent=self.root)
+        self.cases = Category.objects.create(name="Huse", slug="huse", parent=self.phones)
+        self.hidden = Category.objects.create(name="Ascunse", slug="ascunse", parent=self.root, is_active=False)
+        self.under_hidden = Category.objects.create(name="Sub ascunse", slug="sub-ascunse", parent=self.hidden)
+
+    def test_get_all_children_skips_inactive_branches(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            children = [category.pk for category in self.root.get_all_children]
+        self.assertEqual(children, [self.phones.pk, self.cases.pk])
+
+    def test_cannot_move_category_under_its_own_subtree(self):
+        self.root.parent = self.cases
+        with self.assertRaises(ValidationError):
+            self.root.full_clean()
+        with self.assertRaises(ValueError):
+            self.root.save()
+
+    def test_warm_tree_lookups_do_not_query_and_saves_invalidate(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+            self.assertEqual(tree.resolve("telefoane").pk, self.phones.pk)
+            self.assertEqual(tree.resolve(str(self.root.pk)).pk, self.root.pk)
+            self.assertIsNone(tree.resolve("ascunse"))
+            self.assertEqual(tree.subtree_ids(self.root.pk), [self.root.pk, self.phones.pk, self.cases.pk])
+
+        self.cases.is_active = False
+        self.cases.save()
+
+        self.assertEqual(get_category_tree().subtree_ids(self.root.pk), [self.root.pk, self.phones.pk])
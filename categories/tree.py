@@ -0,0 +1,98 @@
+"""Per-process cache of the whole category tree.
+
+The category table is small and read on almost every listing request, so
+each process keeps the full tree in memory and answers slug/id lookups and
+subtree queries without touching the database. Freshness is driven by a
+version number in the shared cache: ``Category`` save/delete bumps it (see
+categories/signals.py) and every process rebuilds its copy on the next
+lookup that sees a new version.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+
+TREE_VERSION_KEY = "categories:tree-version"
+
+_local = {"version": None, "tree": None}
+_lock = threading.Lock()
+
+
+class CategoryTree:
+    def __init__(self, categories):
+        self.by_id = {category.pk: category for category in categories}
+        self.by_slug = {category.slug: category for category in categories}
+        self._active_children = defaultdict(list)
+        for category in sorted(categories, key=lambda category: (category.order, category.name)):
+            if category.is_active and category.parent_id is not None:
+                self._active_children[category.parent_id].append(category)
+
+    def resolve(self, raw_value):
+        """Active category by slug, then by numeric id (``api.filters`` semantics)."""
+        if not raw_value:
+            return None
+        category = self.by_slug.get(raw_value)
+        if category is None and str(raw_value).isdigit():
+            category = self.by_id.get(int(raw_value))
+        if category is None or not category.is_active:
+            return None
+        return category
+
+    def active_by_name(self):
+        return sorted((category for category in self.by_id.values() if category.is_active), key=lambda c: c.name)
+
+    def active_descendants(self, category_id):
+        """Active subcategories reachable through active parents, depth first
+        in display order (the order ``Category.get_all_children`` returns)."""
+        descendants = []
+        visited = {category_id}
+        stack = list(reversed(self._active_children.get(category_id, ())))
+        while stack:
+            category = stack.pop()
+            if category.pk in visited:
+                continue
+            visited.add(category.pk)
+            descendants.append(category)
+            stack.extend(reversed(self._active_children.get(category.pk, ())))
+        return descendants
+
+    def subtree_ids(self, category_id):
+        return [category_id] + [category.pk for category in self.active_descendants(category_id)]
+
+
+def _initial_version():
+    # Time based, so a version lost to eviction or a cache flush never
+    # restarts at a number some process already built its tree for.
+    return time.time_ns() // 1000
+
+
+def _current_version():
+    version = cache.get(TREE_VERSION_KEY)
+    if version is None:
+        cache.add(TREE_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(TREE_VERSION_KEY)
+    return version
+
+
+def get_category_tree():
+    version = _current_version()
+    tree = _local["tree"]
+    if tree is not None and _local["version"] == version:
+        return tree
+    from .models import Category
+
+    with _lock:
+        if _local["tree"] is None or _local["version"] != version:
+            _local["tree"] = CategoryTree(list(Category.objects.all()))
+            _local["version"] = version
+        return _local["tree"]
+
+
+def invalidate_category_tree():
+    """Make every process rebuild its tree on the next lookup."""
+    try:
+        cache.incr(TREE_VERSION_KEY)
+    except ValueError:
+        cache.add(TREE_VERSION_KEY, _initial_version(), timeout=None)
+    _local["tree"] = None
@@ -12,8 +12,13 @@ def conversation_group(conversation_id):
     return f"chat_{conversation_id}"
 
 
-def serialize_message(message):
-    """JSON representation of a message sent to clients (identical over WS and POST)."""
+def serialize_message(message, attachments=None):
+    """JSON representation of a message sent to clients (identical over WS and POST).
+
+    ``attachments`` skips the attachments query when the caller already knows them.
+    """
+    if attachments is None:
+        attachments = message.attachments.all()
     return {
         "id": message.id,
         "content": message.content,
@@ -26,7 +31,7 @@ def serialize_message(message):
                 "filename": att.filename,
                 "file_type": att.file_type,
             }
-            for att in message.attachments.all()
+            for att in attachments
         ],
     }
 
@@ -1,32 +1,76 @@
 """WebSocket consumer for real-time chat.
 
 Security: the connection is accepted only for an authenticated participant of the
-conversation. The Origin is validated in asgi.py (AllowedHostsOriginValidator)."""
+conversation. The Origin is validated in asgi.py (AllowedHostsOriginValidator).
+
+The conversation and the other participant are loaded once at connect; each
+message then costs a single thread-pool hop (save + notification + serialize
+in one transaction) and the rate limit runs on the event loop.
+
+Typing indicators and read receipts are coalesced per connection before they
+reach the channel layer: at most one ``typing`` publish per
+``CHAT_TYPING_INTERVAL_MS`` plus one trailing "stopped typing" after
+``CHAT_TYPING_STOP_MS`` of silence, and a ``read`` frame only runs
+``mark_as_read`` (and publishes) when a message from the other side arrived
+since the last one. The receipt on connect is always published: the page
+view already marked the conversation read before the socket opened. Sent and suppressed events are counted in the cache
+(``chat_event_stats``, shown by ``manage.py doctor``)."""
+import asyncio
 import json
 import time
+from collections import Counter
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 
 from .broadcast import conversation_group, serialize_message
+from .ratelimit import is_rate_limited
 
 # Minimum interval between two messages on the same connection (anti-spam;
 # django-ratelimit does not cover WebSockets).
 MIN_MESSAGE_INTERVAL = 0.3
 
+EVENT_STATS_KEY_PREFIX = "chat:events:"
+EVENT_NAMES = ("typing_sent", "typing_suppressed", "read_sent", "read_skipped")
+# Counted events a connection keeps before adding them to the shared counters.
+EVENT_FLUSH_EVERY = 50
+
+
+async def _add_event_counts(counts):
+    for name, value in counts.items():
+        key = f"{EVENT_STATS_KEY_PREFIX}{name}"
+        if value and not await cache.aadd(key, value, timeout=None):
+            try:
+                await cache.aincr(key, value)
+            except ValueError:
+                await cache.aadd(key, value, timeout=None)
+
+
+def chat_event_stats():
+    """Typing/read events published and suppressed, summed over all processes."""
+    values = cache.get_many([f"{EVENT_STATS_KEY_PREFIX}{name}" for name in EVENT_NAMES])
+    return {name: values.get(f"{EVENT_STATS_KEY_PREFIX}{name}", 0) for name in EVENT_NAMES}
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope.get("user")
         self.conversation_id = int(self.scope["url_route"]["kwargs"]["pk"])
         self._last_message_ts = 0.0
+        self._last_typing_sent = 0.0
+        self._last_typing_at = 0.0
+        self._typing_stop_task = None
+        # Last-known unread state: set when the other side's message arrives.
+        self._has_unread = True
+        self._events = Counter()
 
         if self.user is None or not self.user.is_authenticated:
             await self.close(code=4401)
             return
-        if not await self._is_participant():
+        if not await self._load_conversation():
             await self.close(code=4403)
             return
 
@@ -35,12 +79,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
         # On open, mark as read and notify the other side (read receipts).
-        await self._mark_read()
-        await self.channel_layer.group_send(self.group, {"type": "chat.read", "by": self.user.id})
+        await self._handle_read(announce=True)
 
     async def disconnect(self, code):
         if hasattr(self, "group"):
+            if self._typing_stop_task is not None:
+                self._typing_stop_task.cancel()
+                self._typing_stop_task = None
+                await self._send_typing(False)
             await self.channel_layer.group_discard(self.group, self.channel_name)
+            await _add_event_counts(self._events)
 
     async def receive(self, text_data=None, bytes_data=None):
         try:
@@ -52,10 +100,91 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if msg_type == "message":
             await self._handle_message(data)
         elif msg_type == "typing":
-            await self.channel_layer.group_send(self.group, {"type": "chat.typing", "user_id": self.user.id})
+            await self._handle_typing()
         elif msg_type == "read":
-            await self._mark_read()
-            await self.channel_layer.group_send(self.group, {"type": "chat.read", "by": self.user.id})
+            await self._handle_read()
+        elif msg_type == "history":
+            await self._handle_history(data)
+
+    async def _count(self, event):
+        self._events[event] += 1
+        if self._events.total() >= EVENT_FLUSH_EVERY:
+            counts, self._events = self._events, Counter()
+            await _add_event_counts(counts)
+
+    async def _send_typing(self, typing):
+        await self.channel_layer.group_send(
+            self.group, {"type": "chat.typing", "user_id": self.user.id, "typing": typing}
+        )
+
+    async def _handle_typing(self):
+        now = time.monotonic()
+        self._last_typing_at = now
+        if self._typing_stop_task is None:
+            self._typing_stop_task = asyncio.create_task(self._typing_stop_after_silence())
+        if (now - self._last_typing_sent) * 1000 < settings.CHAT_TYPING_INTERVAL_MS:
+            await self._count("typing_suppressed")
+            return
+        self._last_typing_sent = now
+        await self._send_typing(True)
+        await self._count("typing_sent")
+
+    async def _typing_stop_after_silence(self):
+        """Publish the trailing "stopped typing" once no typing frame came
+        for CHAT_TYPING_STOP_MS."""
+        stop_after = settings.CHAT_TYPING_STOP_MS / 1000
+        while True:
+            remaining = self._last_typing_at + stop_after - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+        self._typing_stop_task = None
+        self._last_typing_sent = 0.0
+        await self._send_typing(False)
+
+    def _stop_typing_silently(self):
+        """A sent message ends the typing burst; clients hide the indicator on it."""
+        if self._typing_stop_task is not None:
+            self._typing_stop_task.cancel()
+            self._typing_stop_task = None
+        self._last_typing_sent = 0.0
+
+    async def _handle_read(self, announce=False):
+        """Mark the conversation read and publish a receipt if that changed
+        anything; ``announce`` publishes even when nothing was left unread."""
+        if not self._has_unread:
+            await self._count("read_skipped")
+            return
+        # Cleared before the UPDATE: a message arriving meanwhile sets it again.
+        self._has_unread = False
+        if not await self._mark_read() and not announce:
+            await self._count("read_skipped")
+            return
+        await self.channel_layer.group_send(self.group, {"type": "chat.read", "by": self.user.id})
+        await self._count("read_sent")
+
+    async def _handle_history(self, data):
+        """Answer ``{"type": "history", "before"|"after": <message id>}`` with a
+        window of messages (chat/history.py), only to this connection."""
+        try:
+            before = int(data["before"]) if data.get("before") is not None else None
+            after = int(data["after"]) if data.get("after") is not None else None
+        except (TypeError, ValueError):
+            return
+        if before is not None and after is not None:
+            return
+        window = await self._load_history(before, after)
+        if window is None:
+            await self.send(text_data=json.dumps({"type": "error", "code": "unknown_message"}))
+            return
+        messages, has_more = window
+        await self.send(text_data=json.dumps({
+            "type": "history",
+            "before": before,
+            "after": after,
+            "messages": messages,
+            "has_more": has_more,
+        }))
 
     async def _handle_message(self, data):
         content = (data.get("content") or "").strip()
@@ -68,21 +197,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if now - self._last_message_ts < MIN_MESSAGE_INTERVAL:
             return
         self._last_message_ts = now
-        if await self._is_rate_limited():
+        if await is_rate_limited(self.user.id, self.conversation_id):
             await self.send(text_data=json.dumps({"type": "error", "code": "rate_limited"}))
             return
 
-        message = await self._save_message(content)
-        payload = await self._serialize(message)
+        self._stop_typing_silently()
+        payload = await self._save_message(content)
         await self.channel_layer.group_send(self.group, {"type": "chat.message", "message": payload})
 
     # --- group handlers -> client ---
     async def chat_message(self, event):
+        if event["message"]["sender_id"] != self.user.id:
+            self._has_unread = True
         await self.send(text_data=json.dumps({"type": "message", "message": event["message"]}))
 
     async def chat_typing(self, event):
         if event["user_id"] != self.user.id:
-            await self.send(text_data=json.dumps({"type": "typing", "user_id": event["user_id"]}))
+            await self.send(text_data=json.dumps(
+                {"type": "typing", "user_id": event["user_id"], "typing": event.get("typing", True)}
+            ))
 
     async def chat_read(self, event):
         if event["by"] != self.user.id:
@@ -90,58 +223,62 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # --- DB access ---
     @database_sync_to_async
-    def _is_participant(self):
+    def _load_conversation(self):
+        """Check membership and cache the conversation and the other participant."""
         from .models import Conversation
-        return Conversation.objects.filter(pk=self.conversation_id, participants=self.user).exists()
+
+        conversation = (
+            Conversation.objects.filter(pk=self.conversation_id)
+            .prefetch_related("participants")
+            .first()
+        )
+        if conversation is None:
+            return False
+        participants = list(conversation.participants.all())
+        if not any(participant.pk == self.user.pk for participant in participants):
+            return False
+        self.conversation = conversation
+        self.receiver = next((participant for participant in participants if participant.pk != self.user.pk), None)
+        return True
 
     @database_sync_to_async
     def _save_message(self, content):
+        """Persist the message and its notification; return the serialized payload."""
         from notifications.models import Notification
+        from notifications.services import notify
 
-        from .models import Conversation, Message
+        from .models import Message
 
-        conversation = Conversation.objects.get(pk=self.conversation_id)
-        receiver = conversation.get_other_participant(self.user)
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=self.user,
-            receiver=receiver,
-            content=content,
-        )
-        if receiver is not None:
-            Notification.objects.create(
-                recipient=receiver,
-                notification_type="new_message",
-                title="Mesaj nou",
-                message=f"{self.user.get_full_name() or self.user.username} ți-a trimis un mesaj.",
-                related_object_type="Conversation",
-                related_object_id=conversation.pk,
-                action_url=conversation.get_absolute_url(),
+        with transaction.atomic():
+            message = Message.objects.create(
+                conversation=self.conversation,
+                sender=self.user,
+                receiver=self.receiver,
+                content=content,
             )
-        return message
+            if self.receiver is not None:
+                notify(Notification(
+                    recipient=self.receiver,
+                    notification_type="new_message",
+                    title="Mesaj nou",
+                    message=f"{self.user.get_full_name() or self.user.username} ți-a trimis un mesaj.",
+                    related_object_type="Conversation",
+                    related_object_id=self.conversation_id,
+                    action_url=self.conversation.get_absolute_url(),
+                ))
+        # A message sent over the socket never has attachments.
+        return serialize_message(message, attachments=())
 
     @database_sync_to_async
-    def _serialize(self, message):
-        return serialize_message(message)
+    def _load_history(self, before, after):
+        from .history import UnknownAnchor, message_window, serialize_window
 
-    @database_sync_to_async
-    def _mark_read(self):
-        from .models import Conversation
-        Conversation.objects.get(pk=self.conversation_id).mark_as_read(self.user)
+        try:
+            messages, has_more = message_window(self.conversation_id, before=before, after=after)
+        except UnknownAnchor:
+            return None
+        return serialize_window(messages), has_more
 
     @database_sync_to_async
-    def _is_rate_limited(self):
-        limit = getattr(settings, "CHAT_WS_MESSAGE_RATE_PER_MINUTE", 60)
-        if limit <= 0:
-            return False
-
-        bucket = int(time.time() // 60)
-        key = f"chat:ws:send:{self.user.id}:{self.conversation_id}:{bucket}"
-        if cache.add(key, 1, timeout=70):
-            return False
-        try:
-            count = cache.incr(key)
-        except ValueError:
-            cache.set(key, 1, timeout=70)
-            return False
-        return count > limit
+    def _mark_read(self):
+        return self.conversation.mark_as_read(self.user)
@@ -0,0 +1,61 @@
+"""Keyset windows over a conversation's messages.
+
+The conversation page renders the newest window and loads older ones on
+scroll (JSON view or the WebSocket ``history`` frame). Windows are anchored
+on a message id and walk the ``(conversation, -created_at)`` index with an
+``(created_at, id)`` keyset, so a window costs the same on the first page
+and ten thousand messages back: no COUNT and no OFFSET. Attachments of a
+window are loaded with one extra query.
+"""
+from django.db.models import Q
+
+from .broadcast import serialize_message
+from .models import Message
+
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 100
+
+
+class UnknownAnchor(LookupError):
+    """The anchor message does not belong to the conversation."""
+
+
+def message_window(conversation_id, *, before=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """Return ``(messages, has_more)``: up to ``limit`` messages in ascending
+    order, the newest ones without an anchor, else those right before
+    ``before`` or right after ``after`` (message ids)."""
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    messages = (
+        Message.objects.filter(conversation_id=conversation_id)
+        .select_related("sender")
+        .prefetch_related("attachments")
+    )
+    anchor_id = before if before is not None else after
+    if anchor_id is not None:
+        anchor_at = (
+            Message.objects.filter(conversation_id=conversation_id, pk=anchor_id)
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        if anchor_at is None:
+            raise UnknownAnchor(anchor_id)
+
+    if after is not None:
+        window = list(
+            messages.filter(Q(created_at__gt=anchor_at) | Q(created_at=anchor_at, pk__gt=after))
+            .order_by("created_at", "pk")[: limit + 1]
+        )
+        return window[:limit], len(window) > limit
+
+    if before is not None:
+        messages = messages.filter(Q(created_at__lt=anchor_at) | Q(created_at=anchor_at, pk__lt=before))
+    window = list(messages.order_by("-created_at", "-pk")[: limit + 1])
+    return window[:limit][::-1], len(window) > limit
+
+
+def serialize_window(messages):
+    """Client payloads for a window, with the read state of each message."""
+    return [
+        {**serialize_message(message, attachments=message.attachments.all()), "is_read": message.is_read}
+        for message in messages
+    ]
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from categories.models import Category
+from chat import consumers
+from chat.models import Conversation
+from listings.models import Listing
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Măsoară debitul (mesaje/s) al ChatConsumer într-un singur proces, "
+        "cu layer-ul de canale configurat. Creează și șterge date temporare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500, help="Numărul total de mesaje trimise.")
+        parser.add_argument("--connections", type=int, default=4, help="Conexiuni WebSocket simultane.")
+
+    def handle(self, *args, **options):
+        messages = options["messages"]
+        connections = options["connections"]
+        if messages < 1 or connections < 1:
+            raise CommandError("--messages și --connections trebuie să fie pozitive.")
+
+        tag = f"bench-chat-{uuid.uuid4().hex[:8]}"
+        sender = User.objects.create_user(username=f"{tag}-a", email=f"{tag}-a@example.invalid")
+        receiver = User.objects.create_user(username=f"{tag}-b", email=f"{tag}-b@example.invalid")
+        category = Category.objects.create(name=tag, slug=tag)
+        try:
+            listing = Listing.objects.create(
+                title=tag, description=tag, price=1, owner=receiver, category=category, city="Bench", status="inactive",
+            )
+            conversation = Conversation.objects.create(listing=listing)
+            conversation.participants.add(sender, receiver)
+
+            # The anti-spam throttles would otherwise cap the measurement.
+            min_interval = consumers.MIN_MESSAGE_INTERVAL
+            consumers.MIN_MESSAGE_INTERVAL = 0
+            try:
+                with override_settings(CHAT_WS_MESSAGE_RATE_PER_MINUTE=0):
+                    elapsed, latencies = asyncio.run(self._run(conversation.pk, sender, messages, connections))
+            finally:
+                consumers.MIN_MESSAGE_INTERVAL = min_interval
+        finally:
+            sender.delete()
+            receiver.delete()
+            category.delete()
+
+        sent = len(latencies)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Chat messages: {sent} over {connections} connections in {elapsed:.3f}s, "
+                f"{sent / elapsed:.1f} messages/s, latency p50/p95 "
+                f"{statistics.median(latencies) * 1000:.1f}/{p95 * 1000:.1f} ms"
+            )
+        )
+
+    async def _run(self, conversation_id, user, messages, connections):
+        scope = {
+            "type": "websocket",
+            "path": f"/ws/chat/{conversation_id}/",
+            "headers": [],
+            "subprotocols": [],
+            "query_string": b"",
+            "user": user,
+            "url_route": {"kwargs": {"pk": conversation_id}},
+        }
+        communicators = [ApplicationCommunicator(consumers.ChatConsumer.as_asgi(), dict(scope)) for _ in range(connections)]
+        for communicator in communicators:
+            await communicator.send_input({"type": "websocket.connect"})
+            accepted = await communicator.receive_output(timeout=10)
+            if accepted["type"] != "websocket.accept":
+                raise CommandError(f"Connection rejected: {accepted}")
+
+        per_connection = [messages // connections + (index < messages % connections) for index in range(connections)]
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                self._drive(communicator, index, count)
+                for index, (communicator, count) in enumerate(zip(communicators, per_connection, strict=True))
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+            await communicator.wait(timeout=10)
+        return elapsed, [latency for latencies in results for latency in latencies]
+
+    async def _drive(self, communicator, index, count):
+        """Send ``count`` messages one after another, each waiting for its own echo."""
+        latencies = []
+        for number in range(count):
+            content = f"bench {index}:{number}"
+            sent_at = time.perf_counter()
+            await communicator.send_input(
+                {"type": "websocket.receive", "text": json.dumps({"type": "message", "content": content})}
+            )
+            while True:
+                frame = await communicator.receive_output(timeout=30)
+                payload = json.loads(frame.get("text") or "{}")
+                if payload.get("type") == "message" and payload["message"]["content"] == content:
+                    break
+            latencies.append(time.perf_counter() - sent_at)
+        return latencies
@@ -0,0 +1,84 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+PREVIEW_LENGTH = 200
+
+
+def fill_summaries(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    for conversation in Conversation.objects.prefetch_related('participants').iterator(chunk_size=500):
+        ids = sorted(participant.pk for participant in conversation.participants.all())[:2]
+        participant_a_id, participant_b_id = (ids + [None, None])[:2]
+        messages = Message.objects.filter(conversation_id=conversation.pk)
+        unread = dict(
+            messages.filter(is_read=False, receiver_id__in=ids)
+            .order_by().values_list('receiver_id').annotate(count=Count('pk'))
+        )
+        last = messages.order_by('-created_at', '-pk').first()
+        Conversation.objects.filter(pk=conversation.pk).update(
+            participant_a_id=participant_a_id,
+            participant_b_id=participant_b_id,
+            unread_a=unread.get(participant_a_id, 0),
+            unread_b=unread.get(participant_b_id, 0),
+            last_message_preview=last.content[:PREVIEW_LENGTH] if last else '',
+            last_message_sender_id=last.sender_id if last else None,
+            last_message_at=last.created_at if last else None,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_alter_messageattachment_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='participant_a',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Participant A'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='participant_b',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Participant B'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200, verbose_name='Ultimul mesaj'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Expeditorul ultimului mesaj'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Ultimul mesaj la'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='unread_a',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Necitite de participantul A'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='unread_b',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Necitite de participantul B'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['participant_a', 'is_active', '-updated_at'], name='chat_conv_participant_a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['participant_b', 'is_active', '-updated_at'], name='chat_conv_participant_b_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversation_inbox_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messageattachment',
+            name='sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='SHA-256'),
+        ),
+    ]
@@ -3,13 +3,17 @@ from pathlib import PurePath
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.storage import FileSystemStorage
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, When
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import get_valid_filename
 
 User = get_user_model()
 
+# Characters of the last message kept on the conversation for the inbox.
+LAST_MESSAGE_PREVIEW_LENGTH = 200
+
 
 def private_attachment_storage():
     """Local-disk storage for chat attachments regardless of default storage.
@@ -27,7 +31,30 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creat la")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizat la")
     is_active = models.BooleanField(default=True, verbose_name="Activ")
-    
+
+    # Denormalized for the inbox, so a page of conversations is one query:
+    # the participant pair (lower user id first, kept in sync with
+    # `participants`), the last message and each participant's unread count.
+    participant_a = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False,
+        verbose_name="Participant A",
+    )
+    participant_b = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False,
+        verbose_name="Participant B",
+    )
+    last_message_preview = models.CharField(
+        max_length=LAST_MESSAGE_PREVIEW_LENGTH, blank=True, default='', editable=False,
+        verbose_name="Ultimul mesaj",
+    )
+    last_message_sender = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', editable=False,
+        verbose_name="Expeditorul ultimului mesaj",
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Ultimul mesaj la")
+    unread_a = models.PositiveIntegerField(default=0, editable=False, verbose_name="Necitite de participantul A")
+    unread_b = models.PositiveIntegerField(default=0, editable=False, verbose_name="Necitite de participantul B")
+
     class Meta:
         ordering = ['-updated_at']
         verbose_name = "Conversație"
@@ -35,6 +62,8 @@ class Conversation(models.Model):
         indexes = [
             models.Index(fields=['listing', 'is_active']),
             models.Index(fields=['is_active', '-updated_at']),
+            models.Index(fields=['participant_a', 'is_active', '-updated_at'], name='chat_conv_participant_a_idx'),
+            models.Index(fields=['participant_b', 'is_active', '-updated_at'], name='chat_conv_participant_b_idx'),
         ]
     
     def __str__(self):
@@ -46,15 +75,78 @@ class Conversation(models.Model):
     
     def get_other_participant(self, current_user):
         """Return the other participant in the conversation"""
+        if self.participant_a_id == current_user.id:
+            return self.participant_b
+        if self.participant_b_id == current_user.id:
+            return self.participant_a
         return self.participants.exclude(id=current_user.id).first()
+
+    def unread_count_for(self, user):
+        """Unread messages for `user`, from the maintained counters."""
+        if self.participant_a_id == user.id:
+            return self.unread_a
+        if self.participant_b_id == user.id:
+            return self.unread_b
+        return 0
     
     def get_last_message(self):
         """Return the last message in the conversation"""
         return self.messages.first()
+
+    def refresh_summary(self):
+        """Recompute the denormalized inbox fields from participants and messages.
+
+        Called when participants change; also repairs a drifted row.
+        """
+        ids = sorted(self.participants.values_list('pk', flat=True))[:2]
+        participant_a_id, participant_b_id = (ids + [None, None])[:2]
+        unread = dict(
+            self.messages.filter(is_read=False, receiver_id__in=ids)
+            .order_by().values_list('receiver_id').annotate(count=Count('pk'))
+        )
+        last = self.messages.order_by('-created_at', '-pk').first()
+        summary = {
+            'participant_a_id': participant_a_id,
+            'participant_b_id': participant_b_id,
+            'unread_a': unread.get(participant_a_id, 0),
+            'unread_b': unread.get(participant_b_id, 0),
+            'last_message_preview': last.content[:LAST_MESSAGE_PREVIEW_LENGTH] if last else '',
+            'last_message_sender_id': last.sender_id if last else None,
+            'last_message_at': last.created_at if last else None,
+        }
+        Conversation.objects.filter(pk=self.pk).update(**summary)
+        for name, value in summary.items():
+            setattr(self, name, value)
     
     def mark_as_read(self, user):
         """Mark all messages as read for a user"""
-        self.messages.filter(receiver=user, is_read=False).update(is_read=True)
+        from notifications.unread import decrement_unread, schedule_unread_push
+
+        updated = self.messages.filter(receiver=user, is_read=False).update(is_read=True)
+        if updated:
+            Conversation.objects.filter(pk=self.pk).update(
+                unread_a=Case(
+                    When(participant_a_id=user.pk, then=0),
+                    default=F('unread_a'),
+                    output_field=models.PositiveIntegerField(),
+                ),
+                unread_b=Case(
+                    When(participant_b_id=user.pk, then=0),
+                    default=F('unread_b'),
+                    output_field=models.PositiveIntegerField(),
+                ),
+            )
+            if self.participant_a_id == user.pk:
+                self.unread_a = 0
+            elif self.participant_b_id == user.pk:
+                self.unread_b = 0
+
+            def _update_badge():
+                decrement_unread(user.pk, updated)
+                schedule_unread_push(user.pk)
+
+            transaction.on_commit(_update_badge)
+        return updated
 
 
 class Message(models.Model):
@@ -79,11 +171,29 @@ class Message(models.Model):
         return f"De la {self.sender.username} către {self.receiver.username}: {self.content[:50]}..."
     
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         super().save(*args, **kwargs)
-        # Update the conversation's updated_at — without write amplification
-        Conversation.objects.filter(pk=self.conversation_id).update(
-            updated_at=timezone.now()
-        )
+        # Update the conversation's updated_at — without write amplification.
+        # A new message also becomes the inbox summary and counts as unread
+        # for its receiver, in the same UPDATE.
+        updates = {'updated_at': timezone.now()}
+        if adding:
+            updates.update(
+                last_message_preview=self.content[:LAST_MESSAGE_PREVIEW_LENGTH],
+                last_message_sender_id=self.sender_id,
+                last_message_at=self.created_at,
+                unread_a=Case(
+                    When(participant_a_id=self.receiver_id, then=F('unread_a') + 1),
+                    default=F('unread_a'),
+                    output_field=models.PositiveIntegerField(),
+                ),
+                unread_b=Case(
+                    When(participant_b_id=self.receiver_id, then=F('unread_b') + 1),
+                    default=F('unread_b'),
+                    output_field=models.PositiveIntegerField(),
+                ),
+            )
+        Conversation.objects.filter(pk=self.conversation_id).update(**updates)
 
 
 class MessageAttachment(models.Model):
@@ -97,6 +207,8 @@ class MessageAttachment(models.Model):
     filename = models.CharField(max_length=255, verbose_name="Nume fișier")
     file_type = models.CharField(max_length=50, verbose_name="Tip fișier")
     file_size = models.IntegerField(verbose_name="Dimensiune fișier")
+    # Computed while the upload streams (chat/validators.py); empty if unknown.
+    sha256 = models.CharField(max_length=64, blank=True, default='', editable=False, verbose_name="SHA-256")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
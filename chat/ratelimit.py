@@ -0,0 +1,68 @@
+"""Fixed-window rate limit for the chat WebSocket, without a thread hop.
+
+When the default cache is Redis, the counter is kept with ``redis.asyncio``
+(``INCR`` + ``EXPIRE NX`` in one pipeline round trip) straight from the
+event loop. Other cache backends (LocMem in dev/tests) go through Django's
+async cache API.
+"""
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+WINDOW_SECONDS = 60
+
+# redis.asyncio connections belong to the event loop that created them.
+_clients = weakref.WeakKeyDictionary()
+
+
+def _redis_url():
+    config = settings.CACHES.get("default", {})
+    if config.get("BACKEND", "").endswith("RedisCache"):
+        location = config.get("LOCATION")
+        return location[0] if isinstance(location, (list, tuple)) else location
+    return None
+
+
+def _redis_client(url):
+    import asyncio
+
+    from redis import asyncio as redis_asyncio
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = redis_asyncio.Redis.from_url(url)
+        _clients[loop] = client
+    return client
+
+
+async def _hit_redis(url, key):
+    async with _redis_client(url).pipeline(transaction=False) as pipe:
+        pipe.incr(key)
+        pipe.expire(key, WINDOW_SECONDS + 10, nx=True)
+        count, _ = await pipe.execute()
+    return count
+
+
+async def _hit_cache(key):
+    if await cache.aadd(key, 1, timeout=WINDOW_SECONDS + 10):
+        return 1
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, timeout=WINDOW_SECONDS + 10)
+        return 1
+
+
+async def is_rate_limited(user_id, conversation_id):
+    limit = getattr(settings, "CHAT_WS_MESSAGE_RATE_PER_MINUTE", 60)
+    if limit <= 0:
+        return False
+
+    bucket = int(time.time() // WINDOW_SECONDS)
+    key = f"chat:ws:send:{user_id}:{conversation_id}:{bucket}"
+    url = _redis_url()
+    count = await (_hit_redis(url, key) if url else _hit_cache(key))
+    return count > limit
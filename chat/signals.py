@@ -0,0 +1,17 @@
+"""Keep the conversation's participant pair columns (chat/models.py) in sync."""
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import Conversation
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through, dispatch_uid="chat_refresh_summary_on_participants")
+def refresh_summary_on_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        instance.refresh_summary()
+        return
+    # user.conversations.add(...): the conversations are in pk_set.
+    for conversation in Conversation.objects.filter(pk__in=pk_set or ()):
+        conversation.refresh_summary()
@@ -2,28 +2,37 @@
 Teste pentru sistemul de chat — conversații și mesaje
 """
 import asyncio
+import hashlib
 import json
 import tempfile
 import time
 import zipfile
 from io import BytesIO
+from unittest.mock import patch
+from urllib.parse import quote
 
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
 from asgiref.testing import ApplicationCommunicator
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
+from django.core.files.storage import InMemoryStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile, StopFutureHandlers
+from django.db import connection
+from django.db.models.fields.files import FieldFile
 from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image as PilImage
 
 from categories.models import Category
 from listings.models import Listing
 from notifications.models import Notification
 
-from .consumers import ChatConsumer
+from .consumers import ChatConsumer, chat_event_stats
 from .models import Conversation, Message, MessageAttachment
-from .validators import is_allowed_chat_attachment
+from .validators import AttachmentUploadHandler, is_allowed_chat_attachment
 
 User = get_user_model()
 
@@ -126,6 +135,106 @@ class ChatConversationTestCase(TestCase):
         self.assertContains(response, 'data-conversation-id')
         self.assertContains(response, 'chat-conversation__messages')
 
+    def test_conversation_summary_follows_messages(self):
+        """Participant pair, last message and unread counters stay current."""
+        conv = Conversation.objects.create(listing=self.listing)
+        conv.participants.add(self.seller, self.buyer)
+        conv.refresh_from_db()
+        self.assertEqual(conv.participant_a, self.buyer)
+        self.assertEqual(conv.participant_b, self.seller)
+
+        Message.objects.create(conversation=conv, sender=self.buyer, receiver=self.seller, content='Salut')
+        Message.objects.create(conversation=conv, sender=self.buyer, receiver=self.seller, content='Mai e disponibil?')
+        conv.refresh_from_db()
+        self.assertEqual(conv.last_message_preview, 'Mai e disponibil?')
+        self.assertEqual(conv.last_message_sender, self.buyer)
+        self.assertEqual(conv.unread_count_for(self.seller), 2)
+        self.assertEqual(conv.unread_count_for(self.buyer), 0)
+
+        conv.mark_as_read(self.seller)
+        conv.refresh_from_db()
+        self.assertEqual(conv.unread_count_for(self.seller), 0)
+
+    def test_inbox_queries_do_not_grow_with_history(self):
+        """The inbox renders from conversation rows, whatever the history size."""
+        conv = Conversation.objects.create(listing=self.listing)
+        conv.participants.add(self.buyer, self.seller)
+        Message.objects.create(conversation=conv, sender=self.seller, receiver=self.buyer, content='Prima')
+        self.client.login(username='buyer', password='BuyerPass123!')
+        self.client.get(reverse('chat:inbox'))
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('chat:inbox'))
+        for index in range(3):
+            other = Conversation.objects.create(listing=self.listing)
+            other.participants.add(self.buyer, self.third_user)
+            for number in range(5):
+                Message.objects.create(
+                    conversation=other, sender=self.third_user, receiver=self.buyer, content=f'{index}:{number}'
+                )
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('chat:inbox'))
+
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertContains(response, '2:4')
+        self.assertContains(response, '<span class="unread-count">5</span>', html=True)
+
+    def _thread(self, count):
+        conv = Conversation.objects.create(listing=self.listing)
+        conv.participants.add(self.buyer, self.seller)
+        messages = [
+            Message.objects.create(conversation=conv, sender=self.seller, receiver=self.buyer, content=f'mesaj-{number:03d}')
+            for number in range(count)
+        ]
+        return conv, messages
+
+    def test_message_history_walks_windows_by_id(self):
+        conv, messages = self._thread(120)
+        self.client.login(username='buyer', password='BuyerPass123!')
+        url = reverse('chat:message_history', kwargs={'pk': conv.pk})
+
+        older = self.client.get(url, {'before': messages[100].pk}).json()
+        self.assertEqual([m['content'] for m in older['messages']], [f'mesaj-{n:03d}' for n in range(50, 100)])
+        self.assertTrue(older['has_more'])
+
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                MessageAttachment.objects.create(
+                    message=messages[10],
+                    file=SimpleUploadedFile('factura.pdf', b'%PDF-1.4', content_type='application/pdf'),
+                )
+                oldest = self.client.get(url, {'before': messages[50].pk}).json()
+        self.assertEqual(oldest['messages'][0]['content'], 'mesaj-000')
+        self.assertFalse(oldest['has_more'])
+        self.assertEqual(oldest['messages'][10]['attachments'][0]['filename'], 'factura.pdf')
+
+        newer = self.client.get(url, {'after': messages[115].pk}).json()
+        self.assertEqual([m['content'] for m in newer['messages']], [f'mesaj-{n:03d}' for n in range(116, 120)])
+        self.assertFalse(newer['has_more'])
+
+    def test_message_history_rejects_foreign_anchor_and_outsiders(self):
+        conv, messages = self._thread(3)
+        other, other_messages = self._thread(1)
+        url = reverse('chat:message_history', kwargs={'pk': conv.pk})
+
+        self.client.login(username='buyer', password='BuyerPass123!')
+        self.assertEqual(self.client.get(url, {'before': other_messages[0].pk}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'before': 'x'}).status_code, 400)
+
+        self.client.login(username='third', password='ThirdPass123!')
+        self.assertEqual(self.client.get(url, {'before': messages[2].pk}).status_code, 404)
+
+    def test_conversation_page_renders_only_the_newest_window(self):
+        conv, _messages = self._thread(60)
+        self.client.login(username='buyer', password='BuyerPass123!')
+
+        response = self.client.get(reverse('chat:conversation', kwargs={'pk': conv.pk}))
+
+        self.assertContains(response, 'mesaj-059')
+        self.assertContains(response, 'mesaj-010')
+        self.assertNotContains(response, 'mesaj-009')
+        self.assertContains(response, 'data-has-older="true"')
+
     def test_third_user_cannot_access_conversation(self):
         """A third-party user cannot access others' conversation"""
         # Create the conversation between buyer and seller
@@ -200,6 +309,22 @@ class ChatConversationTestCase(TestCase):
         notification = Notification.objects.get(recipient=self.seller, notification_type='new_message')
         self.assertEqual(notification.related_object_id, conv.pk)
 
+    def test_message_burst_coalesces_into_one_notification(self):
+        conv = Conversation.objects.create(listing=self.listing)
+        conv.participants.add(self.buyer, self.seller)
+
+        self.client.login(username='buyer', password='BuyerPass123!')
+        for content in ('Salut', 'Mai e disponibil?', 'Aștept răspuns'):
+            self.client.post(
+                reverse('chat:send_message', kwargs={'conversation_pk': conv.pk}),
+                {'content': content},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+
+        notification = Notification.objects.get(recipient=self.seller, notification_type='new_message')
+        self.assertEqual(notification.count, 3)
+        self.assertEqual(notification.title, '3 mesaje noi')
+
     def test_send_message_accepts_valid_text_attachment(self):
         """Valid text attachments are saved."""
         with tempfile.TemporaryDirectory() as media_root:
@@ -275,6 +400,60 @@ class ChatConversationTestCase(TestCase):
                 self.assertEqual(MessageAttachment.objects.count(), 0)
                 self.assertEqual(response.json()['message']['attachments'], [])
 
+    def test_send_message_stores_streamed_image_with_its_hash(self):
+        """Attachments are checked and hashed while the upload streams."""
+        image = BytesIO()
+        PilImage.new('RGB', (4, 4), 'red').save(image, format='PNG')
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                conv = Conversation.objects.create(listing=self.listing)
+                conv.participants.add(self.buyer, self.seller)
+
+                self.client.login(username='buyer', password='BuyerPass123!')
+                response = self.client.post(
+                    reverse('chat:send_message', kwargs={'conversation_pk': conv.pk}),
+                    {
+                        'content': 'poza',
+                        'attachments': SimpleUploadedFile('poza.png', image.getvalue(), content_type='image/png'),
+                    },
+                    HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+                )
+
+                self.assertEqual(response.status_code, 200)
+                attachment = MessageAttachment.objects.get()
+                self.assertEqual(attachment.sha256, hashlib.sha256(image.getvalue()).hexdigest())
+                self.assertEqual(attachment.file_type, 'image')
+
+    @patch('chat.validators.MAX_ATTACHMENT_SIZE', 1024)
+    def test_send_message_stops_reading_an_oversized_attachment(self):
+        conv = Conversation.objects.create(listing=self.listing)
+        conv.participants.add(self.buyer, self.seller)
+
+        self.client.login(username='buyer', password='BuyerPass123!')
+        response = self.client.post(
+            reverse('chat:send_message', kwargs={'conversation_pk': conv.pk}),
+            {
+                'content': 'fisier mare',
+                'attachments': SimpleUploadedFile('mare.txt', b'a' * 4096, content_type='text/plain'),
+            },
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Message.objects.exists())
+
+    def test_upload_handler_skips_a_file_on_its_first_chunk(self):
+        """A wrong signature is rejected before the rest of the file is read."""
+        handler = AttachmentUploadHandler()
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file('attachments', 'poza.jpg', 'image/jpeg', None)
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b'<html>nu este imagine</html>', 0)
+
+        # Disallowed extensions are skipped before any byte is read.
+        with self.assertRaises(SkipFile):
+            handler.new_file('attachments', 'script.exe', 'application/octet-stream', None)
+
     def test_office_attachment_with_too_many_zip_members_is_rejected(self):
         """Office archives with excessive member counts are rejected."""
         buffer = BytesIO()
@@ -319,6 +498,56 @@ class ChatConversationTestCase(TestCase):
                 self.assertEqual(response['Pragma'], 'no-cache')
                 self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
 
+    def test_attachment_download_offloads_to_the_web_server(self):
+        """With offload on, the view returns headers only and never reads the file."""
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                conv = Conversation.objects.create(listing=self.listing)
+                conv.participants.add(self.buyer, self.seller)
+                message = Message.objects.create(
+                    conversation=conv, sender=self.buyer, receiver=self.seller, content='cu atasament'
+                )
+                attachment = MessageAttachment.objects.create(
+                    message=message,
+                    file=SimpleUploadedFile('oferta finala.pdf', b'%PDF-1.4', content_type='application/pdf'),
+                )
+                url = reverse('chat:attachment_download', kwargs={'pk': attachment.pk})
+                self.client.login(username='buyer', password='BuyerPass123!')
+
+                with patch.object(FieldFile, 'open', side_effect=AssertionError('file read by the worker')):
+                    with override_settings(CHAT_ATTACHMENT_OFFLOAD='nginx'):
+                        accel = self.client.get(url)
+                    with override_settings(CHAT_ATTACHMENT_OFFLOAD='sendfile'):
+                        sendfile = self.client.get(url)
+
+        self.assertFalse(accel.streaming)
+        self.assertEqual(accel.content, b'')
+        self.assertEqual(accel['X-Accel-Redirect'], f'/internal/media/{quote(attachment.file.name)}')
+        self.assertEqual(accel['Content-Type'], 'application/pdf')
+        self.assertIn('attachment; filename="oferta_finala.pdf"', accel['Content-Disposition'])
+        self.assertEqual(accel['Cache-Control'], 'private, no-store')
+        self.assertEqual(accel['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(sendfile['X-Sendfile'], attachment.file.path)
+        self.assertEqual(sendfile.content, b'')
+
+    @override_settings(CHAT_ATTACHMENT_OFFLOAD='nginx')
+    def test_attachment_download_streams_files_the_web_server_cannot_reach(self):
+        """Attachments outside the local media root are never offloaded."""
+        conv = Conversation.objects.create(listing=self.listing)
+        conv.participants.add(self.buyer, self.seller)
+        message = Message.objects.create(conversation=conv, sender=self.buyer, receiver=self.seller, content='remote')
+        with patch.object(MessageAttachment._meta.get_field('file'), 'storage', InMemoryStorage()):
+            attachment = MessageAttachment.objects.create(
+                message=message,
+                file=SimpleUploadedFile('oferta.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            )
+            self.client.login(username='buyer', password='BuyerPass123!')
+            response = self.client.get(reverse('chat:attachment_download', kwargs={'pk': attachment.pk}))
+
+        self.assertTrue(response.streaming)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4')
+
     def test_attachment_download_denied_for_non_participant(self):
         """Users outside the conversation cannot download the attachments."""
         with tempfile.TemporaryDirectory() as media_root:
@@ -382,6 +611,117 @@ class ChatConsumerTestCase(TransactionTestCase):
     async def _close(comm):
         await comm.send_input({"type": "websocket.disconnect", "code": 1000})
 
+    def test_history_frame_returns_older_messages_to_the_requester(self):
+        messages = [
+            Message.objects.create(conversation=self.conv, sender=self.seller, receiver=self.buyer, content=f'vechi {n}')
+            for n in range(3)
+        ]
+
+        async def run():
+            comm = self._communicator(self.buyer)
+            self.assertTrue(await self._connect(comm))
+            await comm.send_input(
+                {"type": "websocket.receive", "text": json.dumps({"type": "history", "before": messages[2].pk})}
+            )
+            payload = {}
+            for _ in range(5):
+                out = await comm.receive_output(timeout=5)
+                payload = json.loads(out.get("text", "{}")) if out.get("type") == "websocket.send" else {}
+                if payload.get("type") == "history":
+                    break
+            await self._close(comm)
+            return payload
+
+        payload = async_to_sync(run)()
+        self.assertEqual([m["content"] for m in payload["messages"]], ["vechi 0", "vechi 1"])
+        self.assertFalse(payload["has_more"])
+
+    @staticmethod
+    async def _frames(comm, wanted, count):
+        """The next ``count`` frames of type ``wanted``; other frames are skipped.
+
+        Only read frames that are expected: a ``receive_output`` timeout
+        cancels the consumer. Check for extra frames with ``receive_nothing``.
+        """
+        frames = []
+        while len(frames) < count:
+            out = await comm.receive_output(timeout=5)
+            payload = json.loads(out.get("text", "{}")) if out.get("type") == "websocket.send" else {}
+            if payload.get("type") == wanted:
+                frames.append(payload)
+        return frames
+
+    @override_settings(CHAT_TYPING_INTERVAL_MS=10_000, CHAT_TYPING_STOP_MS=200)
+    def test_typing_burst_is_coalesced_with_a_trailing_stop(self):
+        async def run():
+            buyer_comm = self._communicator(self.buyer)
+            seller_comm = self._communicator(self.seller)
+            self.assertTrue(await self._connect(buyer_comm))
+            self.assertTrue(await self._connect(seller_comm))
+            for _ in range(10):
+                await buyer_comm.send_input({"type": "websocket.receive", "text": json.dumps({"type": "typing"})})
+            frames = await self._frames(seller_comm, "typing", 2)
+            self.assertTrue(await seller_comm.receive_nothing(timeout=0.5))
+            for comm in (buyer_comm, seller_comm):
+                await self._close(comm)
+                # Counters are added to the cache when the connection ends.
+                await comm.wait(timeout=5)
+            return frames
+
+        frames = async_to_sync(run)()
+        self.assertEqual([frame["typing"] for frame in frames], [True, False])
+        stats = chat_event_stats()
+        self.assertEqual(stats["typing_sent"], 1)
+        self.assertEqual(stats["typing_suppressed"], 9)
+
+    def test_read_frames_are_skipped_while_nothing_is_unread(self):
+        Message.objects.create(conversation=self.conv, sender=self.seller, receiver=self.buyer, content='necitit')
+
+        async def run():
+            seller_comm = self._communicator(self.seller)
+            buyer_comm = self._communicator(self.buyer)
+            self.assertTrue(await self._connect(seller_comm))
+            self.assertTrue(await self._connect(buyer_comm))
+            for _ in range(3):
+                await buyer_comm.send_input({"type": "websocket.receive", "text": json.dumps({"type": "read"})})
+            frames = await self._frames(seller_comm, "read", 1)
+            self.assertTrue(await seller_comm.receive_nothing(timeout=0.5))
+            for comm in (buyer_comm, seller_comm):
+                await self._close(comm)
+                await comm.wait(timeout=5)
+            return frames
+
+        frames = async_to_sync(run)()
+        # The buyer's connect; the read frames had nothing left to mark.
+        self.assertEqual(len(frames), 1)
+        self.assertFalse(Message.objects.filter(receiver=self.buyer, is_read=False).exists())
+        stats = chat_event_stats()
+        # Both connects publish a receipt, the three read frames are skipped.
+        self.assertEqual(stats["read_sent"], 2)
+        self.assertEqual(stats["read_skipped"], 3)
+
+    def test_receipt_is_published_after_the_page_marked_messages_read(self):
+        Message.objects.create(conversation=self.conv, sender=self.seller, receiver=self.buyer, content='necitit')
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse('chat:conversation', kwargs={'pk': self.conv.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Message.objects.filter(receiver=self.buyer, is_read=False).exists())
+
+        async def run():
+            seller_comm = self._communicator(self.seller)
+            buyer_comm = self._communicator(self.buyer)
+            self.assertTrue(await self._connect(seller_comm))
+            self.assertTrue(await self._connect(buyer_comm))
+            frames = await self._frames(seller_comm, "read", 1)
+            self.assertTrue(await seller_comm.receive_nothing(timeout=0.5))
+            for comm in (buyer_comm, seller_comm):
+                await self._close(comm)
+                await comm.wait(timeout=5)
+            return frames
+
+        frames = async_to_sync(run)()
+        self.assertEqual(frames, [{"type": "read", "by": self.buyer.pk}])
+
     def test_non_participant_is_rejected(self):
         async def run():
             comm = self._communicator(self.outsider)
@@ -467,3 +807,57 @@ class ChatConsumerTestCase(TransactionTestCase):
         self.assertEqual(limited, {"type": "error", "code": "rate_limited"})
         self.assertTrue(Message.objects.filter(conversation=self.conv, content="primul mesaj").exists())
         self.assertFalse(Message.objects.filter(conversation=self.conv, content="al doilea mesaj").exists())
+
+    def test_message_path_reuses_cached_conversation(self):
+        queries = CaptureQueriesContext(connection)
+
+        async def run():
+            comm = self._communicator(self.buyer)
+            self.assertTrue(await self._connect(comm))
+            # Thread-sensitive DB hops run on this test's thread and its
+            # connection, so the context is entered and exited there too.
+            await sync_to_async(queries.__enter__)()
+            try:
+                await comm.send_input(
+                    {"type": "websocket.receive", "text": json.dumps({"type": "message", "content": "un singur drum"})}
+                )
+                received = None
+                for _ in range(5):
+                    out = await comm.receive_output(timeout=5)
+                    payload = json.loads(out.get("text", "{}")) if out.get("type") == "websocket.send" else {}
+                    if payload.get("type") == "message":
+                        received = payload
+                        break
+            finally:
+                await sync_to_async(queries.__exit__)(None, None, None)
+            await self._close(comm)
+            return received
+
+        received = async_to_sync(run)()
+        # The whole message path: message INSERT, conversation touch,
+        # preference lookup, unread-notification lookup, notification INSERT.
+        # No conversation/participant/sender/attachment re-fetch. Transaction
+        # control (SQLite's explicit BEGIN) is not counted.
+        statements = [
+            query["sql"] for query in queries.captured_queries
+            if not query["sql"].startswith(("BEGIN", "SAVEPOINT", "RELEASE SAVEPOINT"))
+        ]
+        self.assertEqual(len(statements), 5, statements)
+        self.assertEqual(received["message"]["content"], "un singur drum")
+        self.assertEqual(received["message"]["attachments"], [])
+        self.assertEqual(Notification.objects.get(recipient=self.seller).count, 1)
+
+
+class ChatBenchmarkCommandTestCase(TransactionTestCase):
+    @override_settings(CHANNEL_LAYERS=INMEMORY_LAYER)
+    def test_benchmark_reports_throughput_and_cleans_up(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        output = StringIO()
+        call_command("benchmark_chat", "--messages", "6", "--connections", "2", stdout=output)
+
+        self.assertIn("Chat messages: 6 over 2 connections", output.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith="bench-chat-").exists())
+        self.assertFalse(Message.objects.exists())
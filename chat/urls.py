@@ -10,6 +10,7 @@ urlpatterns = [
 
     # Conversations
     path('conversation/<int:pk>/', views.conversation_view, name='conversation'),
+    path('conversation/<int:pk>/messages/', views.message_history_view, name='message_history'),
     path('start/<slug:listing_slug>/', views.start_conversation_view, name='start_conversation'),
 
     # AJAX actions
@@ -1,5 +1,23 @@
+"""Chat attachment checks.
+
+``AttachmentUploadHandler`` validates attachments while the request body is
+still streaming: the extension and declared type are checked when a file
+part starts, the magic bytes on its first chunk, the size on every chunk,
+and image dimensions from the header alone. A file that fails is skipped
+without being buffered or spooled to disk; one over ``MAX_ATTACHMENT_SIZE``
+stops reading the request. The handler hashes each accepted file (SHA-256)
+in the same pass and leaves its verdict on the uploaded file, so
+``is_allowed_chat_attachment`` does not read it again.
+"""
+import hashlib
 import zipfile
+from io import BytesIO
 
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
 from PIL import Image as PilImage
 
 MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024
@@ -35,6 +53,26 @@ ALLOWED_CONTENT_TYPES = {
 }
 
 OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ZIP_SIGNATURE = b"PK\x03\x04"
+MAGIC_BYTES = {
+    "jpg": (b"\xff\xd8\xff",),
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "gif": (b"GIF87a", b"GIF89a"),
+    "pdf": (b"%PDF-",),
+    "doc": (OLE_SIGNATURE,),
+    "xls": (OLE_SIGNATURE,),
+    "docx": (ZIP_SIGNATURE,),
+    "xlsx": (ZIP_SIGNATURE,),
+}
+IMAGE_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "gif": "GIF", "webp": "WEBP"}
+# Bytes kept for sniffing; enough for the image headers PIL needs in practice
+# (a JPEG's EXIF segment can precede its frame header).
+SNIFF_BYTES = 64 * 1024
+# Longest prefix the magic byte checks look at (RIFF....WEBP).
+MAGIC_BYTES_LENGTH = 12
+TEXT_SAMPLE_BYTES = 4096
+ATTACHMENT_FIELD = "attachments"
 
 
 def get_extension(uploaded_file):
@@ -43,6 +81,11 @@ def get_extension(uploaded_file):
 
 
 def is_allowed_chat_attachment(uploaded_file):
+    verdict = getattr(uploaded_file, "chat_attachment_allowed", None)
+    if verdict is not None:
+        # Already checked while streaming (AttachmentUploadHandler).
+        return verdict
+
     ext = get_extension(uploaded_file)
     if ext not in ALLOWED_EXTENSIONS:
         return False
@@ -133,3 +176,155 @@ def _is_valid_office_zip(uploaded_file, ext):
 
 def _is_unsafe_zip_name(name):
     return name.startswith(("/", "\\")) or ".." in name.replace("\\", "/").split("/")
+
+
+def _has_magic_bytes(ext, head):
+    if ext == "webp":
+        return head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    return head.startswith(MAGIC_BYTES[ext])
+
+
+def _image_header_verdict(ext, head, complete):
+    """True/False from the image header in ``head``, or None while more
+    bytes are needed. Nothing is decoded: PIL only parses the header."""
+    try:
+        with PilImage.open(BytesIO(head)) as image:
+            width, height = image.size
+            image_format = image.format
+    except PilImage.DecompressionBombError:
+        return False
+    except Exception:  # noqa: BLE001 - a truncated header is retried with more bytes.
+        return False if complete else None
+    return image_format == IMAGE_FORMATS[ext] and 0 < width * height <= PilImage.MAX_IMAGE_PIXELS
+
+
+def _is_plain_text_sample(sample, truncated):
+    if b"\x00" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multi-byte character cut by the end of the sample is fine.
+        return truncated and exc.reason == "unexpected end of data"
+    return True
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """Validate, hash and store chat attachments in one pass over the upload.
+
+    Insert it first in ``request.upload_handlers`` before the body is read.
+    Files of other fields go to the default handlers. ``rejected`` is set
+    when the request was cut short because an attachment was too large.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.rejected = None
+        self.files_seen = 0
+        self.active = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        limit = MAX_ATTACHMENTS_PER_MESSAGE * MAX_ATTACHMENT_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if content_length > limit:
+            # Don't read a body that cannot be a valid message.
+            self.rejected = "too_large"
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.active = False
+        if field_name != ATTACHMENT_FIELD:
+            return
+        self.files_seen += 1
+        self.ext = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+        declared = (content_type or "").lower()
+        if (
+            self.files_seen > MAX_ATTACHMENTS_PER_MESSAGE
+            or self.ext not in ALLOWED_EXTENSIONS
+            or (declared and declared not in ALLOWED_CONTENT_TYPES[self.ext])
+        ):
+            raise SkipFile()
+        self.active = True
+        self.head = b""
+        self.verdict = None  # None: undecided until more bytes arrive
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.file = BytesIO()
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        self.size += len(raw_data)
+        if self.size > MAX_ATTACHMENT_SIZE:
+            self.rejected = "too_large"
+            raise StopUpload(connection_reset=True)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[: SNIFF_BYTES - len(self.head)]
+            if self.verdict is None:
+                self._sniff(complete=False)
+        self.digest.update(raw_data)
+        self._write(raw_data)
+        return None
+
+    def _sniff(self, complete):
+        """Decide on the file from the bytes seen so far (``verdict`` stays
+        None while undecided); raise SkipFile as soon as it fails."""
+        head = self.head
+        if len(head) < MAGIC_BYTES_LENGTH and not complete:
+            return
+        if self.ext != "txt" and not _has_magic_bytes(self.ext, head):
+            self.verdict = False
+        elif self.ext in IMAGE_EXTENSIONS:
+            self.verdict = _image_header_verdict(self.ext, head, complete or len(head) >= SNIFF_BYTES)
+        elif self.ext == "txt":
+            if complete or len(head) >= TEXT_SAMPLE_BYTES:
+                self.verdict = _is_plain_text_sample(head[:TEXT_SAMPLE_BYTES], truncated=self.size > TEXT_SAMPLE_BYTES)
+        elif self.ext in {"pdf", "doc", "xls"}:
+            self.verdict = True
+        # docx/xlsx are decided from the zip directory once complete.
+        if self.verdict is False:
+            raise SkipFile()
+
+    def _write(self, raw_data):
+        if isinstance(self.file, BytesIO) and self.size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            # Past the in-memory limit, spool to disk like Django's handlers.
+            spooled = TemporaryUploadedFile(
+                self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+            )
+            spooled.write(self.file.getvalue())
+            self.file = spooled
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        self.file.seek(0)
+        if isinstance(self.file, BytesIO):
+            uploaded = InMemoryUploadedFile(
+                self.file, self.field_name, self.file_name, self.content_type, file_size,
+                self.charset, self.content_type_extra,
+            )
+        else:
+            uploaded = self.file
+            uploaded.size = file_size
+        if self.verdict is None:
+            try:
+                self._sniff(complete=True)
+            except SkipFile:
+                self.verdict = False
+        if self.verdict is None and self.ext in {"docx", "xlsx"}:
+            # The zip directory sits at the end: read it (not the members).
+            self.verdict = _is_valid_office_zip(uploaded, self.ext)
+        uploaded.chat_attachment_allowed = bool(self.verdict)
+        uploaded.sha256 = self.digest.hexdigest()
+        # The parser closes every handler's ``file`` when a later file is
+        # skipped; this one now belongs to the request.
+        del self.file
+        return uploaded
+
+    def upload_interrupted(self):
+        if self.active and hasattr(self, "file"):
+            self.file.close()
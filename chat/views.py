@@ -1,51 +1,66 @@
 import logging
 import mimetypes
+from urllib.parse import quote
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.core.files.storage import FileSystemStorage
 from django.core.paginator import Paginator
-from django.db.models import Count, Q
-from django.http import FileResponse, JsonResponse
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import content_disposition_header
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_GET, require_POST
 from django_ratelimit.decorators import ratelimit
 
 from listings.models import Listing
+from Micu_market.db_routing import primary_reads
 from notifications.models import Notification
+from notifications.services import notify
+from notifications.unread import unread_message_count
 
 from .broadcast import broadcast_message
+from .history import HISTORY_PAGE_SIZE, UnknownAnchor, message_window, serialize_window
 from .models import Conversation, Message, MessageAttachment
-from .validators import MAX_ATTACHMENTS_PER_MESSAGE, is_allowed_chat_attachment
+from .validators import (
+    MAX_ATTACHMENT_SIZE,
+    MAX_ATTACHMENTS_PER_MESSAGE,
+    AttachmentUploadHandler,
+    is_allowed_chat_attachment,
+)
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
 @login_required
 def inbox_view(request):
-    """Inbox with all of the user's conversations"""
+    """Inbox with all of the user's conversations.
+
+    Renders from the conversation rows alone (participant pair, last message
+    and unread counters are maintained on Conversation): one query per page,
+    however long the threads are.
+    """
     conversations = Conversation.objects.filter(
-        participants=request.user,
-        is_active=True
-    ).select_related('listing').prefetch_related('participants', 'messages').annotate(
-        unread_count=Count('messages', filter=Q(messages__receiver=request.user, messages__is_read=False))
+        Q(participant_a=request.user) | Q(participant_b=request.user),
+        is_active=True,
+    ).select_related(
+        'listing', 'participant_a__profile', 'participant_b__profile'
     ).order_by('-updated_at')
-    
-    # Add the other participant to each conversation
-    for conversation in conversations:
-        conversation.other_participant = conversation.get_other_participant(request.user)
-    
+
     # Paginare
     paginator = Paginator(conversations, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+
+    for conversation in page_obj:
+        conversation.other_participant = conversation.get_other_participant(request.user)
+        conversation.unread_count = conversation.unread_count_for(request.user)
     
-    # Total unread messages — a single direct query (don't iterate all conversations)
-    total_unread = Message.objects.filter(
-        receiver=request.user,
-        is_read=False
-    ).count()
+    # Total unread messages — the cached counter (see notifications/unread.py)
+    total_unread = unread_message_count(request.user.id)
     
     context = {
         'page_obj': page_obj,
@@ -54,6 +69,7 @@ def inbox_view(request):
     return render(request, 'chat/inbox.html', context)
 
 @login_required
+@primary_reads
 def conversation_view(request, pk):
     """View for a specific conversation"""
     conversation = get_object_or_404(
@@ -65,25 +81,42 @@ def conversation_view(request, pk):
     # Mark messages as read
     conversation.mark_as_read(request.user)
     
-    # Get the messages
-    messages_list = conversation.messages.select_related('sender', 'receiver').prefetch_related('attachments').order_by('created_at')
-    
-    # Paginate the messages
-    paginator = Paginator(messages_list, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Only the newest window; older ones are fetched on scroll (chat/history.py)
+    history, has_older = message_window(conversation.pk)
     
     # The other participant
     other_participant = conversation.get_other_participant(request.user)
     
     context = {
         'conversation': conversation,
-        'page_obj': page_obj,
+        'history': history,
+        'has_older': has_older,
         'other_participant': other_participant,
         'listing': conversation.listing
     }
     return render(request, 'chat/conversation.html', context)
 
+@login_required
+@require_GET
+@ratelimit(key='user', rate=settings.SENSITIVE_READ_RATE, method='GET', block=True)
+@primary_reads
+def message_history_view(request, pk):
+    """A window of messages before (?before=<id>) or after (?after=<id>) a message"""
+    conversation = get_object_or_404(Conversation, pk=pk, participants=request.user)
+    try:
+        before = int(request.GET['before']) if 'before' in request.GET else None
+        after = int(request.GET['after']) if 'after' in request.GET else None
+        limit = int(request.GET.get('limit', HISTORY_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'Parametri invalizi.'}, status=400)
+    if before is not None and after is not None:
+        return JsonResponse({'error': 'Folosește doar unul dintre before și after.'}, status=400)
+    try:
+        history, has_more = message_window(conversation.pk, before=before, after=after, limit=limit)
+    except UnknownAnchor:
+        return JsonResponse({'error': 'Mesajul nu există în această conversație.'}, status=404)
+    return JsonResponse({'messages': serialize_window(history), 'has_more': has_more})
+
 @login_required
 @require_POST
 @ratelimit(key='user', rate=settings.CHAT_START_RATE, method='POST', block=True)
@@ -133,11 +166,30 @@ def start_conversation_view(request, listing_slug):
         messages.error(request, "A apărut o eroare. Te rugăm încearcă din nou.")
         return redirect('listings:detail', slug=listing_slug)
 
+@csrf_exempt
 @login_required
 @require_POST
 @ratelimit(key='user', rate='60/m', block=True)
 def send_message_view(request, conversation_pk):
-    """Send a message in a conversation"""
+    """Send a message in a conversation.
+
+    Attachments are validated while the body streams (AttachmentUploadHandler),
+    so the handler goes in before anything reads request.POST, including the
+    CSRF check, which runs right after in _send_message.
+    """
+    handler = AttachmentUploadHandler(request)
+    request.upload_handlers.insert(0, handler)
+    request.POST  # noqa: B018 - parse the body now, through the handler
+    if handler.rejected:
+        return JsonResponse(
+            {'error': f'Atașamentele pot avea cel mult {MAX_ATTACHMENT_SIZE // (1024 * 1024)} MB fiecare.'},
+            status=413,
+        )
+    return _send_message(request, conversation_pk)
+
+
+@csrf_protect
+def _send_message(request, conversation_pk):
     conversation = get_object_or_404(
         Conversation,
         pk=conversation_pk,
@@ -160,22 +212,23 @@ def send_message_view(request, conversation_pk):
         receiver=receiver,
         content=content
     )
-    Notification.objects.create(
-        recipient=receiver,
-        notification_type="new_message",
-        title="Mesaj nou",
-        message=f"{request.user.get_full_name() or request.user.username} ți-a trimis un mesaj.",
-        related_object_type="Conversation",
-        related_object_id=conversation.pk,
-        action_url=conversation.get_absolute_url(),
-    )
+    if receiver is not None:
+        notify(Notification(
+            recipient=receiver,
+            notification_type="new_message",
+            title="Mesaj nou",
+            message=f"{request.user.get_full_name() or request.user.username} ți-a trimis un mesaj.",
+            related_object_type="Conversation",
+            related_object_id=conversation.pk,
+            action_url=conversation.get_absolute_url(),
+        ))
     
     # Process attachments with server-side validation.
     if 'attachments' in request.FILES:
         uploaded_files = request.FILES.getlist('attachments')[:MAX_ATTACHMENTS_PER_MESSAGE]
         for file in uploaded_files:
             if is_allowed_chat_attachment(file):
-                MessageAttachment.objects.create(message=message, file=file)
+                MessageAttachment.objects.create(message=message, file=file, sha256=getattr(file, 'sha256', ''))
 
     # Broadcast live to the other participant (connected over WebSocket). The
     # sender's own client de-duplicates by id, so it isn't shown twice vs the AJAX response.
@@ -235,15 +288,11 @@ def search_users_view(request):
 @ratelimit(key='user', rate=settings.SENSITIVE_READ_RATE, method='GET', block=True)
 def get_unread_count(request):
     """Return the unread message count"""
-    count = Message.objects.filter(
-        receiver=request.user,
-        is_read=False
-    ).count()
-    
-    return JsonResponse({'unread_count': count})
+    return JsonResponse({'unread_count': unread_message_count(request.user.id)})
 
 @login_required
 @require_GET
+@primary_reads
 def attachment_download_view(request, pk):
     """Serve attachments only to conversation participants."""
     attachment = get_object_or_404(
@@ -252,12 +301,25 @@ def attachment_download_view(request, pk):
         message__conversation__participants=request.user,
     )
     content_type, _ = mimetypes.guess_type(attachment.filename)
-    response = FileResponse(
-        attachment.file.open('rb'),
-        as_attachment=attachment.file_type != 'image',
-        filename=attachment.filename,
-        content_type=content_type or 'application/octet-stream',
-    )
+    as_attachment = attachment.file_type != 'image'
+    # The web server can only send files from the local media root.
+    offload = settings.CHAT_ATTACHMENT_OFFLOAD if isinstance(attachment.file.storage, FileSystemStorage) else ''
+    if offload:
+        # The web server sends the bytes; this worker is free as soon as the
+        # headers are returned.
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        response['Content-Disposition'] = content_disposition_header(as_attachment, attachment.filename)
+        if offload == 'nginx':
+            response['X-Accel-Redirect'] = quote(f"{settings.CHAT_ATTACHMENT_ACCEL_PREFIX}{attachment.file.name}")
+        else:
+            response['X-Sendfile'] = attachment.file.path
+    else:
+        response = FileResponse(
+            attachment.file.open('rb'),
+            as_attachment=as_attachment,
+            filename=attachment.filename,
+            content_type=content_type or 'application/octet-stream',
+        )
     response['Cache-Control'] = 'private, no-store'
     response['Pragma'] = 'no-cache'
     response['X-Content-Type-Options'] = 'nosniff'
@@ -1,6 +1,7 @@
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils import timezone
@@ -8,12 +9,16 @@ from django.utils import timezone
 from categories.models import Category
 from favorites.models import Favorite
 from listings.models import Listing, ListingReport
+from listings.view_counts import PENDING_VIEWS_KEY, record_view
 
 User = get_user_model()
 
 
 class SellerInsightsTestCase(TestCase):
     def setUp(self):
+        # Buffered views live in the cache, not in the rolled-back database.
+        cache.delete(PENDING_VIEWS_KEY)
+        self.addCleanup(cache.delete, PENDING_VIEWS_KEY)
         self.client = Client()
         self.seller = User.objects.create_user(
             username="seller",
@@ -80,3 +85,12 @@ class SellerInsightsTestCase(TestCase):
         self.assertEqual(response.context["stats"]["active_promotions"], 1)
         self.assertEqual(list(response.context["top_listings"]), [self.listing])
         self.assertEqual(len(response.context["open_reports"]), 1)
+
+    def test_seller_insights_include_unflushed_views(self):
+        record_view(self.listing.pk, 8)
+
+        self.client.login(username="seller", password="SellerPass123!")
+        response = self.client.get(reverse("dashboard:seller_insights"))
+
+        self.assertEqual(response.context["stats"]["total_views"], 50)
+        self.assertEqual(response.context["top_listings"][0].views_count, 50)
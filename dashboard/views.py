@@ -5,6 +5,7 @@ from django.shortcuts import render
 from django.utils import timezone
 
 from listings.models import Listing, ListingReport
+from listings.view_counts import merge_pending_views, pending_views
 
 # Create your views here.
 
@@ -52,6 +53,11 @@ def seller_insights_view(request):
         ),
     )
 
+    # Views not yet flushed from the buffer (listings/view_counts.py).
+    unflushed_views = sum(pending_views(base_listings.values_list("pk", flat=True)).values())
+    top_listings = merge_pending_views(top_listings[:8])
+    top_listings.sort(key=lambda listing: listing.views_count, reverse=True)
+
     open_reports = (
         ListingReport.objects.filter(
             listing__owner=request.user,
@@ -66,11 +72,11 @@ def seller_insights_view(request):
             "total_listings": stats["total_listings"] or 0,
             "active_listings": stats["active_listings"] or 0,
             "sold_listings": stats["sold_listings"] or 0,
-            "total_views": stats["total_views"] or 0,
+            "total_views": (stats["total_views"] or 0) + unflushed_views,
             "total_favorites": stats["total_favorites"] or 0,
             "active_promotions": stats["active_promotions"] or 0,
         },
-        "top_listings": top_listings[:8],
+        "top_listings": top_listings,
         "open_reports": open_reports,
     }
     return render(request, "dashboard/seller_insights.html", context)
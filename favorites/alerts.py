@@ -1,12 +1,19 @@
 """Saved-search alerts: notify users when new listings match their searches."""
 import logging
+from collections import defaultdict
+from itertools import chain
 from urllib.parse import urlencode
 
+from django.db import DEFAULT_DB_ALIAS
 from django.urls import reverse
 from django.utils import timezone
 
-from api.filters import filter_listing_queryset
+from categories.tree import get_category_tree
+from listings.models import Listing
+from listings.search import apply_listing_search
+from Micu_market.db_routing import replica_snapshot_time
 from notifications.models import Notification
+from notifications.services import notify_many
 
 from .models import SavedSearch
 
@@ -22,62 +29,167 @@ def _results_url(saved_search):
         query["search"] = params["q"]
     if params.get("category"):
         query["category"] = params["category"]
-    for key in ("min_price", "max_price", "city"):
-        if params.get(key):
+    for key in ("min_price", "max_price"):
+        if params.get(key) is not None:
             query[key] = params[key]
+    if params.get("city"):
+        query["city"] = params["city"]
     url = reverse("listings:list")
     return f"{url}?{urlencode(query)}" if query else url
 
 
-def _new_matches(saved_search, since):
-    listings, _search_applied, _sort_by = filter_listing_queryset(saved_search.get_search_params())
-    listings = listings.filter(
-        created_at__gt=since,
-        needs_moderation_review=False,
-    ).exclude(owner=saved_search.user)
-    if saved_search.county:
-        listings = listings.filter(county__icontains=saved_search.county)
-    return listings.order_by("-created_at")
+def _active_category_subtrees(category_ids):
+    """``{category_id: {ids of it and its active descendants}}`` for active categories.
+
+    Same lookups as ``api.filters`` (the cached category tree): an inactive
+    category resolves to no filter at all, and inactive children cut their
+    branch off.
+    """
+    if not category_ids:
+        return {}
+    tree = get_category_tree()
+    return {
+        category_id: set(tree.subtree_ids(category_id))
+        for category_id in category_ids
+        if tree.resolve(category_id)
+    }
+
+
+def _price_bound(value):
+    # Same acceptance rules as api.filters._apply_decimal_filter.
+    if value is None or value < 0:
+        return None
+    return value
+
+
+class SavedSearchIndex:
+    """Active saved searches indexed by the category ids they cover.
+
+    A new listing is only compared with the searches registered under its own
+    category plus those without a (resolvable) category; city, county and
+    price are then checked in memory with the same semantics as
+    ``api.filters.filter_listing_queryset`` (``icontains`` and inclusive
+    bounds).
+    """
+
+    def __init__(self, saved_searches):
+        self.saved_searches = list(saved_searches)
+        subtrees = _active_category_subtrees({search.category_id for search in self.saved_searches if search.category_id})
+        self.by_category = defaultdict(list)
+        self.any_category = []
+        for search in self.saved_searches:
+            subtree = subtrees.get(search.category_id)
+            if subtree is None:
+                self.any_category.append(search)
+            else:
+                for category_id in subtree:
+                    self.by_category[category_id].append(search)
+
+    def candidates(self, listing):
+        return chain(self.by_category.get(listing.category_id, ()), self.any_category)
+
+    @staticmethod
+    def matches_filters(search, listing):
+        if listing.created_at <= search.last_checked_at or listing.owner_id == search.user_id:
+            return False
+        if search.city and search.city.upper() not in listing.city.upper():
+            return False
+        if search.county and search.county.upper() not in listing.county.upper():
+            return False
+        min_price = _price_bound(search.min_price)
+        if min_price is not None and listing.price < min_price:
+            return False
+        max_price = _price_bound(search.max_price)
+        if max_price is not None and listing.price > max_price:
+            return False
+        return True
+
+
+def _text_matches(candidate_ids_by_query):
+    """Run each distinct search text once, restricted to its candidate listings.
+
+    Full-text rank and trigram similarity only exist in the database, so text
+    matching stays there; it costs one query per distinct query string with
+    candidates, not one per saved search.
+    """
+    matched = {}
+    for query, listing_ids in candidate_ids_by_query.items():
+        queryset, _search_applied = apply_listing_search(Listing.objects.filter(pk__in=listing_ids), query)
+        matched[query] = set(queryset.values_list("pk", flat=True))
+    return matched
+
+
+def _alert_notification(saved_search, matches):
+    titles = ", ".join(f'"{listing.title}"' for listing in matches[:MAX_TITLES_IN_MESSAGE])
+    extra = len(matches) - MAX_TITLES_IN_MESSAGE
+    if extra > 0:
+        titles += f" și încă {extra}"
+    return Notification(
+        recipient_id=saved_search.user_id,
+        notification_type="new_listing_in_category",
+        title=f"Anunțuri noi pentru „{saved_search.name}”",
+        message=f"Au apărut anunțuri noi care se potrivesc căutării tale: {titles}.",
+        related_object_type="SavedSearch",
+        related_object_id=saved_search.pk,
+        action_url=_results_url(saved_search),
+        # Respect the per-search email opt-out while keeping the
+        # in-app notification: already-emailed items are skipped
+        # by the email dispatcher.
+        is_emailed=not saved_search.email_notifications,
+    )
 
 
 def run_saved_search_alerts(limit_per_search=20):
-    """Check every active saved search for new listings and notify the owner.
+    """Match the listings created since the oldest watermark against all
+    active saved searches and notify the owners.
 
-    Returns a summary dict for the background-job result payload.
+    The listings are fetched once and matched through :class:`SavedSearchIndex`,
+    so the cost follows the number of new listings rather than the number of
+    saved searches. Returns a summary dict for the background-job result payload.
     """
     run_started = timezone.now()
-    checked = 0
-    notified = 0
-
-    saved_searches = SavedSearch.objects.filter(is_active=True).select_related("user", "category")
-    for saved_search in saved_searches:
-        matches = list(_new_matches(saved_search, saved_search.last_checked_at)[:limit_per_search])
-        checked += 1
-
+    saved_searches = list(SavedSearch.objects.filter(is_active=True).select_related("category"))
+    if not saved_searches:
+        return {"checked": 0, "notified": 0}
+
+    index = SavedSearchIndex(saved_searches)
+    watermark = min(search.last_checked_at for search in saved_searches)
+    new_listings = (
+        Listing.objects.filter(status="active", needs_moderation_review=False, created_at__gt=watermark)
+        .only("id", "title", "category_id", "owner_id", "city", "county", "price", "created_at")
+        .order_by("-created_at", "-id")
+    )
+
+    candidates = defaultdict(list)
+    candidate_ids_by_query = defaultdict(set)
+    for listing in new_listings:
+        for search in index.candidates(listing):
+            if index.matches_filters(search, listing):
+                candidates[search.pk].append(listing)
+                query = (search.search_query or "").strip()
+                if query:
+                    candidate_ids_by_query[query].add(listing.pk)
+    text_matches = _text_matches(candidate_ids_by_query)
+    if new_listings.db != DEFAULT_DB_ALIAS:
+        # Read on a replica (Micu_market/db_routing.py): the next run starts
+        # from what the replica had replayed, so lagging listings are not skipped.
+        run_started = replica_snapshot_time(new_listings.db)
+
+    notifications = []
+    for search in saved_searches:
+        matches = candidates.get(search.pk, [])
+        query = (search.search_query or "").strip()
+        if query:
+            matches = [listing for listing in matches if listing.pk in text_matches[query]]
+        matches = matches[:limit_per_search]
         if matches:
-            titles = ", ".join(f'"{listing.title}"' for listing in matches[:MAX_TITLES_IN_MESSAGE])
-            extra = len(matches) - MAX_TITLES_IN_MESSAGE
-            if extra > 0:
-                titles += f" și încă {extra}"
-            Notification.objects.create(
-                recipient=saved_search.user,
-                notification_type="new_listing_in_category",
-                title=f"Anunțuri noi pentru „{saved_search.name}”",
-                message=f"Au apărut anunțuri noi care se potrivesc căutării tale: {titles}.",
-                related_object_type="SavedSearch",
-                related_object_id=saved_search.pk,
-                action_url=_results_url(saved_search),
-                # Respect the per-search email opt-out while keeping the
-                # in-app notification: already-emailed items are skipped
-                # by the email dispatcher.
-                is_emailed=not saved_search.email_notifications,
-            )
-            notified += 1
+            notifications.append(_alert_notification(search, matches))
             logger.info(
                 "saved_search_alert",
-                extra={"saved_search_id": saved_search.pk, "matches": len(matches)},
+                extra={"saved_search_id": search.pk, "matches": len(matches)},
             )
 
-        SavedSearch.objects.filter(pk=saved_search.pk).update(last_checked_at=run_started)
+    notified = len(notify_many(notifications))
+    SavedSearch.objects.filter(pk__in=[search.pk for search in saved_searches]).update(last_checked_at=run_started)
 
-    return {"checked": checked, "notified": notified}
+    return {"checked": len(saved_searches), "notified": notified}
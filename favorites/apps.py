@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FavoritesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'favorites'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (drops cached favorite state on writes)
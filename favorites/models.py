@@ -60,9 +60,9 @@ class SavedSearch(models.Model):
             params['q'] = self.search_query
         if self.category:
             params['category'] = self.category.id
-        if self.min_price:
+        if self.min_price is not None:
             params['min_price'] = self.min_price
-        if self.max_price:
+        if self.max_price is not None:
             params['max_price'] = self.max_price
         if self.city:
             params['city'] = self.city
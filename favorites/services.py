@@ -0,0 +1,60 @@
+"""Favorite state for the listings on a page.
+
+Pages that draw a heart on listing cards only need to know which of *their*
+listings the user saved, not the user's whole favorites list (thousands of
+rows for some users). ``favorited_listing_ids`` answers for the given
+listing IDs from the cache, with one ``IN`` query for the ones not cached
+yet. Each ``(user, listing)`` answer is cached on its own key, so a page is
+one ``get_many``; favorite writes drop the key (favorites/signals.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Favorite
+
+
+def _state_key(user_id, listing_id):
+    return f"favorites:state:{user_id}:{listing_id}"
+
+
+def favorited_listing_ids(user, listing_ids):
+    """The subset of ``listing_ids`` that ``user`` has saved to favorites."""
+    listing_ids = set(listing_ids)
+    if not listing_ids or user is None or not user.is_authenticated:
+        return set()
+    keys = {_state_key(user.pk, listing_id): listing_id for listing_id in listing_ids}
+    cached = cache.get_many(list(keys))
+    favorited = {keys[key] for key, value in cached.items() if value}
+    missing = listing_ids - {keys[key] for key in cached}
+    if missing:
+        found = set(
+            Favorite.objects.filter(user=user, listing_id__in=missing).values_list('listing_id', flat=True)
+        )
+        favorited |= found
+        cache.set_many(
+            {_state_key(user.pk, listing_id): listing_id in found for listing_id in missing},
+            settings.FAVORITE_STATE_CACHE_SECONDS,
+        )
+    return favorited
+
+
+def mark_favorited(user, listings):
+    """Set ``is_favorited`` on already loaded listings."""
+    listings = list(listings)
+    favorited = favorited_listing_ids(user, (listing.pk for listing in listings))
+    for listing in listings:
+        listing.is_favorited = listing.pk in favorited
+    return listings
+
+
+def is_favorited(user, listing):
+    return listing.pk in favorited_listing_ids(user, [listing.pk])
+
+
+def forget_favorite_state(user_id, listing_id):
+    key = _state_key(user_id, listing_id)
+    cache.delete(key)
+    # Again after commit: a request may have cached the pre-commit state in
+    # between.
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,12 @@
+"""Drop cached favorite state (favorites/services.py) when favorites change."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Favorite
+from .services import forget_favorite_state
+
+
+@receiver(post_save, sender=Favorite, dispatch_uid="favorites_forget_state_on_save")
+@receiver(post_delete, sender=Favorite, dispatch_uid="favorites_forget_state_on_delete")
+def forget_state_on_change(sender, instance, **kwargs):
+    forget_favorite_state(instance.user_id, instance.listing_id)
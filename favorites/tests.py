@@ -1,15 +1,30 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 
+from api.filters import filter_listing_queryset
 from categories.models import Category
 from listings.models import Listing
 
 from .models import Favorite, SavedSearch
+from .services import favorited_listing_ids
 
 User = get_user_model()
 
 
+def _new_matches(saved_search, since):
+    """Reference query for one saved search; the alert matcher must agree with it."""
+    listings, _search_applied, _sort_by = filter_listing_queryset(saved_search.get_search_params())
+    listings = listings.filter(
+        created_at__gt=since,
+        needs_moderation_review=False,
+    ).exclude(owner=saved_search.user)
+    if saved_search.county:
+        listings = listings.filter(county__icontains=saved_search.county)
+    return listings.order_by('-created_at')
+
+
 class FavoriteSecurityTestCase(TestCase):
     def setUp(self):
         self.client = Client()
@@ -56,6 +71,53 @@ class FavoriteSecurityTestCase(TestCase):
         self.assertFalse(Favorite.objects.filter(id=self.favorite.id).exists())
 
 
+class FavoriteStateTestCase(TestCase):
+    """Page-scoped favorite lookups (favorites/services.py)"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='fan', password='FanPass123!')
+        self.owner = User.objects.create_user(username='seller', password='SellerPass123!')
+        self.category = Category.objects.create(name='Stare favorite', slug='stare-favorite', is_active=True)
+        self.listings = [
+            Listing.objects.create(
+                title=f'Anunț {index}', description='Test', price=10 + index, owner=self.owner,
+                category=self.category, city='Cluj', status='active',
+            )
+            for index in range(3)
+        ]
+        Favorite.objects.create(user=self.user, listing=self.listings[0])
+
+    def test_lookup_checks_only_page_ids_and_is_cached(self):
+        ids = [listing.pk for listing in self.listings[:2]]
+        with self.assertNumQueries(1):
+            self.assertEqual(favorited_listing_ids(self.user, ids), {ids[0]})
+        with self.assertNumQueries(0):
+            self.assertEqual(favorited_listing_ids(self.user, ids), {ids[0]})
+
+    def test_toggle_views_drop_cached_state(self):
+        listing = self.listings[1]
+        self.assertEqual(favorited_listing_ids(self.user, [listing.pk]), set())
+
+        self.client.login(username='fan', password='FanPass123!')
+        self.client.post(reverse('favorites:toggle'), {'listing_id': listing.pk})
+        self.assertEqual(favorited_listing_ids(self.user, [listing.pk]), {listing.pk})
+
+        response = self.client.post(
+            '/api/v1/favorites/toggle', {'listing_id': listing.pk}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['is_favorited'], False)
+        self.assertEqual(favorited_listing_ids(self.user, [listing.pk]), set())
+
+    def test_api_results_report_favorite_state(self):
+        self.client.login(username='fan', password='FanPass123!')
+
+        results = self.client.get('/api/v1/listings').json()['results']
+
+        state = {result['id']: result['is_favorited'] for result in results}
+        self.assertEqual(state, {self.listings[0].pk: True, self.listings[1].pk: False, self.listings[2].pk: False})
+
+
 class SavedSearchAlertsTestCase(TestCase):
     """Tests for the saved-search alerts background job."""
 
@@ -174,3 +236,81 @@ class SavedSearchAlertsTestCase(TestCase):
         self.assertEqual(result['notified'], 1)
         claimed.refresh_from_db()
         self.assertEqual(claimed.status, BackgroundJob.STATUS_SUCCEEDED)
+
+    def test_batch_matcher_agrees_with_per_search_query(self):
+        from notifications.models import Notification
+
+        from .alerts import run_saved_search_alerts
+
+        child = Category.objects.create(name='SS Copil', slug='ss-copil', parent=self.category, is_active=True)
+        hidden = Category.objects.create(name='SS Ascuns', slug='ss-ascuns', is_active=False)
+        since = self.saved_search.last_checked_at
+        searches = [
+            self.saved_search,
+            SavedSearch.objects.create(
+                user=self.watcher, name='Cluj', city='clu', county='cluj', last_checked_at=since,
+            ),
+            SavedSearch.objects.create(
+                user=self.watcher, name='Text', search_query='laptop', min_price=600, last_checked_at=since,
+            ),
+            SavedSearch.objects.create(
+                user=self.seller, name='Inactiva', category=hidden, max_price=700, last_checked_at=since,
+            ),
+        ]
+        self._create_listing('Laptop bun', 800, county='Cluj')
+        self._create_listing('Mouse', 50, category=child, county='Cluj')
+        self._create_listing('Laptop copil', 650, category=child)
+        self._create_listing('Laptop inactiv', 10, status='sold')
+        self._create_listing('Laptop moderare', 700, needs_moderation_review=True)
+        expected = {search.pk: [listing.title for listing in _new_matches(search, since)] for search in searches}
+
+        result = run_saved_search_alerts()
+
+        self.assertEqual(result['checked'], 4)
+        for search in searches:
+            notification = Notification.objects.filter(related_object_id=search.pk).first()
+            if not expected[search.pk]:
+                self.assertIsNone(notification)
+                continue
+            for title in expected[search.pk]:
+                self.assertIn(title, notification.message)
+        self.assertEqual(result['notified'], sum(1 for titles in expected.values() if titles))
+
+    def test_zero_max_price_only_matches_free_listings(self):
+        from notifications.models import Notification
+
+        from .alerts import run_saved_search_alerts
+
+        self.saved_search.max_price = 0
+        self.saved_search.save(update_fields=['max_price'])
+        self._create_listing('Laptop bun', 800)
+        self._create_listing('Laptop gratuit', 0)
+        expected = [listing.title for listing in _new_matches(self.saved_search, self.saved_search.last_checked_at)]
+
+        result = run_saved_search_alerts()
+
+        self.assertEqual(expected, ['Laptop gratuit'])
+        self.assertEqual(result['notified'], 1)
+        notification = Notification.objects.get(recipient=self.watcher)
+        self.assertIn('Laptop gratuit', notification.message)
+        self.assertNotIn('Laptop bun', notification.message)
+        self.assertIn('max_price=0', notification.action_url)
+
+    def test_query_count_does_not_grow_with_saved_searches(self):
+        from .alerts import run_saved_search_alerts
+
+        for index in range(20):
+            SavedSearch.objects.create(
+                user=self.watcher,
+                name=f'Căutare {index}',
+                category=self.category,
+                max_price=1000 + index,
+                last_checked_at=self.saved_search.last_checked_at,
+            )
+        self._create_listing('Laptop bun', 800)
+
+        # saved searches, categories, new listings, preferences, bulk insert,
+        # watermark update
+        with self.assertNumQueries(6):
+            result = run_saved_search_alerts()
+        self.assertEqual(result['notified'], 21)
@@ -2,7 +2,10 @@ import os
 
 # gunicorn.conf.py
 bind = os.getenv("GUNICORN_BIND", "unix:/home/micu/Micu_market/gunicorn.sock")
-workers = 3
+workers = int(os.getenv("GUNICORN_WORKERS", "3"))
+# Threads per worker for sync views and database_sync_to_async (read by
+# asgiref); settings_production sizes the DB pool to match.
+os.environ.setdefault("ASGI_THREADS", "16")
 worker_class = "uvicorn_worker.UvicornWorker"  # ASGI worker (pachet uvicorn-worker; cel din uvicorn.workers e deprecat/incompatibil)
 worker_connections = 1000
 max_requests = 1000
@@ -5,9 +5,15 @@ from django.utils import timezone
 
 from favorites.models import SavedSearch
 from jobs.models import BackgroundJob
+from listings.similarity import unindexed_listings
+from listings.view_counts import has_pending_views
 from notifications.models import Notification
 
 SAVED_SEARCH_ALERTS_INTERVAL_MINUTES = 15
+UNREAD_RECONCILE_INTERVAL_MINUTES = 60
+VIEW_COUNT_FLUSH_INTERVAL_MINUTES = 1
+SIMILAR_UPDATE_INTERVAL_MINUTES = 15
+SIMILAR_REBUILD_INTERVAL_MINUTES = 24 * 60
 
 
 class Command(BaseCommand):
@@ -31,21 +37,47 @@ class Command(BaseCommand):
             queued += 1
             self.stdout.write(self.style.SUCCESS("Queued favorites.saved_search_alerts"))
 
+        if self._interval_job_due("notifications.reconcile_unread_counts", UNREAD_RECONCILE_INTERVAL_MINUTES):
+            BackgroundJob.enqueue("notifications.reconcile_unread_counts", priority=150)
+            queued += 1
+            self.stdout.write(self.style.SUCCESS("Queued notifications.reconcile_unread_counts"))
+
+        if has_pending_views() and self._interval_job_due(
+            "listings.flush_view_counts", VIEW_COUNT_FLUSH_INTERVAL_MINUTES
+        ):
+            BackgroundJob.enqueue("listings.flush_view_counts", priority=120)
+            queued += 1
+            self.stdout.write(self.style.SUCCESS("Queued listings.flush_view_counts"))
+
+        if self._interval_job_due("listings.rebuild_similar", SIMILAR_REBUILD_INTERVAL_MINUTES):
+            BackgroundJob.enqueue("listings.rebuild_similar", priority=200)
+            queued += 1
+            self.stdout.write(self.style.SUCCESS("Queued listings.rebuild_similar"))
+        elif unindexed_listings().exists() and self._interval_job_due(
+            "listings.update_similar", SIMILAR_UPDATE_INTERVAL_MINUTES
+        ):
+            BackgroundJob.enqueue("listings.update_similar", priority=160)
+            queued += 1
+            self.stdout.write(self.style.SUCCESS("Queued listings.update_similar"))
+
         self.stdout.write(self.style.SUCCESS(f"Periodic jobs queued: {queued}"))
 
     def _should_queue_saved_search_alerts(self):
         if not SavedSearch.objects.filter(is_active=True).exists():
             return False
+        return self._interval_job_due("favorites.saved_search_alerts", SAVED_SEARCH_ALERTS_INTERVAL_MINUTES)
+
+    def _interval_job_due(self, name, interval_minutes):
         job_in_flight = BackgroundJob.objects.filter(
-            name="favorites.saved_search_alerts",
+            name=name,
             status__in=[BackgroundJob.STATUS_QUEUED, BackgroundJob.STATUS_RUNNING],
         ).exists()
         if job_in_flight:
             return False
-        # The enqueue timer fires every minute; alerts only need to run
-        # every SAVED_SEARCH_ALERTS_INTERVAL_MINUTES.
-        recent_cutoff = timezone.now() - timedelta(minutes=SAVED_SEARCH_ALERTS_INTERVAL_MINUTES)
+        # The enqueue timer fires every minute; interval jobs only need to
+        # run every ``interval_minutes``.
+        recent_cutoff = timezone.now() - timedelta(minutes=interval_minutes)
         return not BackgroundJob.objects.filter(
-            name="favorites.saved_search_alerts",
+            name=name,
             finished_at__gte=recent_cutoff,
         ).exists()
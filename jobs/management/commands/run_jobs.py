@@ -1,9 +1,11 @@
+import signal
 import socket
 import uuid
 
 from django.core.management.base import BaseCommand
 
 from jobs.models import BackgroundJob
+from jobs.worker import JobWorkerPool
 
 
 class Command(BaseCommand):
@@ -13,6 +15,31 @@ class Command(BaseCommand):
         parser.add_argument("--limit", type=int, default=10)
         parser.add_argument("--worker-id", default="")
         parser.add_argument("--recover-stale-minutes", type=int, default=30)
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="Rulează continuu cu un pool de workeri, până la SIGTERM.",
+        )
+        parser.add_argument("--concurrency", type=int, default=4, help="Numărul de workeri (thread-uri) în modul daemon.")
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Secunde între verificări când coada e goală (fallback pe lângă LISTEN/NOTIFY pe PostgreSQL).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Câte joburi revendică un worker într-o singură interogare.",
+        )
+        parser.add_argument("--heartbeat-interval", type=float, default=60.0)
+        parser.add_argument("--report-interval", type=float, default=300.0)
+        parser.add_argument(
+            "--exit-when-idle",
+            action="store_true",
+            help="În modul daemon, oprește workerii când coada e goală.",
+        )
 
     def handle(self, *args, **options):
         worker_id = options["worker_id"] or f"{socket.gethostname()}:{uuid.uuid4()}"
@@ -20,17 +47,53 @@ class Command(BaseCommand):
         if recovered:
             self.stdout.write(self.style.WARNING(f"Recovered stale jobs: {recovered}"))
 
+        if options["daemon"]:
+            self._run_daemon(worker_id, options)
+            return
+
         processed = 0
-        for _ in range(options["limit"]):
-            job = BackgroundJob.claim_next(worker_id=worker_id)
-            if job is None:
+        remaining = options["limit"]
+        while remaining > 0:
+            jobs = BackgroundJob.claim_batch(min(remaining, max(options["batch_size"], 1)), worker_id=worker_id)
+            if not jobs:
                 break
-            try:
-                result = job.execute()
-            except Exception as exc:  # noqa: BLE001 - worker must continue with remaining jobs.
-                self.stderr.write(self.style.ERROR(f"FAIL {job.id} {job.name}: {exc}"))
-            else:
-                processed += 1
-                self.stdout.write(self.style.SUCCESS(f"OK {job.id} {job.name}: {result}"))
+            remaining -= len(jobs)
+            for job in jobs:
+                ok, value = job.run_handler()
+                job.finish(ok, value)
+                if ok:
+                    processed += 1
+                    self.stdout.write(self.style.SUCCESS(f"OK {job.id} {job.name}: {value}"))
+                else:
+                    self.stderr.write(self.style.ERROR(f"FAIL {job.id} {job.name}: {value}"))
 
         self.stdout.write(self.style.SUCCESS(f"Jobs processed: {processed}"))
+
+    def _run_daemon(self, worker_id, options):
+        pool = JobWorkerPool(
+            concurrency=options["concurrency"],
+            worker_id=worker_id,
+            poll_interval=options["poll_interval"],
+            heartbeat_interval=options["heartbeat_interval"],
+            recover_stale_minutes=options["recover_stale_minutes"],
+            exit_when_idle=options["exit_when_idle"],
+            on_report=lambda summary: self.stdout.write(self._format_summary(summary)),
+            report_interval=options["report_interval"],
+            batch_size=options["batch_size"],
+        )
+        previous_handlers = {sig: signal.signal(sig, pool.stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+        self.stdout.write(f"Job worker {worker_id} started with {pool.concurrency} workers")
+        try:
+            summary = pool.run()
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+        self.stdout.write(self.style.SUCCESS(self._format_summary(summary)))
+        self.stdout.write(self.style.SUCCESS(f"Jobs processed: {summary['succeeded']}"))
+
+    def _format_summary(self, summary):
+        return (
+            f"Jobs: {summary['processed']} ({summary['failed']} failed) in {summary['elapsed_seconds']}s, "
+            f"{summary['jobs_per_second']} jobs/s, run p50/p95 {summary['run_p50_ms']}/{summary['run_p95_ms']} ms, "
+            f"wait p50/p95 {summary['wait_p50_ms']}/{summary['wait_p95_ms']} ms"
+        )
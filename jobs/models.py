@@ -2,10 +2,26 @@ import socket
 import uuid
 from datetime import timedelta
 
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.db.models import F
 from django.utils import timezone
 
+# Columns written when a claimed job finishes (BackgroundJob.finish).
+FINISH_FIELDS = ["status", "result", "run_after", "last_error", "finished_at", "locked_by", "locked_at", "updated_at"]
+
+# LISTEN/NOTIFY channel that wakes idle workers (see jobs.worker).
+JOBS_NOTIFY_CHANNEL = "micu_jobs"
+
+
+def notify_jobs_queued():
+    """Wake listening workers. Postgres delivers NOTIFY only when the current
+    transaction commits (and drops it on rollback); a no-op on other databases,
+    where workers simply poll."""
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, '')", [JOBS_NOTIFY_CHANNEL])
+
 
 class BackgroundJob(models.Model):
     STATUS_QUEUED = "queued"
@@ -50,18 +66,22 @@ class BackgroundJob(models.Model):
 
     @classmethod
     def enqueue(cls, name, payload=None, *, priority=100, max_attempts=3, run_after=None):
-        return cls.objects.create(
+        job = cls.objects.create(
             name=name,
             payload=payload or {},
             priority=priority,
             max_attempts=max_attempts,
             run_after=run_after or timezone.now(),
         )
+        # Delayed jobs are found by the workers' fallback poll instead.
+        if job.run_after <= timezone.now():
+            notify_jobs_queued()
+        return job
 
     @classmethod
     def recover_stale(cls, older_than_minutes=30):
         cutoff = timezone.now() - timedelta(minutes=older_than_minutes)
-        return cls.objects.filter(
+        recovered = cls.objects.filter(
             status=cls.STATUS_RUNNING,
             locked_at__lt=cutoff,
             attempts__lt=F("max_attempts"),
@@ -71,6 +91,14 @@ class BackgroundJob(models.Model):
             locked_at=None,
             last_error="Recovered stale running job.",
         )
+        if recovered:
+            notify_jobs_queued()
+        return recovered
+
+    @classmethod
+    def heartbeat(cls, job_ids):
+        """Refresh locked_at for jobs still running so recover_stale leaves them alone."""
+        return cls.objects.filter(pk__in=job_ids, status=cls.STATUS_RUNNING).update(locked_at=timezone.now())
 
     @classmethod
     def claim_next(cls, worker_id=None):
@@ -95,6 +123,80 @@ class BackgroundJob(models.Model):
             job.save(update_fields=["status", "locked_by", "locked_at", "started_at", "finished_at", "attempts", "updated_at"])
             return job
 
+    @classmethod
+    def claim_batch(cls, n, worker_id=None):
+        """Atomically claim up to ``n`` eligible jobs, in queue order.
+
+        On PostgreSQL this is a single ``UPDATE ... WHERE id IN (SELECT ...
+        FOR UPDATE SKIP LOCKED LIMIT n) RETURNING *`` round trip; other
+        databases fall back to a short locking transaction.
+        """
+        worker = worker_id or f"{socket.gethostname()}:{uuid.uuid4()}"
+        now = timezone.now()
+        if n < 1:
+            return []
+        if connection.vendor == "postgresql":
+            table = connection.ops.quote_name(cls._meta.db_table)
+            jobs = list(
+                cls.objects.raw(
+                    f"""
+                    UPDATE {table}
+                    SET status = %s, locked_by = %s, locked_at = %s, started_at = %s,
+                        finished_at = NULL, attempts = attempts + 1, updated_at = %s
+                    WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE status = %s AND run_after <= %s AND attempts < max_attempts
+                        ORDER BY priority, run_after, created_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                    """,  # noqa: S608 - only the model's own table name is interpolated.
+                    [cls.STATUS_RUNNING, worker, now, now, now, cls.STATUS_QUEUED, now, n],
+                )
+            )
+        else:
+            with transaction.atomic():
+                ids = list(
+                    cls.objects.select_for_update(skip_locked=True)
+                    .filter(status=cls.STATUS_QUEUED, run_after__lte=now, attempts__lt=F("max_attempts"))
+                    .order_by("priority", "run_after", "created_at")
+                    .values_list("pk", flat=True)[:n]
+                )
+                cls.objects.filter(pk__in=ids).update(
+                    status=cls.STATUS_RUNNING,
+                    locked_by=worker,
+                    locked_at=now,
+                    started_at=now,
+                    finished_at=None,
+                    attempts=F("attempts") + 1,
+                    updated_at=now,
+                )
+                jobs = list(cls.objects.filter(pk__in=ids))
+        return sorted(jobs, key=lambda job: (job.priority, job.run_after, job.created_at))
+
+    def finish(self, ok, value):
+        """Record one :meth:`run_handler` outcome as soon as it is known."""
+        now = timezone.now()
+        if ok:
+            self._set_succeeded(value, now)
+        else:
+            self._set_failed(value, now)
+        self.updated_at = now
+        self.save(update_fields=FINISH_FIELDS)
+
+    def run_handler(self):
+        """Run the job's handler without persisting the outcome.
+
+        Returns ``(True, result)`` or ``(False, exception)``.
+        """
+        from .registry import get_job_handler
+
+        try:
+            return True, get_job_handler(self.name)(self.payload)
+        except Exception as exc:  # noqa: BLE001 - the failure is recorded on the job.
+            return False, exc
+
     def execute(self):
         from .registry import get_job_handler
 
@@ -108,23 +210,29 @@ class BackgroundJob(models.Model):
             self.mark_succeeded(result)
             return result
 
-    def mark_succeeded(self, result=None):
+    def _set_succeeded(self, result, now):
         self.status = self.STATUS_SUCCEEDED
         self.result = result or {}
         self.last_error = ""
-        self.finished_at = timezone.now()
+        self.finished_at = now
         self.locked_by = ""
         self.locked_at = None
-        self.save(update_fields=["status", "result", "last_error", "finished_at", "locked_by", "locked_at", "updated_at"])
 
-    def mark_failed(self, exc):
+    def _set_failed(self, exc, now):
         self.last_error = str(exc)
         self.locked_by = ""
         self.locked_at = None
         if self.attempts >= self.max_attempts:
             self.status = self.STATUS_FAILED
-            self.finished_at = timezone.now()
+            self.finished_at = now
         else:
             self.status = self.STATUS_QUEUED
-            self.run_after = timezone.now() + timedelta(minutes=min(self.attempts * 5, 60))
+            self.run_after = now + timedelta(minutes=min(self.attempts * 5, 60))
+
+    def mark_succeeded(self, result=None):
+        self._set_succeeded(result, timezone.now())
+        self.save(update_fields=["status", "result", "last_error", "finished_at", "locked_by", "locked_at", "updated_at"])
+
+    def mark_failed(self, exc):
+        self._set_failed(exc, timezone.now())
         self.save(update_fields=["status", "run_after", "last_error", "finished_at", "locked_by", "locked_at", "updated_at"])
@@ -1,5 +1,10 @@
 from favorites.alerts import run_saved_search_alerts
+from listings.bulk_import import fetch_listing_images
+from listings.similarity import rebuild_similar_listings, update_similar_listings
+from listings.view_counts import flush_view_counts
+from Micu_market.db_routing import replica_reads
 from notifications.email import send_pending_notification_emails
+from notifications.unread import reconcile_unread_counts
 
 
 def send_pending_notification_emails_job(payload):
@@ -12,14 +17,52 @@ def saved_search_alerts_job(payload):
     return run_saved_search_alerts(limit_per_search=limit_per_search)
 
 
+def reconcile_unread_counts_job(payload):
+    active_hours = int(payload.get("active_hours", 24))
+    return reconcile_unread_counts(active_hours=active_hours)
+
+
+def flush_view_counts_job(payload):
+    return flush_view_counts()
+
+
+def import_listing_images_job(payload):
+    return fetch_listing_images(payload.get("images", {}))
+
+
+def rebuild_similar_listings_job(payload):
+    return rebuild_similar_listings()
+
+
+def update_similar_listings_job(payload):
+    limit = int(payload.get("limit", 500))
+    return update_similar_listings(limit=limit)
+
+
 JOB_HANDLERS = {
     "notifications.send_pending_emails": send_pending_notification_emails_job,
     "favorites.saved_search_alerts": saved_search_alerts_job,
+    "notifications.reconcile_unread_counts": reconcile_unread_counts_job,
+    "listings.flush_view_counts": flush_view_counts_job,
+    "listings.rebuild_similar": rebuild_similar_listings_job,
+    "listings.update_similar": update_similar_listings_job,
+    "listings.import_images": import_listing_images_job,
+}
+
+
+# Jobs whose reads may be served by a read replica (Micu_market/db_routing.py);
+# their writes still go to the primary.
+REPLICA_READ_JOBS = {
+    "favorites.saved_search_alerts",
+    "listings.rebuild_similar",
 }
 
 
 def get_job_handler(name):
     try:
-        return JOB_HANDLERS[name]
+        handler = JOB_HANDLERS[name]
     except KeyError as exc:
         raise ValueError(f"Unknown background job: {name}") from exc
+    if name in REPLICA_READ_JOBS:
+        return replica_reads(handler)
+    return handler
@@ -1,10 +1,16 @@
+import threading
+import time
+from datetime import timedelta
 from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.core import mail
 from django.core.management import CommandError, call_command
-from django.test import TestCase, override_settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 
 from notifications.models import Notification
 
@@ -91,3 +97,146 @@ class BackgroundJobTests(TestCase):
             BackgroundJob.objects.filter(name="notifications.send_pending_emails").count(),
             1,
         )
+
+    def test_enqueue_periodic_jobs_queues_view_count_flush_only_when_buffered(self):
+        from django.core.cache import cache
+
+        from listings.view_counts import PENDING_VIEWS_KEY, record_view
+
+        cache.clear()
+        self.addCleanup(cache.delete, PENDING_VIEWS_KEY)
+        call_command("enqueue_periodic_jobs", stdout=StringIO())
+        self.assertFalse(BackgroundJob.objects.filter(name="listings.flush_view_counts").exists())
+
+        record_view(123)
+        call_command("enqueue_periodic_jobs", stdout=StringIO())
+        call_command("enqueue_periodic_jobs", stdout=StringIO())
+        self.assertEqual(BackgroundJob.objects.filter(name="listings.flush_view_counts").count(), 1)
+
+    def test_heartbeat_keeps_long_running_job_from_stale_recovery(self):
+        BackgroundJob.enqueue("notifications.send_pending_emails")
+        job = BackgroundJob.claim_next(worker_id="test-worker")
+        BackgroundJob.objects.filter(pk=job.pk).update(locked_at=job.locked_at - timedelta(hours=1))
+
+        BackgroundJob.heartbeat([job.pk])
+
+        self.assertEqual(BackgroundJob.recover_stale(older_than_minutes=30), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_RUNNING)
+
+
+    def test_claim_batch_takes_due_jobs_in_priority_order(self):
+        low = BackgroundJob.enqueue("notifications.send_pending_emails", priority=200)
+        high = BackgroundJob.enqueue("notifications.send_pending_emails", priority=10)
+        BackgroundJob.enqueue("notifications.send_pending_emails", priority=100)
+        BackgroundJob.enqueue(
+            "notifications.send_pending_emails",
+            priority=1,
+            run_after=timezone.now() + timedelta(hours=1),
+        )
+
+        claimed = BackgroundJob.claim_batch(2, worker_id="batch-worker")
+
+        self.assertEqual([job.priority for job in claimed], [10, 100])
+        self.assertEqual(claimed[0].pk, high.pk)
+        self.assertTrue(all(job.status == BackgroundJob.STATUS_RUNNING for job in claimed))
+        self.assertTrue(all(job.attempts == 1 and job.locked_by == "batch-worker" for job in claimed))
+        low.refresh_from_db()
+        self.assertEqual(low.status, BackgroundJob.STATUS_QUEUED)
+        self.assertEqual(len(BackgroundJob.claim_batch(10, worker_id="batch-worker")), 1)
+
+    def test_finish_records_successes_and_requeues_failures(self):
+        ok_job = BackgroundJob.enqueue("notifications.send_pending_emails")
+        failing_job = BackgroundJob.enqueue("notifications.send_pending_emails", max_attempts=2)
+        claimed = {job.pk: job for job in BackgroundJob.claim_batch(5, worker_id="batch-worker")}
+
+        claimed[ok_job.pk].finish(True, {"sent": 3})
+        claimed[failing_job.pk].finish(False, RuntimeError("boom"))
+
+        ok_job.refresh_from_db()
+        failing_job.refresh_from_db()
+        self.assertEqual(ok_job.status, BackgroundJob.STATUS_SUCCEEDED)
+        self.assertEqual(ok_job.result, {"sent": 3})
+        self.assertIsNotNone(ok_job.finished_at)
+        self.assertEqual(failing_job.status, BackgroundJob.STATUS_QUEUED)
+        self.assertEqual(failing_job.locked_by, "")
+        self.assertIn("boom", failing_job.last_error)
+        self.assertGreater(failing_job.run_after, timezone.now())
+
+
+class JobWorkerDaemonTests(TransactionTestCase):
+    """The daemon runs real worker threads, so jobs must be committed."""
+
+    def test_daemon_pool_drains_queue_and_reports_summary(self):
+        for _ in range(5):
+            BackgroundJob.enqueue("notifications.send_pending_emails", {"limit": 10})
+
+        out = StringIO()
+        call_command(
+            "run_jobs",
+            "--daemon",
+            "--concurrency",
+            "3",
+            "--poll-interval",
+            "0.05",
+            "--exit-when-idle",
+            stdout=out,
+        )
+
+        self.assertFalse(BackgroundJob.objects.exclude(status=BackgroundJob.STATUS_SUCCEEDED).exists())
+        self.assertEqual(
+            BackgroundJob.objects.values("locked_by").distinct().count(),
+            1,  # locked_by is cleared once a job succeeds
+        )
+        self.assertIn("Jobs processed: 5", out.getvalue())
+        self.assertIn("jobs/s", out.getvalue())
+
+    def test_each_job_is_recorded_before_the_next_one_in_the_batch_runs(self):
+        from jobs.worker import JobWorkerPool
+
+        first = BackgroundJob.enqueue("notifications.send_pending_emails", priority=1)
+        BackgroundJob.enqueue("notifications.send_pending_emails", priority=2)
+        seen = []
+
+        def handler(payload):
+            seen.append(BackgroundJob.objects.get(pk=first.pk).status)
+            return {}
+
+        with patch.dict("jobs.registry.JOB_HANDLERS", {"notifications.send_pending_emails": handler}):
+            summary = JobWorkerPool(concurrency=1, poll_interval=0.05, exit_when_idle=True, batch_size=10).run()
+
+        self.assertEqual(seen, [BackgroundJob.STATUS_RUNNING, BackgroundJob.STATUS_SUCCEEDED])
+        self.assertEqual(summary["succeeded"], 2)
+
+    def test_stop_signal_lets_workers_exit(self):
+        from jobs.worker import JobWorkerPool
+
+        pool = JobWorkerPool(concurrency=2, poll_interval=0.05)
+        pool.stop()
+
+        summary = pool.run()
+
+        self.assertEqual(summary["processed"], 0)
+
+    @skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY needs PostgreSQL")
+    def test_enqueue_notify_wakes_idle_worker_before_poll_interval(self):
+        from jobs.worker import JobWorkerPool
+
+        pool = JobWorkerPool(concurrency=1, poll_interval=60)
+        runner = threading.Thread(target=pool.run)
+        runner.start()
+        try:
+            time.sleep(0.5)  # let the listener subscribe and the worker go idle
+            job = BackgroundJob.enqueue("notifications.send_pending_emails", {"limit": 10})
+
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                job.refresh_from_db()
+                if job.status == BackgroundJob.STATUS_SUCCEEDED:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(job.status, BackgroundJob.STATUS_SUCCEEDED)
+        finally:
+            pool.stop()
+            runner.join(timeout=10)
+        self.assertFalse(runner.is_alive())
@@ -0,0 +1,278 @@
+"""Long-running job worker pool used by ``run_jobs --daemon``.
+
+Each worker thread claims up to ``batch_size`` jobs at once with
+``BackgroundJob.claim_batch`` (one ``UPDATE ... FOR UPDATE SKIP LOCKED
+RETURNING`` round trip), so several threads, processes or hosts can drain
+the same queue without double-processing. The jobs of a batch run one after
+another and each outcome is written as soon as its handler returns: a crash
+mid-batch only requeues the jobs that had not finished, never re-runs one
+that already succeeded. A single heartbeat thread
+refreshes ``locked_at`` for every in-flight job so ``recover_stale`` never
+requeues a job that is still running, and periodically recovers jobs from
+workers that really died. SIGTERM/SIGINT set a stop flag: workers finish
+their current batch and exit.
+
+On PostgreSQL a listener thread blocks on ``LISTEN`` for the channel that
+``BackgroundJob.enqueue`` notifies, so idle workers wake as soon as a job is
+committed instead of polling the queue index; ``poll_interval`` remains as
+the fallback that picks up delayed ``run_after`` jobs. Other databases (the
+SQLite/test setups) skip the listener and just poll.
+"""
+import logging
+import socket
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.db import close_old_connections, connections
+
+from .models import JOBS_NOTIFY_CHANNEL, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Latency percentiles are computed over the most recent jobs only.
+LATENCY_WINDOW = 10_000
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+class WorkerStats:
+    """Thread-safe throughput/latency counters for the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.succeeded = 0
+        self.failed = 0
+        self._durations = deque(maxlen=LATENCY_WINDOW)
+        self._waits = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, ok, duration, wait):
+        with self._lock:
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self._durations.append(duration)
+            self._waits.append(wait)
+
+    def summary(self):
+        with self._lock:
+            durations = list(self._durations)
+            waits = list(self._waits)
+            processed = self.succeeded + self.failed
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            return {
+                "processed": processed,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "elapsed_seconds": round(elapsed, 3),
+                "jobs_per_second": round(processed / elapsed, 3),
+                "run_p50_ms": round(_percentile(durations, 50) * 1000, 1),
+                "run_p95_ms": round(_percentile(durations, 95) * 1000, 1),
+                "wait_p50_ms": round(_percentile(waits, 50) * 1000, 1),
+                "wait_p95_ms": round(_percentile(waits, 95) * 1000, 1),
+            }
+
+
+class Wakeup:
+    """Generation counter + condition: waiters never miss a wake that happened
+    between their last (empty) claim and the start of their wait."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        with self._condition:
+            return self._generation
+
+    def notify_all(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def wait(self, seen_generation, timeout):
+        with self._condition:
+            return self._condition.wait_for(lambda: self._generation != seen_generation, timeout=timeout)
+
+
+class QueueListener(threading.Thread):
+    """Blocks on LISTEN and wakes the pool for every NOTIFY on the jobs channel."""
+
+    def __init__(self, wakeup, stop_event, timeout=1.0):
+        super().__init__(name="job-listener", daemon=True)
+        self.wakeup = wakeup
+        self.stop_event = stop_event
+        self.timeout = timeout
+
+    def run(self):
+        connection = connections["default"]
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    connection.ensure_connection()
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"LISTEN {JOBS_NOTIFY_CHANNEL}")
+                    # Jobs queued before LISTEN took effect are not announced.
+                    self.wakeup.notify_all()
+                    while not self.stop_event.is_set():
+                        # A short timeout keeps shutdown responsive.
+                        for _notify in connection.connection.notifies(timeout=self.timeout):
+                            self.wakeup.notify_all()
+                except Exception:  # noqa: BLE001 - reconnect; workers keep polling meanwhile.
+                    logger.warning("job_listener_failed", exc_info=True)
+                    connection.close()
+                    self.stop_event.wait(self.timeout)
+        finally:
+            connection.close()
+
+
+class JobWorkerPool:
+    def __init__(
+        self,
+        *,
+        concurrency=4,
+        worker_id="",
+        poll_interval=1.0,
+        heartbeat_interval=60.0,
+        recover_stale_minutes=30,
+        exit_when_idle=False,
+        on_report=None,
+        report_interval=60.0,
+        batch_size=10,
+    ):
+        self.concurrency = max(concurrency, 1)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{uuid.uuid4()}"
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.recover_stale_minutes = recover_stale_minutes
+        self.exit_when_idle = exit_when_idle
+        self.on_report = on_report
+        self.report_interval = report_interval
+        self.batch_size = max(batch_size, 1)
+
+        self.stats = WorkerStats()
+        self.stop_event = threading.Event()
+        self.wakeup = Wakeup()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+    def stop(self, *_args):
+        """Signal handler: finish current jobs, then exit."""
+        self.stop_event.set()
+        self.wakeup.notify_all()
+
+    @property
+    def uses_listen(self):
+        return connections["default"].vendor == "postgresql"
+
+    def run(self):
+        workers = [
+            threading.Thread(target=self._work, args=(f"{self.worker_id}:{index}",), name=f"job-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+        maintenance = threading.Thread(target=self._maintain, name="job-heartbeat", daemon=True)
+        listener = QueueListener(self.wakeup, self.stop_event) if self.uses_listen else None
+        if listener:
+            listener.start()
+        for thread in workers:
+            thread.start()
+        maintenance.start()
+        try:
+            for thread in workers:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        finally:
+            self.stop_event.set()
+            self.wakeup.notify_all()
+            maintenance.join(timeout=self.heartbeat_interval)
+            if listener:
+                listener.join(timeout=listener.timeout * 2)
+        return self.stats.summary()
+
+    def _work(self, worker_id):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                generation = self.wakeup.generation
+                try:
+                    jobs = BackgroundJob.claim_batch(self.batch_size, worker_id=worker_id)
+                except Exception:  # noqa: BLE001 - a DB hiccup must not kill the worker.
+                    logger.exception("job_claim_failed", extra={"worker_id": worker_id})
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                if not jobs:
+                    if self.exit_when_idle:
+                        return
+                    self.wakeup.wait(generation, self.poll_interval)
+                    continue
+
+                self._run_batch(jobs)
+        finally:
+            connections.close_all()
+
+    def _run_batch(self, jobs):
+        with self._in_flight_lock:
+            for job in jobs:
+                self._in_flight[job.pk] = job.locked_by
+        try:
+            for job in jobs:
+                self._run_job(job)
+        finally:
+            with self._in_flight_lock:
+                for job in jobs:
+                    self._in_flight.pop(job.pk, None)
+
+    def _run_job(self, job):
+        wait = max((job.started_at - job.run_after).total_seconds(), 0.0)
+        started = time.monotonic()
+        ok, value = job.run_handler()
+        duration = time.monotonic() - started
+        if not ok:
+            logger.warning(
+                "job_failed",
+                extra={"job_id": str(job.pk), "job_name": job.name},
+                exc_info=(type(value), value, value.__traceback__),
+            )
+        try:
+            job.finish(ok, value)
+        except Exception:  # noqa: BLE001 - recover_stale requeues the job; the batch goes on.
+            logger.exception("job_finish_failed", extra={"job_id": str(job.pk), "job_name": job.name})
+        finally:
+            # No more heartbeats: a job whose outcome was lost goes stale.
+            with self._in_flight_lock:
+                self._in_flight.pop(job.pk, None)
+        self.stats.record(ok, duration, wait)
+
+    def _maintain(self):
+        last_report = time.monotonic()
+        try:
+            while not self.stop_event.wait(self.heartbeat_interval):
+                close_old_connections()
+                try:
+                    with self._in_flight_lock:
+                        job_ids = list(self._in_flight)
+                    if job_ids:
+                        BackgroundJob.heartbeat(job_ids)
+                    recovered = BackgroundJob.recover_stale(self.recover_stale_minutes)
+                    if recovered:
+                        logger.warning("jobs_recovered_stale", extra={"count": recovered})
+                except Exception:  # noqa: BLE001 - keep heartbeating on transient DB errors.
+                    logger.exception("job_heartbeat_failed")
+
+                if self.on_report and time.monotonic() - last_report >= self.report_interval:
+                    self.on_report(self.stats.summary())
+                    last_report = time.monotonic()
+        finally:
+            connections.close_all()
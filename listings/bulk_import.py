@@ -0,0 +1,320 @@
+"""Bulk listing import from CSV or NDJSON catalogues.
+
+Rows are validated with ``ListingImportForm`` against a category map loaded
+once, then written in chunks: slugs for a whole chunk are allocated with
+one ``slug IN (...)`` query per round instead of an ``exists()`` probe per
+listing, risk scores are set before the insert (no second save), and each
+chunk is a single ``bulk_create``. Search documents are refreshed for the
+chunk with one UPDATE. Image URLs are not fetched inline: each chunk queues
+one ``listings.import_images`` background job, whose ``ListingImage`` saves
+optimize the files as uploads do.
+
+Columns (CSV header or NDJSON keys) are the ``ListingForm`` fields, with
+``category`` given as an ID or slug, plus an optional ``images`` list of
+URLs (space or ``|`` separated in CSV). Invalid rows are reported with
+their line number and skipped; the rest are imported.
+"""
+import csv
+import io
+import ipaddress
+import json
+import logging
+import socket
+import time
+import urllib.request
+from collections import defaultdict
+from dataclasses import dataclass, field
+from io import BytesIO
+from urllib.parse import urlparse
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+from PIL import Image as PilImage
+
+from api.result_cache import bump_result_generation
+from audit.utils import audit_log
+from categories.models import Category
+from jobs.models import BackgroundJob
+from Micu_market.page_cache import purge_surrogate_keys
+from notifications.services import notify_many
+
+from .forms import ListingImageForm, ListingImportForm
+from .models import Listing
+from .moderation import risk_review_notification, score_listing_risk
+from .search import refresh_search_documents
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 500
+MAX_IMAGES_PER_LISTING = 10
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+IMAGE_FETCH_TIMEOUT_SECONDS = 10
+# Leaves room for the "-<n>" suffix within Listing.slug's max_length.
+SLUG_BASE_LENGTH = 200
+_IMAGE_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file is not in a supported import format."""
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    flagged: int = 0
+    images_queued: int = 0
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add_error(self, row_number, errors):
+        self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "flagged": self.flagged,
+            "images_queued": self.images_queued,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+def detect_format(filename, declared=None):
+    fmt = (declared or "").lower() or (filename or "").rsplit(".", 1)[-1].lower()
+    if fmt in ("jsonl", "json"):
+        fmt = "ndjson"
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unsupported import format: {fmt or 'unknown'} (use csv or ndjson).")
+    return fmt
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row, error)`` for each record of a binary stream."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, {key: value for key, value in row.items() if key}, None
+            return
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield number, None, f"JSON invalid: {exc.msg}"
+                continue
+            if not isinstance(row, dict):
+                yield number, None, "Fiecare linie trebuie să fie un obiect JSON."
+                continue
+            yield number, row, None
+    finally:
+        # Leave the caller's stream open.
+        text.detach()
+
+
+def _image_urls(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace("|", " ").split()
+    return [str(url) for url in value][:MAX_IMAGES_PER_LISTING]
+
+
+def _category_map():
+    categories = {}
+    for category in Category.objects.filter(is_active=True):
+        categories[str(category.pk)] = category
+        categories[category.slug] = category
+    return categories
+
+
+def _build_listing(row, owner, categories):
+    data = {key: value for key, value in row.items() if key not in ("category", "images")}
+    data.setdefault("negotiable", True)
+    form = ListingImportForm(data)
+    errors = {} if form.is_valid() else {name: list(messages) for name, messages in form.errors.items()}
+    category = categories.get(str(row.get("category") or "").strip())
+    if category is None:
+        errors["category"] = ["Categoria nu există sau nu este activă."]
+    if errors:
+        return None, errors
+    listing = form.save(commit=False)
+    listing.category = category
+    listing.owner = owner
+    return listing, None
+
+
+def allocate_slugs(titles):
+    """Unique slugs for ``titles``, numbered like ``Listing.save`` does
+    (``base``, ``base-1``, ...), with one query per round of candidates."""
+    slugs = [None] * len(titles)
+    waiting = defaultdict(list)
+    for index, title in enumerate(titles):
+        waiting[slugify(title)[:SLUG_BASE_LENGTH] or "anunt"].append(index)
+    next_number = dict.fromkeys(waiting, 0)
+    while waiting:
+        candidates = {}
+        for base, indexes in waiting.items():
+            start = next_number[base]
+            next_number[base] = start + len(indexes)
+            for number in range(start, start + len(indexes)):
+                candidates[base if number == 0 else f"{base}-{number}"] = base
+        used = set(Listing.objects.filter(slug__in=list(candidates)).values_list("slug", flat=True))
+        for slug, base in candidates.items():
+            if slug not in used and waiting.get(base):
+                slugs[waiting[base].pop(0)] = slug
+        waiting = {base: indexes for base, indexes in waiting.items() if indexes}
+    return slugs
+
+
+def _insert(listings):
+    for attempt in range(2):
+        for listing, slug in zip(listings, allocate_slugs([listing.title for listing in listings]), strict=True):
+            listing.slug = slug
+        try:
+            with transaction.atomic():
+                return Listing.objects.bulk_create(listings)
+        except IntegrityError:
+            # A concurrent writer took one of the slugs: allocate again once.
+            if attempt:
+                raise
+    return []
+
+
+def _write_chunk(chunk, owner, report):
+    listings = [listing for _number, listing, _urls in chunk]
+    for listing in listings:
+        score_listing_risk(listing, owner)
+    try:
+        created = _insert(listings)
+    except IntegrityError:
+        logger.warning("listing_import_chunk_failed", exc_info=True)
+        for number, _listing, _urls in chunk:
+            report.add_error(number, {"__all__": ["Rândul nu a putut fi salvat; reîncearcă importul."]})
+        return
+
+    refresh_search_documents(Listing.objects.filter(pk__in=[listing.pk for listing in created]))
+    report.created += len(created)
+
+    flagged = [listing for listing in created if listing.needs_moderation_review]
+    report.flagged += len(flagged)
+    notify_many([risk_review_notification(listing) for listing in flagged])
+
+    images = {str(listing.pk): urls for (_number, listing, urls) in chunk if urls}
+    if images:
+        BackgroundJob.enqueue("listings.import_images", {"images": images}, priority=90)
+        report.images_queued += sum(len(urls) for urls in images.values())
+
+
+def import_listings(stream, owner, fmt, *, chunk_size=CHUNK_SIZE, max_rows=None, request=None):
+    """Import every valid row of ``stream`` for ``owner``; return an ``ImportReport``."""
+    started = time.monotonic()
+    report = ImportReport()
+    categories = _category_map()
+    chunk = []
+    for number, row, error in read_rows(stream, fmt):
+        if max_rows is not None and report.rows >= max_rows:
+            report.add_error(number, {"__all__": [f"Importul este limitat la {max_rows} rânduri."]})
+            break
+        report.rows += 1
+        if error:
+            report.add_error(number, {"__all__": [error]})
+            continue
+        listing, errors = _build_listing(row, owner, categories)
+        if errors:
+            report.add_error(number, errors)
+            continue
+        chunk.append((number, listing, _image_urls(row.get("images"))))
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, owner, report)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, owner, report)
+
+    if report.created:
+        # bulk_create sends no post_save: retire cached result pages once.
+        bump_result_generation()
+        purge_surrogate_keys("listings")
+    report.seconds = time.monotonic() - started
+    summary = {key: value for key, value in report.as_dict().items() if key != "errors"}
+    summary["errors"] = len(report.errors)
+    audit_log("listing.bulk_import", request=request, actor=owner, metadata=summary)
+    logger.info("listings_imported", extra=summary)
+    return report
+
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_PublicRedirectHandler)
+
+
+def _check_public_url(url):
+    """Only fetch http(s) URLs of public hosts: the import must not be a way
+    to reach internal services."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError(f"Unsupported image URL: {url}")
+    for info in socket.getaddrinfo(parsed.hostname, parsed.port or None):
+        if not ipaddress.ip_address(info[4][0]).is_global:
+            raise ValueError(f"Image host is not public: {parsed.hostname}")
+
+
+def _download_image(url):
+    _check_public_url(url)
+    request = urllib.request.Request(url, headers={"User-Agent": "MicuMarket-import/1.0"})
+    with _opener.open(request, timeout=IMAGE_FETCH_TIMEOUT_SECONDS) as response:  # nosec B310 - scheme checked
+        content = response.read(MAX_IMAGE_BYTES + 1)
+    if len(content) > MAX_IMAGE_BYTES:
+        raise ValueError(f"Image larger than {MAX_IMAGE_BYTES} bytes: {url}")
+    return content
+
+
+def fetch_listing_images(images):
+    """Download and attach imported image URLs (``{listing_id: [url, ...]}``).
+
+    A failing image is logged and skipped, so a retry never duplicates the
+    images already attached.
+    """
+    listings = Listing.objects.in_bulk([int(listing_id) for listing_id in images])
+    saved = failed = 0
+    for listing_id, urls in images.items():
+        listing = listings.get(int(listing_id))
+        if listing is None:
+            continue
+        for order, url in enumerate(urls):
+            try:
+                content = _download_image(url)
+                image_format = PilImage.open(BytesIO(content)).format
+                extension = _IMAGE_EXTENSIONS.get(image_format)
+                if extension is None:
+                    raise ValueError(f"Unsupported image format {image_format}: {url}")
+                form = ListingImageForm(
+                    files={"image": SimpleUploadedFile(f"import-{listing.pk}-{order}.{extension}", content)}
+                )
+                if not form.is_valid():
+                    raise ValueError(f"Invalid image: {url}")
+                listing_image = form.save(commit=False)
+                listing_image.listing = listing
+                listing_image.alt_text = f"Imagine pentru {listing.title}"
+                listing_image.order = order
+                listing_image.save()
+                saved += 1
+            except Exception:  # noqa: BLE001 - one bad URL must not stop the batch.
+                failed += 1
+                logger.warning("listing_import_image_failed", extra={"listing_id": listing.pk, "url": url}, exc_info=True)
+    return {"saved": saved, "failed": failed}
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from listings.models import Listing
+from listings.search import refresh_search_documents
+
+
+class Command(BaseCommand):
+    help = "Calculează coloana search_document a anunțurilor, în loturi."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalculează și anunțurile care au deja documentul de căutare.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size trebuie să fie pozitiv.")
+        if connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING("search_document is only maintained on PostgreSQL."))
+            return
+
+        listings = Listing.objects.all()
+        if not options["all"]:
+            listings = listings.filter(search_document__isnull=True)
+
+        # Keyset walk over primary keys: each batch is its own short UPDATE,
+        # so the backfill never holds a long transaction on the table.
+        refreshed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                listings.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            refreshed += refresh_search_documents(Listing.objects.filter(pk__in=batch))
+            last_pk = batch[-1]
+            self.stdout.write(f"Refreshed {refreshed} listings (last id {last_pk})")
+
+        self.stdout.write(self.style.SUCCESS(f"Search documents refreshed: {refreshed}"))
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.bulk_import import CHUNK_SIZE, ImportFormatError, detect_format, import_listings
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Importă anunțuri în masă dintr-un fișier CSV sau NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fișierul CSV sau NDJSON de importat.")
+        parser.add_argument("--owner", required=True, help="Username-ul proprietarului anunțurilor.")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Implicit după extensia fișierului.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size trebuie să fie pozitiv.")
+        try:
+            owner = User.objects.get(username=options["owner"])
+        except User.DoesNotExist as exc:
+            raise CommandError(f"Utilizatorul {options['owner']} nu există.") from exc
+        try:
+            fmt = detect_format(options["path"], options["format"])
+        except ImportFormatError as exc:
+            raise CommandError(str(exc)) from exc
+
+        try:
+            with open(options["path"], "rb") as stream:
+                report = import_listings(stream, owner, fmt, chunk_size=options["chunk_size"])
+        except OSError as exc:
+            raise CommandError(str(exc)) from exc
+
+        for error in report.errors:
+            details = "; ".join(
+                f"{name}: {' '.join(messages)}" if name != "__all__" else " ".join(messages)
+                for name, messages in error["errors"].items()
+            )
+            self.stderr.write(f"Row {error['row']}: {details}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.created} of {report.rows} rows in {report.seconds:.1f}s "
+                f"({report.rows_per_second:.0f} rows/s); {report.flagged} sent to moderation, "
+                f"{report.images_queued} images queued, {len(report.errors)} errors."
+            )
+        )
@@ -0,0 +1,57 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("categories", "0001_initial"),
+        ("listings", "0011_listingtransaction"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="search_document",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_document"],
+                name="listings_search_document_gin",
+            ),
+        ),
+        # Trigram indexes for the similarity/icontains columns not covered by 0009.
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS listings_listing_county_trgm_idx "
+                "ON listings_listing USING GIN (county gin_trgm_ops);"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS listings_listing_county_trgm_idx;",
+        ),
+        migrations.RunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS categories_category_name_trgm_idx "
+                "ON categories_category USING GIN (name gin_trgm_ops);"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS categories_category_name_trgm_idx;",
+        ),
+        # The expression index from 0009 never matched the query's vector and is
+        # superseded by the stored column.
+        migrations.RunSQL(
+            sql="DROP INDEX IF EXISTS listings_listing_search_vector_idx;",
+            reverse_sql=(
+                "CREATE INDEX IF NOT EXISTS listings_listing_search_vector_idx "
+                "ON listings_listing USING GIN ("
+                "to_tsvector('simple', "
+                "coalesce(title, '') || ' ' || "
+                "coalesce(description, '') || ' ' || "
+                "coalesce(city, '') || ' ' || "
+                "coalesce(county, '')"
+                ")"
+                ");"
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0012_listing_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarListing",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="Poziție")),
+                ("score", models.FloatField(verbose_name="Scor similaritate")),
+                ("computed_at", models.DateTimeField(auto_now=True, verbose_name="Calculat la")),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_entries",
+                        to="listings.listing",
+                        verbose_name="Anunț",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="listings.listing",
+                        verbose_name="Anunț similar",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Anunț similar",
+                "verbose_name_plural": "Anunțuri similare",
+                "ordering": ["listing", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("listing", "rank"), name="listings_similar_listing_rank_uniq"),
+                ],
+            },
+        ),
+    ]
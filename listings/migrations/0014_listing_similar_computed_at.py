@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+
+def mark_indexed_listings(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    SimilarListing = apps.get_model("listings", "SimilarListing")
+    Listing.objects.filter(Exists(SimilarListing.objects.filter(listing=OuterRef("pk")))).update(
+        similar_computed_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0013_similarlisting"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="similar_computed_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Anunțuri similare calculate la"
+            ),
+        ),
+        migrations.RunPython(mark_indexed_listings, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
@@ -6,8 +8,16 @@ from django.utils.text import slugify
 
 from Micu_market.images import optimize_image_field
 
+from .search import SEARCH_DOCUMENT_SOURCE_FIELDS, refresh_search_documents
+
 User = get_user_model()
 
+# Fields that move a listing in or out of a cached result page or the
+# homepage, or reorder it (api/result_cache.py, listings.views.home_view).
+RESULT_CACHE_FIELDS = (
+    "status", "price", "category_id", "city", "condition", "title", "is_featured", "featured_until",
+)
+
 class Listing(models.Model):
     STATUS_CHOICES = [
         ('active', 'Activ'),
@@ -54,6 +64,13 @@ class Listing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creat la")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizat la")
     expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Expiră la")
+    # Weighted full-text vector kept in sync by save(); see listings.search.
+    search_document = SearchVectorField(null=True, editable=False)
+    # Last time listings.similarity computed this listing's neighbours, even
+    # when none scored high enough to be stored.
+    similar_computed_at = models.DateTimeField(
+        null=True, blank=True, editable=False, verbose_name="Anunțuri similare calculate la"
+    )
 
     class Meta:
         ordering = ["-created_at"]
@@ -68,10 +85,29 @@ class Listing(models.Model):
             models.Index(fields=['status', 'city']),
             models.Index(fields=['status', 'is_featured', 'featured_until', '-created_at']),
             models.Index(fields=['needs_moderation_review', '-created_at']),
+            GinIndex(fields=['search_document'], name='listings_search_document_gin'),
         ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_result_fields()
+        return instance
+
+    def snapshot_result_fields(self):
+        self._loaded_result_values = {
+            name: self.__dict__[name] for name in RESULT_CACHE_FIELDS if name in self.__dict__
+        }
+
+    def result_fields_changed(self):
+        """Whether a field cached result pages depend on differs from the loaded row."""
+        loaded = getattr(self, "_loaded_result_values", None)
+        if loaded is None:
+            return True
+        return any(self.__dict__.get(name) != value for name, value in loaded.items())
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -83,6 +119,10 @@ class Listing(models.Model):
                 self.slug = f"{original_slug}-{counter}"
                 counter += 1
         super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or SEARCH_DOCUMENT_SOURCE_FIELDS.intersection(update_fields):
+            refresh_search_documents(type(self).objects.filter(pk=self.pk))
     
     def get_absolute_url(self):
         return reverse('listings:detail', kwargs={'slug': self.slug})
@@ -246,3 +286,38 @@ class ListingReport(models.Model):
     @property
     def is_active(self):
         return self.status in {"pending", "reviewed"}
+
+
+class SimilarListing(models.Model):
+    """Precomputed nearest neighbour of a listing (see listings/similarity.py).
+
+    ``rank`` 0 is the most similar; the ``(listing, rank)`` unique index is
+    the lookup the detail page uses.
+    """
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="similar_entries",
+        verbose_name="Anunț",
+    )
+    similar = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Anunț similar",
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name="Poziție")
+    score = models.FloatField(verbose_name="Scor similaritate")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Calculat la")
+
+    class Meta:
+        ordering = ["listing", "rank"]
+        verbose_name = "Anunț similar"
+        verbose_name_plural = "Anunțuri similare"
+        constraints = [
+            models.UniqueConstraint(fields=["listing", "rank"], name="listings_similar_listing_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} → {self.similar_id} ({self.score:.3f})"
@@ -5,6 +5,7 @@ from django.utils import timezone
 
 from audit.utils import audit_log
 from notifications.models import Notification
+from notifications.services import notify
 
 PHONE_RE = re.compile(r"(?<!\d)(?:\+?4?0|0)?(?:\s|-|\.)?\d(?:\s|-|\.?\d){7,}(?!\d)")
 URL_RE = re.compile(r"https?://|www\.", re.IGNORECASE)
@@ -47,35 +48,50 @@ def evaluate_listing_risk(listing, user):
     return min(score, 100), reasons
 
 
-def apply_listing_risk_review(listing, user, request=None):
+def score_listing_risk(listing, user):
+    """Fill the risk fields of ``listing`` without saving it; flagged active
+    listings are hidden until a moderator reviews them."""
     score, reasons = evaluate_listing_risk(listing, user)
-    threshold = settings.LISTING_RISK_REVIEW_THRESHOLD
-    needs_review = score >= threshold
-    note = "\n".join(reasons)
-
-    update_fields = ["risk_score", "needs_moderation_review", "moderation_note", "updated_at"]
     listing.risk_score = score
-    listing.needs_moderation_review = needs_review
-    listing.moderation_note = note
-
-    if needs_review and listing.status == "active":
+    listing.needs_moderation_review = score >= settings.LISTING_RISK_REVIEW_THRESHOLD
+    listing.moderation_note = "\n".join(reasons)
+    if listing.needs_moderation_review and listing.status == "active":
         listing.status = "inactive"
+    return score, reasons
+
+
+def risk_review_notification(listing):
+    return Notification(
+        recipient=listing.owner,
+        notification_type="listing_rejected",
+        title="Anunț trimis la moderare",
+        message="Anunțul tău a fost ascuns temporar pentru verificări de siguranță.",
+        related_object_type="Listing",
+        related_object_id=listing.pk,
+        action_url=listing.get_absolute_url(),
+    )
+
+
+def apply_listing_risk_review(listing, user, request=None):
+    previous_status = listing.status
+    score, reasons = score_listing_risk(listing, user)
+    needs_review = listing.needs_moderation_review
+
+    update_fields = ["risk_score", "needs_moderation_review", "moderation_note", "updated_at"]
+    if listing.status != previous_status:
         update_fields.append("status")
 
     listing.save(update_fields=update_fields)
 
     if needs_review:
         audit_log("listing.risk_review_required", request=request, obj=listing, metadata={"score": score, "reasons": reasons})
-        Notification.objects.get_or_create(
+        already_notified = Notification.objects.filter(
             recipient=listing.owner,
             notification_type="listing_rejected",
             related_object_type="Listing",
             related_object_id=listing.pk,
-            defaults={
-                "title": "Anunț trimis la moderare",
-                "message": "Anunțul tău a fost ascuns temporar pentru verificări de siguranță.",
-                "action_url": listing.get_absolute_url(),
-            },
-        )
+        ).exists()
+        if not already_notified:
+            notify(risk_review_notification(listing))
 
     return score, reasons
@@ -1,7 +1,37 @@
 from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
 from django.db import connection
-from django.db.models import ExpressionWrapper, F, FloatField, Q
-from django.db.models.functions import Greatest
+from django.db.models import ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from categories.models import Category
+
+# Listing fields that feed Listing.search_document; saving any of them
+# refreshes the stored vector.
+SEARCH_DOCUMENT_SOURCE_FIELDS = {"title", "description", "city", "county", "category", "category_id"}
+
+
+def listing_search_document():
+    """Weighted tsvector stored in Listing.search_document.
+
+    Same weights as the ranking always used (title > category > city >
+    county > description). The category name comes from a correlated
+    subquery so the expression also works inside ``QuerySet.update()``.
+    """
+    category_name = Subquery(Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1])
+    return (
+        SearchVector("title", weight="A", config="simple")
+        + SearchVector(category_name, weight="B", config="simple")
+        + SearchVector("city", weight="B", config="simple")
+        + SearchVector("county", weight="C", config="simple")
+        + SearchVector("description", weight="D", config="simple")
+    )
+
+
+def refresh_search_documents(queryset):
+    """Recompute the stored search vector for every listing in ``queryset``."""
+    if connection.vendor != "postgresql":
+        return 0
+    return queryset.update(search_document=listing_search_document())
 
 
 def apply_listing_search(queryset, raw_query):
@@ -19,13 +49,6 @@ def apply_listing_search(queryset, raw_query):
     if connection.vendor != "postgresql":
         return queryset.filter(fallback_filter), True
 
-    vector = (
-        SearchVector("title", weight="A", config="simple")
-        + SearchVector("category__name", weight="B", config="simple")
-        + SearchVector("city", weight="B", config="simple")
-        + SearchVector("county", weight="C", config="simple")
-        + SearchVector("description", weight="D", config="simple")
-    )
     search_query = SearchQuery(query, config="simple", search_type="websearch")
     similarity = Greatest(
         TrigramSimilarity("title", query),
@@ -35,18 +58,22 @@ def apply_listing_search(queryset, raw_query):
     )
 
     queryset = queryset.annotate(
-        search_rank=SearchRank(vector, search_query),
+        search_rank=SearchRank(F("search_document"), search_query),
         search_similarity=similarity,
     ).annotate(
+        # Coalesce keeps the score non-NULL for rows whose vector is not
+        # backfilled yet, so score ordering and cursors stay well defined.
         search_score=ExpressionWrapper(
-            F("search_rank") + F("search_similarity"),
+            Coalesce(F("search_rank"), 0.0) + F("search_similarity"),
             output_field=FloatField(),
         )
     )
 
+    # A non-zero rank implies a tsquery match, so the ``@@`` condition does
+    # not change the result set; it only lets Postgres use the GIN index.
     return (
         queryset.filter(
-            Q(search_rank__gte=0.05)
+            Q(search_document=search_query, search_rank__gte=0.05)
             | Q(search_similarity__gte=0.12)
             | fallback_filter
         ),
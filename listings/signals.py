@@ -0,0 +1,50 @@
+"""Keep stored listing search vectors in sync with data they copy from other
+models, and retire cached result pages and cached HTML when listings change."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.result_cache import bump_result_generation
+from categories.models import Category
+from Micu_market.page_cache import purge_surrogate_keys
+
+from .models import Listing, ListingImage
+from .search import refresh_search_documents
+
+
+@receiver(post_save, sender=Category, dispatch_uid="listings_refresh_search_on_category")
+def refresh_search_on_category_save(sender, instance, created, update_fields=None, **kwargs):
+    # A new category has no listings yet; other saves only matter if the name changed.
+    if created or (update_fields is not None and "name" not in update_fields):
+        return
+    refresh_search_documents(Listing.objects.filter(category=instance))
+
+
+@receiver(post_save, sender=Listing, dispatch_uid="listings_bump_result_generation_on_save")
+def bump_result_generation_on_save(sender, instance, created, **kwargs):
+    if not created and not instance.result_fields_changed():
+        # Still shown differently: purge the pages that show this listing.
+        purge_surrogate_keys(f"listing:{instance.pk}")
+        return
+    instance.snapshot_result_fields()
+    _bump_result_generation()
+    purge_surrogate_keys(f"listing:{instance.pk}", "listings")
+
+
+@receiver(post_delete, sender=Listing, dispatch_uid="listings_bump_result_generation_on_delete")
+def bump_result_generation_on_delete(sender, instance, **kwargs):
+    _bump_result_generation()
+    purge_surrogate_keys(f"listing:{instance.pk}", "listings")
+
+
+@receiver(post_save, sender=ListingImage, dispatch_uid="listings_purge_pages_on_image_save")
+@receiver(post_delete, sender=ListingImage, dispatch_uid="listings_purge_pages_on_image_delete")
+def purge_pages_on_image_change(sender, instance, **kwargs):
+    purge_surrogate_keys(f"listing:{instance.listing_id}")
+
+
+def _bump_result_generation():
+    bump_result_generation()
+    # Bump again after commit: a concurrent request may have cached pages
+    # from the pre-commit data in between.
+    transaction.on_commit(bump_result_generation)
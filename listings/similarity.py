@@ -0,0 +1,211 @@
+"""Offline "similar listings" builder.
+
+Every active listing becomes a TF-IDF vector over the tokens of its title
+(counted twice), description, category and city; neighbours are the
+listings with the highest cosine similarity. Similarities are computed
+with NumPy one block of rows at a time (``block @ X.T``), so memory stays
+at ``BLOCK_SIZE x listings`` scores instead of a full square matrix, and
+the top ``TOP_K`` per listing are stored in ``SimilarListing``. The detail
+page reads them with one indexed lookup.
+
+``rebuild_similar_listings`` recomputes everything (daily job).
+``update_similar_listings`` handles listings created since: it vectorizes
+the catalogue again, but only multiplies the new rows, and slots each new
+listing into the stored neighbour lists of its own closest listings.
+Both stamp ``Listing.similar_computed_at``, so a listing with no neighbour
+above ``MIN_SCORE`` is not picked up again by every incremental run.
+"""
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Listing, SimilarListing
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 8
+BLOCK_SIZE = 512
+# Vocabulary cap (most widespread terms first): the dense matrix is
+# listings x MAX_FEATURES float32.
+MAX_FEATURES = 2048
+MIN_SCORE = 0.05
+TITLE_WEIGHT = 2
+# A new listing is offered to the neighbour lists of this many of its own
+# closest listings.
+REVERSE_CANDIDATES = TOP_K * 4
+# Listings older than this without neighbours wait for the nightly rebuild.
+NEW_LISTING_WINDOW_DAYS = 7
+
+_TOKEN_RE = re.compile(r"\w{2,}")
+
+
+def _tokens(text):
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return _TOKEN_RE.findall("".join(char for char in text if not unicodedata.combining(char)))
+
+
+def listing_terms(listing):
+    terms = Counter()
+    for token in _tokens(listing.title):
+        terms[token] += TITLE_WEIGHT
+    terms.update(_tokens(listing.description))
+    if listing.category_id:
+        terms[f"category:{listing.category_id}"] += 1
+    city = " ".join(_tokens(listing.city))
+    if city:
+        terms[f"city:{city}"] += 1
+    return terms
+
+
+class TfidfVectorizer:
+    """Sublinear TF x smoothed IDF, rows L2-normalized (cosine = dot product).
+
+    Terms found in a single listing cannot make two listings similar and
+    are left out of the vocabulary.
+    """
+
+    def __init__(self, documents, max_features=MAX_FEATURES):
+        document_frequency = Counter()
+        for terms in documents:
+            document_frequency.update(terms.keys())
+        shared = [(count, term) for term, count in document_frequency.items() if count > 1]
+        shared.sort(key=lambda item: (-item[0], item[1]))
+        total = len(documents)
+        self.vocabulary = {term: index for index, (_count, term) in enumerate(shared[:max_features])}
+        self.idf = np.array(
+            [math.log((1 + total) / (1 + count)) + 1 for count, _term in shared[:max_features]],
+            dtype=np.float32,
+        )
+
+    def transform(self, documents):
+        matrix = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, terms in enumerate(documents):
+            for term, count in terms.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] = 1 + math.log(count)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+
+def _active_catalogue():
+    listings = list(
+        Listing.objects.filter(status="active")
+        .only("id", "title", "description", "category_id", "city")
+        .order_by("pk")
+    )
+    documents = [listing_terms(listing) for listing in listings]
+    matrix = TfidfVectorizer(documents).transform(documents)
+    return [listing.pk for listing in listings], matrix
+
+
+def nearest_neighbours(matrix, ids, rows, k):
+    """Yield ``(listing_id, [(neighbour_id, score), ...])`` for ``rows``,
+    best first, computing ``BLOCK_SIZE`` rows of similarities at a time."""
+    k = min(k, len(ids) - 1)
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = np.asarray(rows[start:start + BLOCK_SIZE])
+        if k <= 0:
+            for row in block:
+                yield ids[row], []
+            continue
+        scores = matrix[block] @ matrix.T
+        scores[np.arange(len(block)), block] = -1.0  # never your own neighbour
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for index, row in enumerate(block):
+            yield ids[row], [
+                (ids[column], float(score))
+                for column, score in zip(top[index], top_scores[index], strict=True)
+                if score >= MIN_SCORE
+            ]
+
+
+def _store(neighbours_by_listing):
+    """Replace the stored neighbours of every listing in the mapping."""
+    if not neighbours_by_listing:
+        return 0
+    rows = [
+        SimilarListing(listing_id=listing_id, similar_id=similar_id, rank=rank, score=score)
+        for listing_id, neighbours in neighbours_by_listing.items()
+        for rank, (similar_id, score) in enumerate(neighbours)
+    ]
+    with transaction.atomic():
+        SimilarListing.objects.filter(listing_id__in=list(neighbours_by_listing)).delete()
+        SimilarListing.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild_similar_listings():
+    """Recompute the neighbours of every active listing."""
+    ids, matrix = _active_catalogue()
+    stored = 0
+    batch = {}
+    for listing_id, neighbours in nearest_neighbours(matrix, ids, range(len(ids)), TOP_K):
+        batch[listing_id] = neighbours
+        if len(batch) >= BLOCK_SIZE:
+            stored += _store(batch)
+            batch = {}
+    stored += _store(batch)
+    if ids:
+        # ids is ordered by pk; listings created during the rebuild stay unindexed.
+        Listing.objects.filter(status="active", pk__lte=ids[-1]).update(similar_computed_at=timezone.now())
+    SimilarListing.objects.exclude(listing__status="active").delete()
+    logger.info("similar_listings_rebuilt", extra={"listings": len(ids), "neighbours": stored})
+    return {"listings": len(ids), "neighbours": stored}
+
+
+def unindexed_listings():
+    """Recent active listings whose neighbours were never computed."""
+    since = timezone.now() - timedelta(days=NEW_LISTING_WINDOW_DAYS)
+    return Listing.objects.filter(status="active", created_at__gte=since, similar_computed_at__isnull=True)
+
+
+def update_similar_listings(limit=500):
+    """Index listings created since the last run without a full rebuild."""
+    new_ids = set(unindexed_listings().order_by("-created_at").values_list("pk", flat=True)[:limit])
+    if not new_ids:
+        return {"listings": 0, "updated_neighbours": 0}
+
+    ids, matrix = _active_catalogue()
+    rows = [row for row, listing_id in enumerate(ids) if listing_id in new_ids]
+    forward = {}
+    offers = defaultdict(list)
+    for listing_id, candidates in nearest_neighbours(matrix, ids, rows, REVERSE_CANDIDATES):
+        forward[listing_id] = candidates[:TOP_K]
+        for other_id, score in candidates:
+            if other_id not in new_ids:
+                offers[other_id].append((listing_id, score))
+
+    current = defaultdict(dict)
+    for listing_id, similar_id, score in SimilarListing.objects.filter(listing_id__in=list(offers)).values_list(
+        "listing_id", "similar_id", "score"
+    ):
+        current[listing_id][similar_id] = score
+
+    updates = {}
+    for listing_id, offered in offers.items():
+        merged = dict(current[listing_id])
+        merged.update(offered)
+        top = sorted(merged.items(), key=lambda item: -item[1])[:TOP_K]
+        if {similar_id for similar_id, _score in top} != set(current[listing_id]):
+            updates[listing_id] = top
+
+    _store(forward)
+    _store(updates)
+    Listing.objects.filter(pk__in=new_ids).update(similar_computed_at=timezone.now())
+    logger.info("similar_listings_updated", extra={"listings": len(forward), "updated_neighbours": len(updates)})
+    return {"listings": len(forward), "updated_neighbours": len(updates)}
+
@@ -5,6 +5,7 @@ import tempfile
 from datetime import timedelta
 from io import BytesIO, StringIO
 from pathlib import Path
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
@@ -17,9 +18,12 @@ from PIL import Image as PilImage
 
 from categories.models import Category
 from chat.models import Conversation
+from jobs.models import BackgroundJob
 from notifications.models import Notification
 
-from .models import Listing, ListingImage, ListingReport, ListingTransaction
+from .bulk_import import allocate_slugs, import_listings
+from .models import Listing, ListingImage, ListingReport, ListingTransaction, SimilarListing
+from .view_counts import PENDING_VIEWS_KEY, flush_view_counts, pending_views, record_view
 
 User = get_user_model()
 
@@ -37,6 +41,8 @@ class ListingCRUDTestCase(TestCase):
     """Tests for creating, editing, and deleting listings"""
 
     def setUp(self):
+        # Detail views buffer view counts in the cache, which outlives the test.
+        self.addCleanup(cache.delete, PENDING_VIEWS_KEY)
         self.client = Client()
         self.user = User.objects.create_user(
             username='seller',
@@ -88,10 +94,37 @@ class ListingCRUDTestCase(TestCase):
 
         self.client.get(url, HTTP_USER_AGENT='test-agent', REMOTE_ADDR='127.0.0.1')
         self.client.get(url, HTTP_USER_AGENT='test-agent', REMOTE_ADDR='127.0.0.1')
+        flush_view_counts()
 
         self.listing.refresh_from_db()
         self.assertEqual(self.listing.views_count, 1)
 
+    def test_listing_detail_views_are_buffered_and_flushed_in_one_update(self):
+        cache.clear()
+        other = Listing.objects.create(
+            title='Alt anunț', description='Descriere', price=10, owner=self.user,
+            category=self.category, status='active', views_count=5,
+        )
+        url = reverse('listings:detail', kwargs={'slug': self.listing.slug})
+        for agent in ('agent-a', 'agent-b'):
+            response = self.client.get(url, HTTP_USER_AGENT=agent)
+        record_view(other.pk, 3)
+
+        # Not written to the row yet, but shown live.
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.views_count, 0)
+        self.assertEqual(response.context['listing'].views_count, 2)
+        self.assertEqual(pending_views([self.listing.pk, other.pk]), {self.listing.pk: 2, other.pk: 3})
+
+        with self.assertNumQueries(1):
+            result = flush_view_counts()
+        self.assertEqual(result, {'listings': 2, 'views': 5})
+        self.listing.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.listing.views_count, other.views_count), (2, 8))
+        self.assertEqual(pending_views([self.listing.pk, other.pk]), {})
+        self.assertEqual(flush_view_counts(), {'listings': 0, 'views': 0})
+
     def test_listing_detail_has_seo_metadata(self):
         """The listing page exposes social metadata without inline executable script."""
         response = self.client.get(
@@ -127,6 +160,45 @@ class ListingCRUDTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertNotContains(response, self.listing.title)
 
+    def test_listing_list_cursor_mode_links_to_next_page(self):
+        for index in range(12):
+            Listing.objects.create(
+                title=f'Anunț cursor {index}',
+                description='Descriere',
+                price=10,
+                owner=self.user,
+                category=self.category,
+            )
+
+        response = self.client.get(reverse('listings:list'), {'cursor': ''})
+        self.assertEqual(response.status_code, 200)
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 12)
+        self.assertTrue(page_obj.has_next)
+
+        response = self.client.get(reverse('listings:list'), {'cursor': page_obj.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertFalse(response.context['page_obj'].has_next)
+
+    def test_listing_list_facets_link_to_narrowed_results(self):
+        cache.clear()
+        Listing.objects.create(
+            title='Anunț nou Cluj', description='Descriere', price=50, owner=self.user,
+            category=self.category, city='Cluj', condition='new', status='active',
+        )
+        response = self.client.get(reverse('listings:list'), {'page': '1', 'sort': 'price'})
+        facets = response.context['facets']
+        self.assertEqual(facets['total'], 2)
+        cluj = next(entry for entry in facets['cities'] if entry['value'] == 'Cluj')
+        self.assertEqual(cluj['count'], 1)
+        self.assertEqual(cluj['url'], '?sort=price&city=Cluj')
+        new = next(entry for entry in facets['conditions'] if entry['value'] == 'new')
+        self.assertEqual(new['count'], 1)
+
+        response = self.client.get(reverse('listings:list') + new['url'])
+        self.assertEqual([listing.title for listing in response.context['page_obj']], ['Anunț nou Cluj'])
+        self.assertEqual(response.context['facets']['total'], 1)
+
     def test_listing_edit_requires_owner(self):
         """Editing a listing is allowed only for the owner"""
         self.client.login(username='other', password='OtherPass123!')
@@ -529,3 +601,258 @@ class MarkSoldTestCase(TestCase):
         self.client.post(self.url, {'buyer': ''})
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 404)
+
+
+class ListingSearchDocumentTestCase(TestCase):
+    """The stored search vector stays in sync and ranks like before."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='search-doc',
+            email='search-doc@example.com',
+            password='SearchPass123!',
+        )
+        self.category = Category.objects.create(name='Electronice', slug='electronice', is_active=True)
+        self.listing = Listing.objects.create(
+            title='Laptop gaming',
+            description='Placă video dedicată',
+            price=3000,
+            owner=self.user,
+            category=self.category,
+            city='Iași',
+            county='Iași',
+            status='active',
+        )
+
+    def _search_slugs(self, query):
+        response = self.client.get(reverse('listings:list'), {'search': query})
+        return [listing.slug for listing in response.context['page_obj']]
+
+    def test_save_populates_search_document(self):
+        self.listing.refresh_from_db()
+        self.assertIsNotNone(self.listing.search_document)
+        self.assertIn(self.listing.slug, self._search_slugs('gaming'))
+
+    def test_category_rename_refreshes_search_document(self):
+        self.category.name = 'Calculatoare'
+        self.category.save()
+
+        self.listing.refresh_from_db()
+        self.assertIn("'calculatoare'", self.listing.search_document)
+        self.assertNotIn("'electronice'", self.listing.search_document)
+
+    def test_backfill_command_fills_missing_documents(self):
+        Listing.objects.filter(pk=self.listing.pk).update(search_document=None)
+
+        out = StringIO()
+        call_command('backfill_search_documents', '--batch-size', '1', stdout=out)
+
+        self.listing.refresh_from_db()
+        self.assertIsNotNone(self.listing.search_document)
+        self.assertIn('Search documents refreshed: 1', out.getvalue())
+
+
+class SimilarListingsTestCase(TestCase):
+    def setUp(self):
+        self.addCleanup(cache.delete, PENDING_VIEWS_KEY)
+        self.owner = User.objects.create_user(username='similar-owner', email='similar@example.com', password='pass')
+        self.phones = Category.objects.create(name='Telefoane', slug='telefoane-similar', is_active=True)
+        self.furniture = Category.objects.create(name='Mobilă', slug='mobila-similar', is_active=True)
+        self.phone = self._listing('Telefon Samsung Galaxy S21', 'Telefon samsung galaxy, baterie bună', self.phones)
+        self.other_phone = self._listing('Samsung Galaxy S20 telefon', 'Galaxy samsung folosit', self.phones)
+        self.sofa = self._listing('Canapea extensibilă', 'Canapea gri, extensibilă, stare bună', self.furniture)
+        self.chair = self._listing('Scaun canapea set', 'Set scaun și canapea gri', self.furniture)
+
+    def _listing(self, title, description, category):
+        return Listing.objects.create(
+            title=title, description=description, price=100, owner=self.owner,
+            category=category, city='Cluj', status='active',
+        )
+
+    def _neighbours(self, listing):
+        return list(
+            SimilarListing.objects.filter(listing=listing).order_by('rank').values_list('similar_id', flat=True)
+        )
+
+    def test_rebuild_stores_most_similar_first(self):
+        from .similarity import rebuild_similar_listings
+
+        result = rebuild_similar_listings()
+
+        self.assertEqual(result['listings'], 4)
+        self.assertEqual(self._neighbours(self.phone)[0], self.other_phone.pk)
+        self.assertEqual(self._neighbours(self.sofa)[0], self.chair.pk)
+        self.assertNotIn(self.phone.pk, self._neighbours(self.phone))
+
+    def test_detail_page_reads_precomputed_neighbours(self):
+        from .similarity import rebuild_similar_listings
+
+        rebuild_similar_listings()
+        self.other_phone.status = 'sold'
+        self.other_phone.save()
+
+        response = self.client.get(reverse('listings:detail', kwargs={'slug': self.phone.slug}))
+
+        similar = response.context['similar_listings']
+        self.assertNotIn(self.other_phone, similar)
+        self.assertTrue(similar)
+        self.assertNotIn(self.phone, similar)
+
+    def test_update_indexes_new_listings_without_rebuild(self):
+        from .similarity import rebuild_similar_listings, unindexed_listings, update_similar_listings
+
+        rebuild_similar_listings()
+        newest = self._listing('Telefon Samsung Galaxy S22', 'Samsung galaxy telefon nou', self.phones)
+        self.assertEqual(list(unindexed_listings()), [newest])
+
+        result = update_similar_listings()
+
+        self.assertEqual(result['listings'], 1)
+        self.assertIn(self._neighbours(newest)[0], {self.phone.pk, self.other_phone.pk})
+        self.assertIn(newest.pk, self._neighbours(self.phone)[:2])
+        self.assertFalse(unindexed_listings().exists())
+
+    def test_update_does_not_reprocess_listing_without_neighbours(self):
+        from .similarity import rebuild_similar_listings, unindexed_listings, update_similar_listings
+
+        rebuild_similar_listings()
+        sport = Category.objects.create(name='Sport', slug='sport-similar', is_active=True)
+        loner = Listing.objects.create(
+            title='Bicicletă montană', description='Roți mari, frâne disc', price=100, owner=self.owner,
+            category=sport, city='Iași', status='active',
+        )
+
+        result = update_similar_listings()
+
+        self.assertEqual(result['listings'], 1)
+        self.assertEqual(self._neighbours(loner), [])
+        self.assertFalse(unindexed_listings().exists())
+        with patch('listings.similarity._active_catalogue') as catalogue:
+            self.assertEqual(update_similar_listings()['listings'], 0)
+        catalogue.assert_not_called()
+
+
+@override_settings(PAGE_CACHE_SECONDS=300)
+class PageCacheTestCase(TestCase):
+    """Anonymous homepage/detail HTML served from the cache (Micu_market/page_cache.py)"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.delete, PENDING_VIEWS_KEY)
+        self.user = User.objects.create_user(username='seller', password='SellerPass123!')
+        self.category = Category.objects.create(name='Telefoane', slug='telefoane', is_active=True)
+        self.listing = Listing.objects.create(
+            title='Telefon vechi', description='Descriere', price=100, owner=self.user,
+            category=self.category, city='Cluj', status='active',
+        )
+        self.url = reverse('listings:detail', kwargs={'slug': self.listing.slug})
+
+    def test_anonymous_detail_hit_skips_database_and_still_counts_view(self):
+        first = self.client.get(self.url, HTTP_USER_AGENT='agent-a')
+        self.assertEqual(first['X-Page-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, HTTP_USER_AGENT='agent-b')
+
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertContains(second, 'Telefon vechi')
+        self.assertEqual(pending_views([self.listing.pk]), {self.listing.pk: 2})
+
+    def test_cached_page_gets_the_visitors_csrf_token(self):
+        self.client.get(self.url)
+        other = Client()
+        response = other.get(self.url)
+
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertNotContains(response, '__page_cache_csrf_token__')
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+
+    def test_editing_listing_purges_its_page(self):
+        self.client.get(self.url)
+        self.listing.description = 'Baterie nouă'
+        self.listing.save()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Baterie nouă')
+
+    def test_logged_in_visitors_bypass_page_cache_but_share_home_fragment(self):
+        self.client.get(reverse('listings:home'))
+        self.client.login(username='seller', password='SellerPass123!')
+
+        response = self.client.get(reverse('listings:home'))
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Telefon vechi')
+        self.assertNotIn('recent_listings', response.context)
+
+        Listing.objects.create(
+            title='Tabletă nouă', description='Descriere', price=200, owner=self.user,
+            category=self.category, city='Cluj', status='active',
+        )
+        response = self.client.get(reverse('listings:home'))
+        self.assertContains(response, 'Tabletă nouă')
+
+
+class BulkImportTestCase(TestCase):
+    """CSV/NDJSON bulk import (listings/bulk_import.py)"""
+
+    def setUp(self):
+        self.seller = User.objects.create_user(username='pro-seller', password='SellerPass123!')
+        self.category = Category.objects.create(name='Electronice', slug='electronice', is_active=True)
+        Listing.objects.create(
+            title='Telefon', description='Existent', price=50, owner=self.seller,
+            category=self.category, status='active',
+        )
+
+    def _csv(self, *rows):
+        header = 'title,description,category,price,city,images\n'
+        return BytesIO((header + ''.join(f'{row}\n' for row in rows)).encode('utf-8'))
+
+    def test_allocate_slugs_skips_taken_and_repeated_titles(self):
+        self.assertEqual(allocate_slugs(['Telefon', 'Telefon', 'Laptop']), ['telefon-1', 'telefon-2', 'laptop'])
+
+    @override_settings(LISTING_RISK_REVIEW_THRESHOLD=35)
+    def test_csv_import_creates_valid_rows_and_reports_errors(self):
+        stream = self._csv(
+            'Telefon,Ca nou,electronice,100,Cluj,https://example.com/a.jpg|https://example.com/b.jpg',
+            f'Laptop,Bun,{self.category.pk},900,Iași,',
+            'Fără preț,Descriere,electronice,,Cluj,',
+            'Tabletă,Detalii pe https://exemplu.ro,electronice,300,Cluj,',
+            'Cameră,Descriere,nu-exista,200,Cluj,',
+        )
+
+        report = import_listings(stream, self.seller, 'csv', chunk_size=2)
+
+        self.assertEqual((report.rows, report.created, report.flagged), (5, 3, 1))
+        self.assertEqual([error['row'] for error in report.errors], [4, 6])
+        self.assertIn('price', report.errors[0]['errors'])
+        self.assertIn('category', report.errors[1]['errors'])
+        self.assertTrue(Listing.objects.filter(slug='telefon-1', owner=self.seller).exists())
+        flagged = Listing.objects.get(title='Tabletă')
+        self.assertEqual((flagged.status, flagged.needs_moderation_review), ('inactive', True))
+        self.assertTrue(Notification.objects.filter(recipient=self.seller, related_object_id=flagged.pk).exists())
+        job = BackgroundJob.objects.get(name='listings.import_images')
+        self.assertEqual(list(job.payload['images'].values()), [['https://example.com/a.jpg', 'https://example.com/b.jpg']])
+
+    def test_ndjson_import_reports_malformed_lines(self):
+        stream = BytesIO(
+            b'{"title": "Bicicleta", "description": "Noua", "category": "electronice", "price": 700, "city": "Cluj"}\n'
+            b'\n'
+            b'{"title": \n'
+        )
+
+        report = import_listings(stream, self.seller, 'ndjson')
+
+        self.assertEqual((report.rows, report.created), (2, 1))
+        self.assertEqual(report.errors[0]['row'], 3)
+
+    def test_command_prints_throughput(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as handle:
+            handle.write(self._csv('Monitor,Descriere,electronice,400,Cluj,').getvalue())
+            handle.flush()
+            out = StringIO()
+            call_command('import_listings', handle.name, '--owner', 'pro-seller', stdout=out)
+
+        self.assertIn('Imported 1 of 1 rows', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
@@ -0,0 +1,127 @@
+"""Buffered listing view counters.
+
+Counted views are accumulated in Redis (``HINCRBY`` on one hash, field =
+listing id) instead of an ``UPDATE ... SET views_count = views_count + 1``
+per view, which serialized concurrent viewers of a popular listing on its
+row lock. ``flush_view_counts`` (the ``listings.flush_view_counts`` job)
+moves the buffered deltas into ``Listing.views_count`` with one UPDATE;
+pages that show view counts add the unflushed delta (``pending_views``).
+
+With a non-Redis cache (LocMem in dev/tests) the buffer is a dict in the
+cache, guarded by a process lock, which is enough for a single process.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, Value, When
+
+logger = logging.getLogger(__name__)
+
+PENDING_VIEWS_KEY = "listings:views:pending"
+
+_fallback_lock = threading.Lock()
+_client = {"url": None, "redis": None}
+
+
+def _redis_url():
+    config = settings.CACHES.get("default", {})
+    if config.get("BACKEND", "").endswith("RedisCache"):
+        location = config.get("LOCATION")
+        return location[0] if isinstance(location, (list, tuple)) else location
+    return None
+
+
+def _redis():
+    url = _redis_url()
+    if url is None:
+        return None
+    if _client["url"] != url:
+        import redis
+
+        _client["redis"] = redis.Redis.from_url(url)
+        _client["url"] = url
+    return _client["redis"]
+
+
+def record_view(listing_id, count=1):
+    client = _redis()
+    if client is not None:
+        client.hincrby(PENDING_VIEWS_KEY, listing_id, count)
+        return
+    with _fallback_lock:
+        pending = cache.get(PENDING_VIEWS_KEY) or {}
+        pending[listing_id] = pending.get(listing_id, 0) + count
+        cache.set(PENDING_VIEWS_KEY, pending, timeout=None)
+
+
+def pending_views(listing_ids):
+    """Unflushed view deltas for ``listing_ids`` as ``{listing_id: delta}``."""
+    listing_ids = list(listing_ids)
+    if not listing_ids:
+        return {}
+    client = _redis()
+    if client is not None:
+        values = client.hmget(PENDING_VIEWS_KEY, listing_ids)
+        return {listing_id: int(value) for listing_id, value in zip(listing_ids, values, strict=True) if value}
+    pending = cache.get(PENDING_VIEWS_KEY) or {}
+    return {listing_id: pending[listing_id] for listing_id in listing_ids if listing_id in pending}
+
+
+def has_pending_views():
+    client = _redis()
+    if client is not None:
+        return bool(client.hlen(PENDING_VIEWS_KEY))
+    return bool(cache.get(PENDING_VIEWS_KEY))
+
+
+def merge_pending_views(listings):
+    """Add the unflushed deltas to ``views_count`` on already loaded listings."""
+    listings = list(listings)
+    pending = pending_views(listing.pk for listing in listings)
+    for listing in listings:
+        listing.views_count += pending.get(listing.pk, 0)
+    return listings
+
+
+def _take_pending():
+    client = _redis()
+    if client is not None:
+        # HGETALL + DEL in one MULTI: views recorded after it start a new hash.
+        with client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(PENDING_VIEWS_KEY)
+            pipe.delete(PENDING_VIEWS_KEY)
+            raw, _ = pipe.execute()
+        return {int(listing_id): int(delta) for listing_id, delta in raw.items()}
+    with _fallback_lock:
+        pending = cache.get(PENDING_VIEWS_KEY) or {}
+        cache.delete(PENDING_VIEWS_KEY)
+    return pending
+
+
+def flush_view_counts():
+    """Write every buffered delta to ``Listing.views_count`` in one UPDATE.
+
+    On failure the deltas are put back in the buffer for the next run.
+    """
+    from .models import Listing
+
+    pending = {listing_id: delta for listing_id, delta in _take_pending().items() if delta}
+    if not pending:
+        return {"listings": 0, "views": 0}
+
+    # Ascending ids so concurrent flushes lock rows in the same order.
+    whens = [When(pk=listing_id, then=Value(pending[listing_id])) for listing_id in sorted(pending)]
+    try:
+        updated = Listing.objects.filter(pk__in=pending).update(
+            views_count=F("views_count") + Case(*whens, default=Value(0))
+        )
+    except Exception:
+        for listing_id, delta in pending.items():
+            record_view(listing_id, delta)
+        raise
+
+    views = sum(pending.values())
+    logger.info("listing_views_flushed", extra={"listings": updated, "views": views})
+    return {"listings": updated, "views": views}
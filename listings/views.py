@@ -8,22 +8,31 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Count, F, Q
+from django.db.models import Count, Q
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.views.decorators.http import require_POST
 from django_ratelimit.decorators import ratelimit
 
+from api.facets import listing_facets
+from api.filters import VALID_CONDITIONS, VALID_SORTS, filter_listing_queryset
+from api.pagination import InvalidCursor, paginate_by_cursor
+from api.result_cache import cached_listing_page
 from audit.utils import audit_log
 from categories.models import Category
-from favorites.models import Favorite
+from categories.tree import get_category_tree
+from favorites.services import is_favorited, mark_favorited
+from Micu_market.page_cache import cache_anonymous_page, cached_fragment, set_surrogate_keys
 from notifications.models import Notification
+from notifications.services import notify
 
 from .forms import ListingForm, ListingImageForm, ListingImageFormSet, ListingReportForm
-from .models import Listing, ListingReport, ListingTransaction
+from .models import Listing, ListingReport, ListingTransaction, SimilarListing
 from .moderation import apply_listing_risk_review
-from .search import apply_listing_search, order_search_results
+from .view_counts import merge_pending_views, record_view
 
 logger = logging.getLogger(__name__)
 
@@ -48,11 +57,37 @@ def _parse_price_filter(raw_value):
         return None
     return value if value >= 0 else None
 
-def home_view(request):
-    """Homepage with recent listings and categories"""
-    recent_listings = Listing.objects.filter(status='active').select_related('category', 'owner').prefetch_related('images').order_by('-created_at')[:8]
+
+def _facet_links(query_params, facets):
+    """Attach a "narrow to this value" URL to each facet entry.
+
+    Page and cursor are dropped: narrowing starts again from the first page.
+    """
+    def link(**values):
+        params = query_params.copy()
+        for key in ('page', 'cursor', *values):
+            params.pop(key, None)
+        for key, value in values.items():
+            if value is not None:
+                params[key] = value
+        return f"?{params.urlencode()}"
+
+    for entry in facets['categories']:
+        entry['url'] = link(category=entry['slug'])
+    for entry in facets['cities']:
+        entry['url'] = link(city=entry['value'])
+    for entry in facets['conditions']:
+        entry['url'] = link(condition=entry['value'])
+    for entry in facets['price_ranges']:
+        entry['url'] = link(min_price=entry['min'], max_price=entry['max'])
+    return facets
+
+def _home_context():
+    recent_listings = list(
+        Listing.objects.filter(status='active').select_related('category', 'owner').prefetch_related('images').order_by('-created_at')[:8]
+    )
     now = timezone.now()
-    featured_listings = (
+    featured_listings = list(
         Listing.objects.filter(status='active', is_featured=True)
         .filter(Q(featured_until__isnull=True) | Q(featured_until__gt=now))
         .select_related('category', 'owner')
@@ -60,15 +95,6 @@ def home_view(request):
         .order_by('-created_at')[:4]
     )
     
-    # Add the favorite state for the authenticated user
-    if request.user.is_authenticated:
-        user_favorites = set(Favorite.objects.filter(user=request.user).values_list('listing_id', flat=True))
-        
-        for listing in recent_listings:
-            listing.is_favorited = listing.id in user_favorites
-        for listing in featured_listings:
-            listing.is_favorited = listing.id in user_favorites
-    
     # Categories with listing counts — a single aggregated query (N+1 fix)
     # Use annotate to get the number of active listings per category
     top_categories = cache.get("home:top_categories")
@@ -87,92 +113,87 @@ def home_view(request):
         top_categories = list(categories_with_counts[:12])
         cache.set("home:top_categories", top_categories, settings.HOMEPAGE_CACHE_SECONDS)
     
-    context = {
+    return {
         'recent_listings': recent_listings,
         'featured_listings': featured_listings,
         'categories': top_categories,
     }
-    return render(request, 'listings/home.html', context)
+
+
+@cache_anonymous_page()
+def home_view(request):
+    """Homepage with recent listings and categories"""
+    # The page body is the same for every visitor, so it is rendered once into
+    # a shared fragment; only the layout around it (header, unread badge) is
+    # rendered per user. Anonymous visitors get the whole page from the cache.
+    context = {}
+
+    def render_body():
+        context.update(_home_context())
+        html = render_to_string('listings/partials/home_content.html', context, request=request)
+        listing_ids = {listing.pk for listing in context['recent_listings'] + context['featured_listings']}
+        return html, ['listings', 'categories', *(f'listing:{pk}' for pk in sorted(listing_ids))]
+
+    if request.GET:
+        # The search box echoes ?search=, so such pages are not shared.
+        body, surrogate_keys = render_body()
+    else:
+        body, surrogate_keys = cached_fragment('home', render_body)
+    context['home_content'] = mark_safe(body)  # nosec B703 - rendered by our own template
+    response = render(request, 'listings/home.html', context)
+    return set_surrogate_keys(response, surrogate_keys)
 
 def listing_list_view(request):
     """Listing list with filtering and sorting"""
-    listings = Listing.objects.filter(status='active').select_related('category', 'owner').prefetch_related('images')
-    
-    # Filter by seller
+    # Filtering and sorting are shared with the v1 API (api/filters.py); the
+    # values below only feed the filter form.
     seller = request.GET.get('seller') or ''
-    if seller:
-        listings = listings.filter(owner__username=seller)
-
-    # Filter by category
     category_param = request.GET.get('category') or ''
-    selected_category = None
-    if category_param:
-        try:
-            # Try to find the category by slug
-            selected_category = Category.objects.get(slug=category_param, is_active=True)
-            # Include the main category and all subcategories
-            category_ids = [selected_category.id] + [sub.id for sub in selected_category.get_all_children]
-            listings = listings.filter(category_id__in=category_ids)
-        except Category.DoesNotExist:
-            # If not found by slug, try by ID
-            try:
-                selected_category = Category.objects.get(id=category_param, is_active=True)
-                # Include the main category and all subcategories
-                category_ids = [selected_category.id] + [sub.id for sub in selected_category.get_all_children]
-                listings = listings.filter(category_id__in=category_ids)
-            except (Category.DoesNotExist, ValueError):
-                # If not found by ID either, ignore the filter
-                pass
-    
-    # Filter by price
+    selected_category = get_category_tree().resolve(category_param) if category_param else None
     min_price = _parse_price_filter(request.GET.get('min_price'))
     max_price = _parse_price_filter(request.GET.get('max_price'))
-    if min_price is not None:
-        listings = listings.filter(price__gte=min_price)
-    if max_price is not None:
-        listings = listings.filter(price__lte=max_price)
-    
-    # Filter by city
     city = request.GET.get('city') or ''
-    if city:
-        listings = listings.filter(city__icontains=city)
-
+    condition = request.GET.get('condition') or ''
+    if condition not in VALID_CONDITIONS:
+        condition = ''
     # Search — normalize to '' so templates never render the string "None"
     search = request.GET.get('search') or ''
-    listings, search_applied = apply_listing_search(listings, search)
-    
-    # Sorting
-    sort_by = request.GET.get('sort', 'relevance' if search_applied else '-created_at')
-    valid_sorts = ['relevance', '-created_at', 'created_at', 'price', '-price', 'title', '-title']
-    if sort_by in valid_sorts:
-        listings = order_search_results(listings, sort_by, search_applied)
-        if sort_by != 'relevance':
-            listings = listings.order_by(sort_by)
+
+    # Pagination — ?cursor= opts into keyset pages (no COUNT(*), no OFFSET scan)
+    cursor = request.GET.get('cursor')
+    cursor_mode = cursor is not None
+    if cursor_mode:
+        listings, search_applied, sort_by = filter_listing_queryset(request.GET)
+        try:
+            page_obj = paginate_by_cursor(listings, sort_by, search_applied, cursor, 12, count_mode='estimate')
+        except InvalidCursor:
+            page_obj = paginate_by_cursor(listings, sort_by, search_applied, None, 12, count_mode='estimate')
     else:
-        listings = listings.order_by('-created_at')
+        # Result IDs per page are cached and shared with the API (api/result_cache.py)
+        page_obj = cached_listing_page(request.GET, request.GET.get('page'), 12)
+        sort_by = request.GET.get('sort') or ''
+        if sort_by not in VALID_SORTS:
+            sort_by = 'relevance' if search.strip() else '-created_at'
     
-    # Pagination
-    paginator = Paginator(listings, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Add the favorite state for the authenticated user
-    if request.user.is_authenticated:
-        user_favorites = set(Favorite.objects.filter(user=request.user).values_list('listing_id', flat=True))
-        
-        for listing in page_obj:
-            listing.is_favorited = listing.id in user_favorites
+    # Favorite state for the listings on this page only
+    mark_favorited(request.user, page_obj)
     
     # Context for the template
-    categories = Category.objects.filter(is_active=True).order_by('name')
+    categories = get_category_tree().active_by_name()
+    # Facet counts come from one cached grouped query (api/facets.py)
+    facets = _facet_links(request.GET, listing_facets(request.GET))
     
     context = {
         'page_obj': page_obj,
+        'cursor_mode': cursor_mode,
+        'current_cursor': cursor or '',
         'categories': categories,
         'current_category': selected_category,
         'current_category_slug': category_param,
         'current_city': city,
         'current_seller': seller,
+        'current_condition': condition,
+        'facets': facets,
         'min_price': min_price,
         'max_price': max_price,
         'search_query': search,
@@ -180,34 +201,54 @@ def listing_list_view(request):
     }
     return render(request, 'listings/list.html', context)
 
+def _count_listing_view(request, listing_id):
+    view_cache_key = _listing_view_cache_key(request, listing_id)
+    if cache.add(view_cache_key, True, settings.LISTING_VIEW_COOLDOWN_SECONDS):
+        # Buffered; the listings.flush_view_counts job writes it to the row.
+        record_view(listing_id)
+
+
+def _count_cached_listing_view(request, meta):
+    _count_listing_view(request, meta['listing_id'])
+
+
+@cache_anonymous_page(on_hit=_count_cached_listing_view)
 def listing_detail_view(request, slug):
     """Listing detail"""
     listing = get_object_or_404(Listing, slug=slug, status='active')
     
-    view_cache_key = _listing_view_cache_key(request, listing.pk)
-    if cache.add(view_cache_key, True, settings.LISTING_VIEW_COOLDOWN_SECONDS):
-        Listing.objects.filter(pk=listing.pk).update(views_count=F('views_count') + 1)
-        listing.views_count += 1
+    _count_listing_view(request, listing.pk)
+    merge_pending_views([listing])
     
     # Check if the listing is favorited by the authenticated user
-    is_favorited = False
-    if request.user.is_authenticated:
-
-        is_favorited = Favorite.objects.filter(user=request.user, listing=listing).exists()
+    listing_is_favorited = is_favorited(request.user, listing)
     
-    # Similar listings
-    similar_listings = Listing.objects.filter(
-        category=listing.category,
-        status='active'
-    ).exclude(id=listing.id).prefetch_related('images')[:4]
+    # Similar listings, precomputed by the listings.*_similar jobs (listings/similarity.py);
+    # listings not indexed yet fall back to others from the same category.
+    similar_listings = [
+        entry.similar
+        for entry in SimilarListing.objects.filter(listing=listing, similar__status='active')
+        .select_related('similar')
+        .prefetch_related('similar__images')
+        .order_by('rank')[:4]
+    ]
+    if not similar_listings:
+        similar_listings = Listing.objects.filter(
+            category=listing.category,
+            status='active'
+        ).exclude(id=listing.id).prefetch_related('images')[:4]
     
     context = {
         'listing': listing,
         'similar_listings': similar_listings,
-        'is_favorited': is_favorited,
+        'is_favorited': listing_is_favorited,
         'report_form': ListingReportForm(),
     }
-    return render(request, 'listings/detail.html', context)
+    response = render(request, 'listings/detail.html', context)
+    surrogate_keys = [f'listing:{listing.pk}', *(f'listing:{similar.pk}' for similar in similar_listings)]
+    if listing.category_id:
+        surrogate_keys.append(f'category:{listing.category_id}')
+    return set_surrogate_keys(response, surrogate_keys, listing_id=listing.pk)
 
 
 @login_required
@@ -246,7 +287,7 @@ def report_listing_view(request, slug):
             listing.status = "inactive"
             listing.save(update_fields=["status", "updated_at"])
             listing_hidden = True
-            Notification.objects.create(
+            notify(Notification(
                 recipient=listing.owner,
                 notification_type="listing_rejected",
                 title="Anunț ascuns temporar",
@@ -254,7 +295,7 @@ def report_listing_view(request, slug):
                 related_object_type="Listing",
                 related_object_id=listing.pk,
                 action_url=listing.get_absolute_url(),
-            )
+            ))
         messages.success(request, "Raportul a fost trimis către moderare.")
     else:
         messages.error(request, "Raportul nu a putut fi trimis. Verifică motivul selectat.")
@@ -412,7 +453,7 @@ def listing_mark_sold_view(request, slug):
             request.user.profile.update_statistics()
 
         if buyer:
-            Notification.objects.create(
+            notify(Notification(
                 recipient=buyer,
                 notification_type="listing_sold",
                 title="Tranzacție confirmată",
@@ -426,7 +467,7 @@ def listing_mark_sold_view(request, slug):
                     'reviews:create_review_listing',
                     kwargs={'username': request.user.username, 'listing_slug': listing.slug},
                 ),
-            )
+            ))
             messages.success(request, f"Anunțul a fost marcat ca vândut către {buyer.username}.")
         else:
             messages.success(request, "Anunțul a fost marcat ca vândut.")
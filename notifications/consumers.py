@@ -1,8 +1,8 @@
 """WebSocket consumer for the real-time notification/message badge.
 
 Each authenticated user joins the ``notifications_<id>`` group; the signal in
-notifications/signals.py pushes the unread message count on every new message,
-so the badge updates instantly without polling."""
+notifications/signals.py pushes the (cached) unread message count shortly after
+new messages, so the badge updates without polling."""
 import json
 
 from channels.db import database_sync_to_async
@@ -34,5 +34,5 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def _unread(self):
-        from chat.models import Message
-        return Message.objects.filter(receiver=self.user, is_read=False).count()
+        from .unread import unread_message_count
+        return unread_message_count(self.user.id)
@@ -1,9 +1,13 @@
 import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
 from urllib.parse import urljoin, urlparse
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
 
 logger = logging.getLogger(__name__)
 
@@ -47,27 +51,60 @@ def safe_notification_action_url(action_url):
     return urljoin(site_url, "/")
 
 
-def send_notification_email(notification):
-    if notification.is_emailed or not notification.recipient.email or not should_email(notification):
-        return False
+def _render(template_name, context):
+    return _get_template(template_name).render(context)
+
 
+@lru_cache(maxsize=None)
+def _get_template(template_name):
+    # Compiled once per process; the debug loader would otherwise re-parse the
+    # templates for every email of a batch.
+    return get_template(template_name)
+
+
+def build_notification_message(notification, connection=None):
     context = {
         "notification": notification,
         "site_name": "Micu's Market",
         "action_url": safe_notification_action_url(notification.action_url),
     }
-    subject = f"[Micu's Market] {notification.title}"
-    text_body = render_to_string("notifications/email/notification.txt", context)
-    html_body = render_to_string("notifications/email/notification.html", context)
-
     message = EmailMultiAlternatives(
-        subject=subject,
-        body=text_body,
+        subject=f"[Micu's Market] {notification.title}",
+        body=_render("notifications/email/notification.txt", context),
         from_email=settings.DEFAULT_FROM_EMAIL,
         to=[notification.recipient.email],
+        connection=connection,
+    )
+    message.attach_alternative(_render("notifications/email/notification.html", context), "text/html")
+    return message
+
+
+def build_digest_message(notifications, connection=None):
+    """One email summarising several pending notifications of the same recipient."""
+    context = {
+        "notifications": notifications,
+        "items": [
+            {"notification": notification, "action_url": safe_notification_action_url(notification.action_url)}
+            for notification in notifications
+        ],
+        "site_name": "Micu's Market",
+    }
+    message = EmailMultiAlternatives(
+        subject=f"[Micu's Market] Ai {len(notifications)} notificări noi",
+        body=_render("notifications/email/digest.txt", context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notifications[0].recipient.email],
+        connection=connection,
     )
-    message.attach_alternative(html_body, "text/html")
-    message.send()
+    message.attach_alternative(_render("notifications/email/digest.html", context), "text/html")
+    return message
+
+
+def send_notification_email(notification):
+    if notification.is_emailed or not notification.recipient.email or not should_email(notification):
+        return False
+
+    build_notification_message(notification).send()
 
     notification.is_emailed = True
     notification.save(update_fields=["is_emailed"])
@@ -75,7 +112,96 @@ def send_notification_email(notification):
     return True
 
 
-def send_pending_notification_emails(limit=100):
+@dataclass
+class EmailDispatchResult:
+    notifications_sent: int = 0
+    messages_sent: int = 0
+    messages_failed: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def messages_per_second(self):
+        return round(self.messages_sent / max(self.elapsed_seconds, 1e-9), 1)
+
+
+def _send_isolated(connection, batch, result, sent_ids):
+    """Send each ``(message, notification_ids)`` on ``connection``; return the failures.
+
+    ``send_messages`` is called per message so a rejected recipient does not
+    abort the rest of the batch, while the SMTP session stays open.
+    """
+    failed = []
+    for message, notification_ids in batch:
+        try:
+            delivered = connection.send_messages([message])
+        except Exception:  # noqa: BLE001 - isolate the failing recipient, keep the batch going.
+            logger.warning("notification_email_failed", extra={"notification_ids": notification_ids}, exc_info=True)
+            failed.append((message, notification_ids))
+            continue
+        if delivered:
+            result.messages_sent += 1
+            sent_ids.extend(notification_ids)
+        else:
+            failed.append((message, notification_ids))
+    return failed
+
+
+def dispatch_notification_emails(notifications, connection=None):
+    """Email ``notifications`` over a single backend connection.
+
+    Several pending notifications of one recipient are grouped into a digest.
+    A failed message is retried once on a fresh connection; if it still fails
+    its rows stay ``is_emailed=False`` for the next run. Sent rows are marked
+    with one bulk UPDATE.
+    """
+    from notifications.models import Notification
+
+    started = time.monotonic()
+    result = EmailDispatchResult()
+    grouped = defaultdict(list)
+    for notification in notifications:
+        if notification.is_emailed or not notification.recipient.email or not should_email(notification):
+            continue
+        grouped[notification.recipient_id].append(notification)
+
+    batch = []
+    for recipient_notifications in grouped.values():
+        if len(recipient_notifications) == 1:
+            message = build_notification_message(recipient_notifications[0])
+        else:
+            message = build_digest_message(recipient_notifications)
+        batch.append((message, [notification.pk for notification in recipient_notifications]))
+
+    sent_ids = []
+    if batch:
+        connection = connection or get_connection()
+        with connection:
+            failed = _send_isolated(connection, batch, result, sent_ids)
+        if failed:
+            # A dropped SMTP session fails every later message; retry on a new one.
+            try:
+                with connection:
+                    failed = _send_isolated(connection, failed, result, sent_ids)
+            except Exception:  # noqa: BLE001 - keep what was sent; the rest waits for the next run.
+                logger.warning("notification_email_retry_failed", exc_info=True)
+        result.messages_failed = len(failed)
+
+    if sent_ids:
+        Notification.objects.filter(pk__in=sent_ids).update(is_emailed=True)
+    result.notifications_sent = len(sent_ids)
+    result.elapsed_seconds = time.monotonic() - started
+    logger.info(
+        "notification_emails_dispatched",
+        extra={
+            "notifications_sent": result.notifications_sent,
+            "messages_sent": result.messages_sent,
+            "messages_failed": result.messages_failed,
+        },
+    )
+    return result
+
+
+def send_pending_notification_emails(limit=100, connection=None, stats=False):
     from notifications.models import Notification
 
     notifications = (
@@ -84,8 +210,5 @@ def send_pending_notification_emails(limit=100):
         .order_by("created_at")[:limit]
     )
 
-    sent = 0
-    for notification in notifications:
-        if send_notification_email(notification):
-            sent += 1
-    return sent
+    result = dispatch_notification_emails(notifications, connection=connection)
+    return result if stats else result.notifications_sent
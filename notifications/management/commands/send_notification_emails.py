@@ -8,8 +8,18 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--limit", type=int, default=100, help="Numărul maxim de notificări procesate.")
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Afișează numărul de mesaje, eșecurile și debitul (mesaje/s) al lotului.",
+        )
 
     def handle(self, *args, **options):
-        sent = send_pending_notification_emails(limit=options["limit"])
+        result = send_pending_notification_emails(limit=options["limit"], stats=True)
 
-        self.stdout.write(self.style.SUCCESS(f"Emailuri notificări trimise: {sent}"))
+        self.stdout.write(self.style.SUCCESS(f"Emailuri notificări trimise: {result.notifications_sent}"))
+        if options["stats"]:
+            self.stdout.write(
+                f"Messages: {result.messages_sent} sent, {result.messages_failed} failed in "
+                f"{result.elapsed_seconds:.3f}s ({result.messages_per_second} messages/s)"
+            )
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_notificatio_is_emai_8ec53e_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='count',
+            field=models.PositiveIntegerField(default=1, verbose_name='Număr evenimente'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(
+                condition=models.Q(is_read=False, notification_type='new_message'),
+                fields=['recipient', 'related_object_id'],
+                name='notif_unread_message_idx',
+            ),
+        ),
+    ]
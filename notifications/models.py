@@ -35,6 +35,9 @@ class Notification(models.Model):
     # Status
     is_read = models.BooleanField(default=False, verbose_name="Citit")
     is_emailed = models.BooleanField(default=False, verbose_name="Trimis pe email")
+    # Unread new_message notifications of one conversation are folded into a
+    # single row (see notifications.services.notify_many).
+    count = models.PositiveIntegerField(default=1, verbose_name="Număr evenimente")
     
     # Date
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creat la")
@@ -48,6 +51,11 @@ class Notification(models.Model):
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['recipient', '-created_at']),
             models.Index(fields=['is_emailed', 'created_at']),
+            models.Index(
+                fields=['recipient', 'related_object_id'],
+                condition=models.Q(is_read=False, notification_type='new_message'),
+                name='notif_unread_message_idx',
+            ),
         ]
     
     def __str__(self):
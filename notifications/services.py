@@ -0,0 +1,133 @@
+"""Creating in-app notifications.
+
+Callers build unsaved ``Notification`` instances and hand them to
+:func:`notify_many` (or :func:`notify` for one), which
+
+* drops notifications the recipient switched off through the
+  ``NotificationPreference.app_*`` flags,
+* folds repeated unread ``new_message`` notifications for the same
+  conversation into one row whose ``count`` grows, instead of one row per
+  chat message,
+* writes the remaining rows with a single ``bulk_create``.
+"""
+from django.utils import timezone
+
+from .models import Notification, NotificationPreference
+
+APP_TYPE_PREFERENCES = {
+    "new_message": "app_new_messages",
+    "new_review": "app_new_reviews",
+    "listing_sold": "app_listing_updates",
+    "listing_expired": "app_listing_updates",
+    "listing_approved": "app_listing_updates",
+    "listing_rejected": "app_listing_updates",
+    "price_alert": "app_listing_updates",
+    "new_listing_in_category": "app_listing_updates",
+    "account_verification": "app_system_updates",
+    "system": "app_system_updates",
+}
+
+COALESCED_TYPES = {"new_message"}
+
+
+def _coalesce_key(notification):
+    if notification.notification_type not in COALESCED_TYPES or notification.related_object_id is None:
+        return None
+    return (
+        notification.recipient_id,
+        notification.notification_type,
+        notification.related_object_type,
+        notification.related_object_id,
+    )
+
+
+def _coalesced_title(count):
+    return "Mesaj nou" if count == 1 else f"{count} mesaje noi"
+
+
+def _allowed(notifications):
+    """Filter by the recipients' ``app_*`` preferences (one query)."""
+    recipient_ids = {notification.recipient_id for notification in notifications}
+    fields = sorted(set(APP_TYPE_PREFERENCES.values()))
+    preferences = {
+        row["user_id"]: row
+        for row in NotificationPreference.objects.filter(user_id__in=recipient_ids).values("user_id", *fields)
+    }
+    allowed = []
+    for notification in notifications:
+        field = APP_TYPE_PREFERENCES.get(notification.notification_type)
+        row = preferences.get(notification.recipient_id)
+        # Users without a preferences row get the model defaults (everything on).
+        if field and row is not None and not row[field]:
+            continue
+        allowed.append(notification)
+    return allowed
+
+
+def notify_many(notifications):
+    """Write ``notifications`` (unsaved instances); return the rows created or updated."""
+    notifications = [notification for notification in notifications if notification.recipient_id is not None]
+    if not notifications:
+        return []
+    notifications = _allowed(notifications)
+
+    # Merge repeats inside the batch first, then into existing unread rows.
+    pending = []
+    merged = {}
+    for notification in notifications:
+        key = _coalesce_key(notification)
+        if key is None:
+            pending.append(notification)
+        elif key in merged:
+            position = merged[key]
+            notification.count += pending[position].count
+            pending[position] = notification
+        else:
+            merged[key] = len(pending)
+            pending.append(notification)
+
+    existing = {}
+    if merged:
+        candidates = Notification.objects.filter(
+            recipient_id__in={key[0] for key in merged},
+            notification_type__in={key[1] for key in merged},
+            related_object_id__in={key[3] for key in merged},
+            is_read=False,
+        ).order_by("-created_at")
+        for row in candidates:
+            existing.setdefault(_coalesce_key(row), row)
+
+    now = timezone.now()
+    to_update = []
+    to_create = []
+    for notification in pending:
+        row = existing.get(_coalesce_key(notification))
+        if row is None:
+            if notification.notification_type in COALESCED_TYPES:
+                notification.title = _coalesced_title(notification.count)
+            to_create.append(notification)
+            continue
+        row.count += notification.count
+        row.title = _coalesced_title(row.count)
+        row.message = notification.message
+        row.action_url = notification.action_url
+        # Resurface the row at the top of the list and let the email
+        # dispatcher report the newer messages as well.
+        row.created_at = now
+        row.is_emailed = notification.is_emailed
+        to_update.append(row)
+
+    if to_update:
+        Notification.objects.bulk_update(
+            to_update, ["count", "title", "message", "action_url", "created_at", "is_emailed"]
+        )
+    if to_create:
+        Notification.objects.bulk_create(to_create)
+    return to_update + to_create
+
+
+def notify(notification):
+    """Single-notification shortcut for :func:`notify_many`."""
+    written = notify_many([notification])
+    return written[0] if written else None
+
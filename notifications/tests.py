@@ -1,5 +1,8 @@
 import json
+import smtplib
+import time
 from io import StringIO
+from unittest.mock import AsyncMock, Mock, patch
 
 from asgiref.sync import async_to_sync
 from asgiref.testing import ApplicationCommunicator
@@ -7,12 +10,17 @@ from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
 from django.core.management import call_command
 from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
 from .consumers import NotificationConsumer
+from .email import send_pending_notification_emails
 from .models import Notification
+from .services import notify, notify_many
+from .unread import reconcile_unread_counts, schedule_unread_push, unread_counter_key, unread_message_count
 
 User = get_user_model()
 
@@ -82,6 +90,125 @@ class NotificationEmailTestCase(TestCase):
         self.assertNotIn("evil.example", mail.outbox[0].body)
 
 
+    @override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+    def test_pending_notifications_of_one_recipient_are_sent_as_digest(self):
+        other = User.objects.create_user(username="notify-2", email="notify2@example.com", password="NotifyPass123!")
+        for index in range(3):
+            Notification.objects.create(
+                recipient=self.user,
+                notification_type="new_message",
+                title=f"Mesaj {index}",
+                message="Ai primit un mesaj.",
+            )
+        Notification.objects.create(
+            recipient=other,
+            notification_type="new_review",
+            title="Recenzie nouă",
+            message="Ai primit o recenzie.",
+        )
+
+        output = StringIO()
+        with self.assertNumQueries(2):
+            result = send_pending_notification_emails(stats=True)
+        call_command("send_notification_emails", "--stats", stdout=output)
+
+        self.assertEqual(result.notifications_sent, 4)
+        self.assertEqual(result.messages_sent, 2)
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(message for message in mail.outbox if message.to == ["notify@example.com"])
+        self.assertIn("3 notificări noi", digest.subject)
+        for index in range(3):
+            self.assertIn(f"Mesaj {index}", digest.body)
+        self.assertFalse(Notification.objects.filter(is_emailed=False).exists())
+        self.assertIn("Emailuri notificări trimise: 0", output.getvalue())
+        self.assertIn("messages/s", output.getvalue())
+
+    @override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+    def test_failed_recipient_does_not_block_batch_and_stays_pending(self):
+        other = User.objects.create_user(username="notify-3", email="bounce@example.com", password="NotifyPass123!")
+        delivered = Notification.objects.create(
+            recipient=self.user,
+            notification_type="new_message",
+            title="Mesaj nou",
+            message="Ai primit un mesaj.",
+        )
+        bounced = Notification.objects.create(
+            recipient=other,
+            notification_type="new_message",
+            title="Mesaj nou",
+            message="Ai primit un mesaj.",
+        )
+        original = locmem.EmailBackend.send_messages
+        calls = []
+
+        def flaky_send(backend, messages):
+            calls.append(messages[0].to)
+            if messages[0].to == ["bounce@example.com"]:
+                raise smtplib.SMTPRecipientsRefused({"bounce@example.com": (550, b"no such user")})
+            return original(backend, messages)
+
+        with patch.object(locmem.EmailBackend, "send_messages", flaky_send):
+            result = send_pending_notification_emails(stats=True)
+
+        delivered.refresh_from_db()
+        bounced.refresh_from_db()
+        self.assertTrue(delivered.is_emailed)
+        self.assertFalse(bounced.is_emailed)
+        self.assertEqual(result.messages_failed, 1)
+        self.assertEqual(calls.count(["bounce@example.com"]), 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class NotificationServiceTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="notify-service",
+            email="notify-service@example.com",
+            password="NotifyPass123!",
+        )
+
+    def _message_notification(self, conversation_id, recipient=None):
+        return Notification(
+            recipient=recipient or self.user,
+            notification_type="new_message",
+            title="Mesaj nou",
+            message="Ana ți-a trimis un mesaj.",
+            related_object_type="Conversation",
+            related_object_id=conversation_id,
+        )
+
+    def test_notify_many_coalesces_unread_messages_per_conversation(self):
+        notify(self._message_notification(1))
+        # preferences, unread candidates, one bulk UPDATE, one bulk INSERT
+        with self.assertNumQueries(4):
+            notify_many([self._message_notification(1), self._message_notification(1), self._message_notification(2)])
+
+        first = Notification.objects.get(related_object_id=1)
+        second = Notification.objects.get(related_object_id=2)
+        self.assertEqual(first.count, 3)
+        self.assertEqual(first.title, "3 mesaje noi")
+        self.assertEqual(second.count, 1)
+
+    def test_read_notification_is_not_reused(self):
+        notify(self._message_notification(1)).mark_as_read()
+
+        notify(self._message_notification(1))
+
+        self.assertEqual(Notification.objects.filter(related_object_id=1).count(), 2)
+        self.assertEqual(Notification.objects.get(is_read=False).count, 1)
+
+    def test_app_preference_opt_out_skips_notification(self):
+        self.user.notification_preferences.app_new_messages = False
+        self.user.notification_preferences.save()
+
+        written = notify_many([
+            self._message_notification(1),
+            Notification(recipient=self.user, notification_type="new_review", title="Recenzie", message="Nouă"),
+        ])
+
+        self.assertEqual([notification.notification_type for notification in written], ["new_review"])
+        self.assertFalse(Notification.objects.filter(notification_type="new_message").exists())
+
 class NotificationViewTestCase(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -108,7 +235,110 @@ class NotificationViewTestCase(TestCase):
         self.assertEqual(response.context["unread_count"], 50)
 
 
-@override_settings(CHANNEL_LAYERS=INMEMORY_LAYER)
+
+@override_settings(CHANNEL_LAYERS=INMEMORY_LAYER, NOTIFICATION_PUSH_DEBOUNCE_SECONDS=0)
+class UnreadCounterTestCase(TestCase):
+    def setUp(self):
+        from categories.models import Category
+        from chat.models import Conversation
+        from listings.models import Listing
+
+        cache.clear()
+        self.user = User.objects.create_user(username="uc_user", email="uc@example.com", password="Pass123!")
+        self.other = User.objects.create_user(username="uc_other", email="uco@example.com", password="Pass123!")
+        category = Category.objects.create(name="UC", slug="uc", is_active=True)
+        listing = Listing.objects.create(
+            title="UC", description="t", price=1, owner=self.other, category=category, city="X", status="active",
+        )
+        self.conv = Conversation.objects.create(listing=listing)
+        self.conv.participants.add(self.user, self.other)
+
+    def _send(self, content="salut"):
+        from chat.models import Message
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(conversation=self.conv, sender=self.other, receiver=self.user, content=content)
+
+    def test_counter_follows_new_and_read_messages_without_queries(self):
+        self.assertEqual(unread_message_count(self.user.id), 0)
+        self._send()
+        self._send()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_message_count(self.user.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.conv.mark_as_read(self.user), 2)
+        self.assertEqual(unread_message_count(self.user.id), 0)
+
+        self.client.login(username="uc_user", password="Pass123!")
+        self._send()
+        response = self.client.get(reverse("chat:unread_count"))
+        self.assertEqual(response.json()["unread_count"], 1)
+
+    def test_reconciliation_repairs_drifted_counter(self):
+        self._send()
+        cache.set(unread_counter_key(self.user.id), 7, timeout=None)
+
+        result = reconcile_unread_counts()
+
+        self.assertEqual(result["repaired"], 1)
+        self.assertEqual(unread_message_count(self.user.id), 1)
+
+    def test_reconciliation_leaves_counters_changed_while_counting(self):
+        self._send()
+        key = unread_counter_key(self.user.id)
+        cache.set(key, 7, timeout=None)
+        get_many = cache.get_many
+        snapshots = []
+
+        def get_many_then_increment(keys):
+            values = get_many(keys)
+            if not snapshots:
+                cache.incr(key)  # a message committed while the database is counted
+            snapshots.append(values)
+            return values
+
+        with patch.object(cache, "get_many", side_effect=get_many_then_increment):
+            result = reconcile_unread_counts()
+
+        self.assertEqual(result, {"checked": 1, "repaired": 0})
+        self.assertEqual(cache.get(key), 8)
+
+    @override_settings(NOTIFICATION_PUSH_DEBOUNCE_SECONDS=0.05)
+    def test_pushes_are_coalesced_per_user(self):
+        with patch("notifications.unread.push_unread_count") as push:
+            for _ in range(5):
+                schedule_unread_push(self.user.id)
+            deadline = time.monotonic() + 2
+            while not push.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+
+        push.assert_called_once_with(self.user.id)
+
+    @override_settings(NOTIFICATION_PUSH_DEBOUNCE_SECONDS=0.05)
+    def test_debounced_push_sends_current_count_to_user_group(self):
+        from .consumers import user_group
+
+        # The in-memory layer only delivers within one event loop, so the
+        # push from the debouncer thread is checked at the layer boundary.
+        layer = Mock(group_send=AsyncMock())
+        self.assertEqual(unread_message_count(self.user.id), 0)
+        with patch("notifications.unread.get_channel_layer", return_value=layer):
+            self._send()
+            self._send()
+            deadline = time.monotonic() + 2
+            while not layer.group_send.await_count and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+
+        layer.group_send.assert_awaited_once_with(user_group(self.user.id), {"type": "notif.update", "count": 2})
+
+
+# Pushes from the debouncer thread cannot reach a consumer through the
+# in-memory layer (see test_debounced_push_sends_current_count_to_user_group).
+@override_settings(CHANNEL_LAYERS=INMEMORY_LAYER, NOTIFICATION_PUSH_DEBOUNCE_SECONDS=0)
 class NotificationConsumerTestCase(TransactionTestCase):
     def setUp(self):
         from categories.models import Category
@@ -123,6 +353,7 @@ class NotificationConsumerTestCase(TransactionTestCase):
         )
         self.conv = Conversation.objects.create(listing=listing)
         self.conv.participants.add(self.user, self.other)
+        cache.clear()
 
     def _communicator(self, user):
         scope = {
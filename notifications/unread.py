@@ -0,0 +1,194 @@
+"""Unread chat-message counters and the debounced badge push.
+
+The unread count per user lives in the cache (``chat:unread:<id>``): it is
+incremented when a message is committed and decremented by
+``Conversation.mark_as_read``, so the badge endpoint and the WebSocket
+consumer no longer run ``COUNT(*)`` on every request. A missing counter is
+filled from the database on first read; ``reconcile_unread_counts`` (a
+periodic background job) repairs any drift.
+
+Badge pushes are coalesced per user: the first change in a window reserves
+``notifications:unread-push:<id>`` in the shared cache and schedules a push
+on a background thread; later changes in the same window, from any process,
+are folded into that push, which sends the counter value current at push
+time.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Safety valve: a push reservation left behind by a dead process expires.
+PUSH_RESERVATION_SECONDS = 60
+
+
+def unread_counter_key(user_id):
+    return f"chat:unread:{user_id}"
+
+
+def _push_key(user_id):
+    return f"notifications:unread-push:{user_id}"
+
+
+def _count_from_db(user_id):
+    from chat.models import Message
+
+    return Message.objects.filter(receiver_id=user_id, is_read=False).count()
+
+
+def unread_message_count(user_id):
+    key = unread_counter_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = _count_from_db(user_id)
+        # add(), not set(): never overwrite a counter another process created.
+        cache.add(key, count, timeout=None)
+    return max(count, 0)
+
+
+def increment_unread(user_id, delta=1):
+    try:
+        cache.incr(unread_counter_key(user_id), delta)
+    except ValueError:
+        pass  # Not cached yet: the next read counts from the database.
+
+
+def decrement_unread(user_id, delta):
+    if delta <= 0:
+        return
+    key = unread_counter_key(user_id)
+    try:
+        value = cache.decr(key, delta)
+    except ValueError:
+        return
+    if value < 0:
+        cache.delete(key)
+
+
+def push_unread_count(user_id):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    from .consumers import user_group
+
+    try:
+        async_to_sync(layer.group_send)(
+            user_group(user_id),
+            {"type": "notif.update", "count": unread_message_count(user_id)},
+        )
+    except Exception:  # noqa: BLE001 - best-effort badge update.
+        logger.warning("live notification push failed", exc_info=True)
+
+
+class UnreadPushDebouncer:
+    """Per-process thread that sends each scheduled push once its window ends."""
+
+    def __init__(self, window):
+        self.window = window
+        self._due = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, user_id):
+        with self._condition:
+            if user_id in self._due:
+                return
+            self._due[user_id] = time.monotonic() + self.window
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="unread-push", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._due:
+                    self._condition.wait()
+                now = time.monotonic()
+                ready = [user_id for user_id, due in self._due.items() if due <= now]
+                if not ready:
+                    self._condition.wait(timeout=min(self._due.values()) - now)
+                    continue
+                for user_id in ready:
+                    del self._due[user_id]
+            for user_id in ready:
+                # Release the reservation before reading the counter: changes
+                # that lost the race to reserve are already counted.
+                cache.delete(_push_key(user_id))
+                push_unread_count(user_id)
+            close_old_connections()
+
+
+_debouncer = None
+_debouncer_lock = threading.Lock()
+
+
+def _get_debouncer():
+    global _debouncer
+    window = settings.NOTIFICATION_PUSH_DEBOUNCE_SECONDS
+    with _debouncer_lock:
+        if _debouncer is None or _debouncer.window != window:
+            _debouncer = UnreadPushDebouncer(window)
+        return _debouncer
+
+
+def schedule_unread_push(user_id):
+    if settings.NOTIFICATION_PUSH_DEBOUNCE_SECONDS <= 0:
+        push_unread_count(user_id)
+        return
+    if not cache.add(_push_key(user_id), 1, timeout=PUSH_RESERVATION_SECONDS):
+        return  # A push for this user is already pending in some process.
+    _get_debouncer().schedule(user_id)
+
+
+def reconcile_unread_counts(active_hours=24):
+    """Drop cached counters that drifted from the database.
+
+    Checks every user with unread messages or with messages received in the
+    last ``active_hours``; counters that are not cached are left for the
+    lazy fill. A counter is only repaired when it did not change while the
+    database was counted, and it is deleted rather than overwritten: the next
+    read refills it from the database, so a concurrent increment or decrement
+    is never lost.
+    """
+    from chat.models import Message
+
+    since = timezone.now() - timedelta(hours=active_hours)
+    user_ids = set(
+        Message.objects.filter(Q(is_read=False) | Q(created_at__gte=since))
+        .order_by()
+        .values_list("receiver_id", flat=True)
+        .distinct()
+    )
+    keys = {unread_counter_key(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(list(keys))
+    if not cached:
+        return {"checked": 0, "repaired": 0}
+
+    true_counts = dict(
+        Message.objects.filter(is_read=False, receiver_id__in=[keys[key] for key in cached])
+        .order_by()
+        .values("receiver_id")
+        .annotate(unread=Count("id"))
+        .values_list("receiver_id", "unread")
+    )
+    current = cache.get_many(list(cached))
+    repairs = [
+        key
+        for key, value in cached.items()
+        if current.get(key) == value and value != true_counts.get(keys[key], 0)
+    ]
+    if repairs:
+        cache.delete_many(repairs)
+        logger.info("unread_counters_repaired", extra={"count": len(repairs)})
+    return {"checked": len(cached), "repaired": len(repairs)}
@@ -6,4 +6,10 @@ class PagesConfig(AppConfig):
     name = 'pages'
 
     def ready(self):
+        from django.core.signals import request_finished
+
+        from Micu_market.db_pool import publish_pool_stats
+
         from . import checks  # noqa: F401
+
+        request_finished.connect(publish_pool_stats, dispatch_uid="pages_publish_pool_stats")
@@ -3,6 +3,7 @@ from urllib.parse import urlparse
 
 from django.conf import settings
 from django.core.checks import Error, Tags, Warning, register
+from django.core.files.storage import FileSystemStorage
 
 
 @register(Tags.security, deploy=True)
@@ -43,6 +44,13 @@ def deployment_security_checks(app_configs, **kwargs):
     return warnings
 
 
+def _chat_attachments_on_local_disk():
+    """X-Accel-Redirect/X-Sendfile point the web server at a local file."""
+    from chat.models import MessageAttachment
+
+    return isinstance(MessageAttachment._meta.get_field("file").storage, FileSystemStorage)
+
+
 @register(Tags.compatibility, deploy=True)
 def production_environment_checks(app_configs, **kwargs):
     errors = []
@@ -133,6 +141,24 @@ def production_environment_checks(app_configs, **kwargs):
                 )
             )
 
+    attachment_offload = getattr(settings, "CHAT_ATTACHMENT_OFFLOAD", "")
+    if attachment_offload not in ("", "nginx", "sendfile"):
+        errors.append(
+            Error(
+                "CHAT_ATTACHMENT_OFFLOAD are o valoare necunoscută.",
+                hint='Folosește "nginx" (X-Accel-Redirect), "sendfile" (X-Sendfile) sau lasă gol pentru FileResponse.',
+                id="micu.E009",
+            )
+        )
+    elif attachment_offload and not _chat_attachments_on_local_disk():
+        errors.append(
+            Error(
+                "CHAT_ATTACHMENT_OFFLOAD necesită atașamentele de chat pe discul local.",
+                hint="Cu un storage la distanță lasă CHAT_ATTACHMENT_OFFLOAD gol; atașamentele se servesc prin FileResponse.",
+                id="micu.E009",
+            )
+        )
+
     if not getattr(settings, "REDIS_URL", ""):
         errors.append(
             Warning(
@@ -0,0 +1,91 @@
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+MODES = ("connect", "persistent", "pool")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compară latența p50/p99 a cererilor simulate fără pool (conexiune nouă per cerere), "
+        "cu conexiuni persistente per thread și cu pool-ul psycopg. Doar pentru PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Cereri simulate per mod.")
+        parser.add_argument("--threads", type=int, default=16, help="Thread-uri simultane (ca ASGI_THREADS).")
+        parser.add_argument("--queries", type=int, default=3, help="Interogări per cerere.")
+        parser.add_argument("--mode", choices=MODES, action="append", help="Implicit toate modurile.")
+
+    def handle(self, *args, **options):
+        requests, threads, queries = options["requests"], options["threads"], options["queries"]
+        if requests < 1 or threads < 1 or queries < 1:
+            raise CommandError("--requests, --threads și --queries trebuie să fie pozitive.")
+        if connections[DEFAULT_DB_ALIAS].vendor != "postgresql":
+            raise CommandError("Benchmark-ul pool-ului necesită PostgreSQL.")
+
+        for mode in options["mode"] or MODES:
+            alias = f"bench-pool-{mode}-{uuid.uuid4().hex[:8]}"
+            connections.settings[alias] = self._alias_settings(mode, threads)
+            try:
+                elapsed, latencies = self._run(alias, requests, threads, queries)
+            except ImproperlyConfigured as exc:
+                raise CommandError(f"{mode}: {exc}") from exc
+            finally:
+                if mode == "pool":
+                    connections[alias].close_pool()
+                connections[alias].close()
+                del connections[alias]
+                del connections.settings[alias]
+
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{mode}: {len(latencies)} requests on {threads} threads in {elapsed:.3f}s, "
+                    f"{len(latencies) / elapsed:.1f} requests/s, latency p50/p99 "
+                    f"{statistics.median(latencies) * 1000:.2f}/{p99 * 1000:.2f} ms"
+                )
+            )
+
+    def _alias_settings(self, mode, threads):
+        base = dict(connections.settings[DEFAULT_DB_ALIAS])
+        options = {key: value for key, value in base.get("OPTIONS", {}).items() if key != "pool"}
+        base["CONN_MAX_AGE"] = 0
+        if mode == "persistent":
+            base["CONN_MAX_AGE"] = 600
+        elif mode == "pool":
+            options["pool"] = {"min_size": min(2, threads), "max_size": threads, "timeout": 30}
+        base["OPTIONS"] = options
+        return base
+
+    def _run(self, alias, requests, threads, queries):
+        per_thread = [requests // threads + (index < requests % threads) for index in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(lambda count: self._drive(alias, count, queries), per_thread))
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latencies in results for latency in latencies]
+
+    def _drive(self, alias, count, queries):
+        """Simulate ``count`` requests on this thread the way Django's request
+        cycle handles connections: query, then close_old_connections()."""
+        connection = connections[alias]
+        latencies = []
+        try:
+            for _ in range(count):
+                sent_at = time.perf_counter()
+                with connection.cursor() as cursor:
+                    for _ in range(queries):
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+                latencies.append(time.perf_counter() - sent_at)
+        finally:
+            connection.close()
+        return latencies
@@ -8,6 +8,11 @@ from django.core.mail import get_connection, send_mail
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
 
+from api.result_cache import result_cache_stats
+from chat.consumers import chat_event_stats
+from Micu_market.db_pool import pool_stats, published_pool_stats
+from Micu_market.db_routing import replica_status
+
 
 class Command(BaseCommand):
     help = "Verifică serviciile critice folosite de aplicație: DB, cache, email și storage."
@@ -32,7 +37,11 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         checks = [
             ("database", self._check_database),
+            ("database pool", self._report_pool),
+            ("database replicas", self._report_replicas),
             ("cache", self._check_cache),
+            ("listing result cache", self._report_result_cache),
+            ("chat realtime events", self._report_chat_events),
         ]
 
         if not options["skip_email"]:
@@ -66,6 +75,33 @@ class Command(BaseCommand):
             raise RuntimeError("database returned an unexpected response")
         return connection.vendor
 
+    def _report_pool(self):
+        own = pool_stats()
+        if own is None:
+            return "disabled"
+        processes = published_pool_stats()
+        processes.setdefault("doctor", own)
+        totals = {
+            key: sum(stats[key] for stats in processes.values())
+            for key in ("size", "max_size", "in_use", "waiting", "timeouts")
+        }
+        return (
+            f"{len(processes)} processes, {totals['size']}/{totals['max_size']} connections, "
+            f"{totals['in_use']} in use, {totals['waiting']} waiting, {totals['timeouts']} timeouts"
+        )
+
+    def _report_replicas(self):
+        status = replica_status()
+        if not status:
+            return "none configured"
+        return ", ".join(
+            f"{alias} lag {lag:.1f}s"
+            + ("" if lag <= settings.DATABASE_REPLICA_MAX_LAG_SECONDS else " (out of rotation)")
+            if lag is not None
+            else f"{alias} unreachable (out of rotation)"
+            for alias, lag in status.items()
+        )
+
     def _check_cache(self):
         key = f"micu:doctor:{uuid.uuid4()}"
         expected = "ok"
@@ -76,6 +112,17 @@ class Command(BaseCommand):
             raise RuntimeError("cache set/get returned an unexpected response")
         return getattr(settings, "RATELIMIT_USE_CACHE", "default")
 
+    def _report_result_cache(self):
+        stats = result_cache_stats()
+        return f"hit ratio {stats['hit_ratio']:.2f} ({stats['hits']} hits, {stats['misses']} misses)"
+
+    def _report_chat_events(self):
+        stats = chat_event_stats()
+        return (
+            f"typing {stats['typing_sent']} sent / {stats['typing_suppressed']} suppressed, "
+            f"read receipts {stats['read_sent']} sent / {stats['read_skipped']} skipped"
+        )
+
     def _check_email(self, test_address):
         connection_obj = get_connection()
         connection_obj.open()
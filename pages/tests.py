@@ -2,10 +2,16 @@ import tempfile
 from io import StringIO
 from unittest.mock import patch
 
+from django.core.cache import cache
+from django.core.files.storage import InMemoryStorage
 from django.core.management import CommandError, call_command
-from django.test import RequestFactory, TestCase, override_settings
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
+from Micu_market import db_pool
+from Micu_market.db_routing import PIN_COOKIE_NAME, ReplicaRouter, primary_reads, record_replica_lag, use_replica
+
 from .checks import production_environment_checks
 from .views import bad_request_view, permission_denied_view, server_error_view
 
@@ -142,16 +148,94 @@ class DoctorCommandTests(TestCase):
         output = out.getvalue()
         self.assertIn("OK database", output)
         self.assertIn("OK cache", output)
+        self.assertIn("OK listing result cache - hit ratio", output)
+        self.assertIn("OK database replicas - none configured", output)
+        self.assertIn("OK database pool - disabled", output)
+        self.assertIn("OK chat realtime events - typing", output)
         self.assertIn("OK email", output)
         self.assertIn("OK storage", output)
         self.assertIn("Doctor checks passed.", output)
 
+    @patch(
+        "pages.management.commands.doctor.pool_stats",
+        return_value={"size": 2, "max_size": 16, "in_use": 1, "waiting": 0, "requests": 9, "timeouts": 0, "wait_ms": 3},
+    )
+    def test_doctor_sums_published_pool_stats(self, _pool_stats):
+        worker = {"size": 10, "max_size": 16, "in_use": 7, "waiting": 2, "requests": 500, "timeouts": 1, "wait_ms": 80}
+        live, gone = f"{db_pool.STATS_KEY_PREFIX}web-1:42", f"{db_pool.STATS_KEY_PREFIX}gone:7"
+        cache.set(live, worker)
+        cache.set(db_pool.PROCESS_INDEX_KEY, {live: 0, gone: 0})
+        self.addCleanup(cache.delete_many, [live, db_pool.PROCESS_INDEX_KEY])
+        out = StringIO()
+
+        call_command("doctor", "--skip-email", "--skip-storage", stdout=out)
+
+        self.assertIn(
+            "OK database pool - 2 processes, 12/32 connections, 8 in use, 2 waiting, 1 timeouts", out.getvalue()
+        )
+        # The exited process's entry is dropped from the index.
+        self.assertEqual(list(cache.get(db_pool.PROCESS_INDEX_KEY)), [live])
+
+    def test_pool_benchmark_requires_postgresql(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("only meaningful on the SQLite test database")
+        with self.assertRaisesMessage(CommandError, "PostgreSQL"):
+            call_command("benchmark_db_pool", "--requests", "1", stdout=StringIO())
+
     @patch("pages.management.commands.doctor.cache.get", return_value="bad")
     def test_doctor_fails_when_cache_roundtrip_fails(self, _cache_get):
         with self.assertRaises(CommandError):
             call_command("doctor", "--skip-email", "--skip-storage", stdout=StringIO(), stderr=StringIO())
 
 
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_REPLICA_MAX_LAG_SECONDS=5, DATABASE_REPLICA_CHECK_SECONDS=60)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Read routing in Micu_market/db_routing.py; health is recorded by hand
+    because the test database has no replica to measure. Not a TestCase:
+    reads inside its wrapping transaction always stay on the primary."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        record_replica_lag('replica1', 0.5)
+
+    def test_reads_use_replica_until_the_first_write(self):
+        self.assertEqual(self.router.db_for_read(None), 'default')
+        with use_replica():
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(None), 'default')
+            self.assertEqual(self.router.db_for_read(None), 'replica1')
+            self.router.db_for_write(None)
+            self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_primary_reads_views_skip_the_replica_and_still_track_writes(self):
+        routed = []
+
+        @primary_reads
+        def view():
+            routed.append(self.router.db_for_read(None))
+            self.router.db_for_write(None)
+
+        with use_replica() as state:
+            view()
+            self.assertEqual(self.router.db_for_read(None), 'default')
+        self.assertEqual(routed, ['default'])
+        self.assertTrue(state['wrote'])
+
+    def test_lagging_or_unreachable_replica_leaves_rotation(self):
+        for lag in (30.0, None):
+            record_replica_lag('replica1', lag)
+            with use_replica():
+                self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.client.post(reverse('set_language'), {'language': 'en'})
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], 15)
+
+        response = self.client.get(reverse('pages:about'))
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+
 class DeploymentCheckTests(TestCase):
     @override_settings(
         DEBUG=False,
@@ -240,3 +324,14 @@ class DeploymentCheckTests(TestCase):
         issues = production_environment_checks(None)
 
         self.assertIn('micu.E007', {issue.id for issue in issues})
+
+    @override_settings(DEBUG=False, CHAT_ATTACHMENT_OFFLOAD='nginx')
+    def test_deploy_check_rejects_attachment_offload_without_local_files(self):
+        from chat.models import MessageAttachment
+
+        self.assertNotIn('micu.E009', {issue.id for issue in production_environment_checks(None)})
+
+        with patch.object(MessageAttachment._meta.get_field('file'), 'storage', InMemoryStorage()):
+            issues = production_environment_checks(None)
+
+        self.assertIn('micu.E009', {issue.id for issue in issues})
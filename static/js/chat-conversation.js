@@ -1,6 +1,9 @@
 // Real-time chat over WebSocket (Django Channels), with an AJAX fallback for
 // attachments / when the WS is unavailable. Own messages are rendered on the
 // server's echo (they have a real id); deduplicated by id so they don't appear twice.
+// The page renders only the newest messages; older windows are fetched by id
+// (keyset) when the user scrolls to the top, and a reconnect fetches what was
+// sent while the socket was down.
 (function () {
     const root = document.getElementById('chatRoot');
     if (!root) return;
@@ -15,6 +18,10 @@
     const preview = document.getElementById('chatPreview');
     const connStatus = document.getElementById('chatConnStatus');
     const csrf = form.querySelector('[name=csrfmiddlewaretoken]').value;
+    const historyUrl = root.dataset.historyUrl;
+    let hasOlder = root.dataset.hasOlder === 'true';
+    let loadingOlder = false;
+    let connectedOnce = false;
 
     const seen = new Set(
         Array.from(messagesEl.querySelectorAll('[data-message-id]')).map((el) => el.dataset.messageId)
@@ -44,18 +51,15 @@
             + `<i class="fas fa-file"></i> ${escapeHTML(att.filename)}</a>`;
     }
 
-    function renderMessage(msg) {
-        const id = String(msg.id);
-        if (seen.has(id)) return;
-        seen.add(id);
-
+    function buildMessage(msg) {
         const mine = msg.sender === currentUser;
         const wrap = document.createElement('div');
         wrap.className = 'chat-msg ' + (mine ? 'chat-msg--sent' : 'chat-msg--received');
-        wrap.dataset.messageId = id;
+        wrap.dataset.messageId = String(msg.id);
 
         const atts = (msg.attachments || []).map(attachmentHTML).join('');
-        const status = mine ? '<span class="chat-msg__status"><i class="fas fa-check"></i></span>' : '';
+        const check = msg.is_read ? 'fa-check-double read' : 'fa-check';
+        const status = mine ? '<span class="chat-msg__status"><i class="fas ' + check + '"></i></span>' : '';
 
         wrap.innerHTML =
             '<div class="chat-msg__bubble">' +
@@ -63,22 +67,86 @@
                 (atts ? '<div class="chat-msg__attachments">' + atts + '</div>' : '') +
             '</div>' +
             '<div class="chat-msg__meta"><span class="chat-msg__time">' + escapeHTML(msg.created_at || '') + '</span>' + status + '</div>';
+        return wrap;
+    }
 
-        messagesEl.insertBefore(wrap, typingEl);
+    function renderMessage(msg) {
+        const id = String(msg.id);
+        if (seen.has(id)) return;
+        seen.add(id);
+
+        messagesEl.insertBefore(buildMessage(msg), typingEl);
         scrollToBottom();
     }
 
+    // Older messages go above the current first one, keeping the scroll position.
+    function prependMessages(list) {
+        const first = messagesEl.querySelector('[data-message-id]');
+        const fromBottom = messagesEl.scrollHeight - messagesEl.scrollTop;
+        const fragment = document.createDocumentFragment();
+        list.forEach((msg) => {
+            const id = String(msg.id);
+            if (seen.has(id)) return;
+            seen.add(id);
+            fragment.appendChild(buildMessage(msg));
+        });
+        messagesEl.insertBefore(fragment, first || typingEl);
+        messagesEl.scrollTop = messagesEl.scrollHeight - fromBottom;
+    }
+
+    function messageIds() {
+        return Array.from(messagesEl.querySelectorAll('[data-message-id]')).map((el) => el.dataset.messageId);
+    }
+
+    async function fetchHistory(params) {
+        const resp = await fetch(historyUrl + '?' + new URLSearchParams(params), {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' },
+        });
+        if (!resp.ok) throw new Error('history ' + resp.status);
+        return resp.json();
+    }
+
+    async function loadOlder() {
+        const ids = messageIds();
+        if (!hasOlder || loadingOlder || !ids.length) return;
+        loadingOlder = true;
+        try {
+            const data = await fetchHistory({ before: ids[0] });
+            prependMessages(data.messages || []);
+            hasOlder = Boolean(data.has_more);
+        } catch (e) { /* retried on the next scroll */ }
+        loadingOlder = false;
+    }
+
+    // After a reconnect: messages sent while the socket was down, oldest first.
+    async function loadMissed() {
+        let ids = messageIds();
+        while (ids.length) {
+            let data;
+            try { data = await fetchHistory({ after: ids[ids.length - 1] }); } catch (e) { return; }
+            (data.messages || []).forEach(renderMessage);
+            if (!data.has_more) return;
+            ids = messageIds();
+        }
+    }
+
     function markOwnAsRead() {
         messagesEl.querySelectorAll('.chat-msg--sent .chat-msg__status').forEach((el) => {
             el.innerHTML = '<i class="fas fa-check-double read"></i>';
         });
     }
 
+    function hideTyping() {
+        clearTimeout(typingTimer);
+        typingEl.hidden = true;
+    }
+
+    // The server sends "stopped typing" itself; the timeout only covers a lost one.
     function showTyping() {
         typingEl.hidden = false;
         scrollToBottom();
         clearTimeout(typingTimer);
-        typingTimer = setTimeout(() => { typingEl.hidden = true; }, 3000);
+        typingTimer = setTimeout(hideTyping, 6000);
     }
 
     // ---- WebSocket ----
@@ -89,6 +157,8 @@
         socket.onopen = function () {
             reconnectDelay = 1000;
             connStatus.hidden = true;
+            if (connectedOnce) loadMissed();
+            connectedOnce = true;
             send({ type: 'read' });
         };
 
@@ -96,10 +166,11 @@
             let data;
             try { data = JSON.parse(event.data); } catch (e) { return; }
             if (data.type === 'message') {
+                if (data.message.sender !== currentUser) hideTyping();
                 renderMessage(data.message);
                 if (document.hasFocus()) send({ type: 'read' });
             } else if (data.type === 'typing') {
-                showTyping();
+                if (data.typing === false) hideTyping(); else showTyping();
             } else if (data.type === 'read') {
                 markOwnAsRead();
             }
@@ -197,6 +268,10 @@
 
     window.addEventListener('focus', function () { send({ type: 'read' }); });
 
+    messagesEl.addEventListener('scroll', function () {
+        if (messagesEl.scrollTop < 200) loadOlder();
+    }, { passive: true });
+
     // ---- Init ----
     scrollToBottom();
     autoGrow();